@@ -169,8 +169,8 @@ class AgentContext:
             ),
             "no": self.no,
             "log_guid": self.log.guid,
-            "log_version": len(self.log.updates),
-            "log_length": len(self.log.logs),
+            "log_version": self.log.version,
+            "log_length": self.log.get_length(),
             "paused": self.paused,
             "last_message": (
                 Localization.get().serialize_datetime(self.last_message)
@@ -260,6 +260,8 @@ class AgentContext:
                     tool_name="call_subordinate", tool_result=msg  # type: ignore
                 )
             )
+            if user:
+                await agent.call_extensions("user_message_received", message=msg_template)
             response = await agent.monologue()  # type: ignore
             superior = agent.data.get(Agent.DATA_NAME_SUPERIOR, None)
             if superior:
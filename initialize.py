@@ -2,6 +2,7 @@ from agent import AgentConfig
 import models
 from python.helpers import runtime, settings, defer
 from python.helpers.print_style import PrintStyle
+from python.helpers.embedding_batcher import EmbeddingBatcher
 
 
 def initialize_agent(override_settings: dict | None = None):
@@ -62,6 +63,19 @@ def initialize_agent(override_settings: dict | None = None):
         limit_requests=current_settings["embed_model_rl_requests"],
         kwargs=_normalize_model_kwargs(current_settings["embed_model_kwargs"]),
     )
+    # concurrent embedding requests are merged into batches, shared by all agents
+    EmbeddingBatcher.configure(
+        current_settings["embed_model_batch_size"],
+        current_settings["embed_model_batch_linger_ms"] / 1000,
+    )
+    # memory subdirs kept loaded, the least recently used are unloaded over the limits
+    from python.helpers.memory import Memory
+
+    Memory.index.configure(
+        current_settings["memory_loaded_max_subdirs"],
+        current_settings["memory_loaded_max_mb"] * 2**20,
+        current_settings["memory_loaded_min_idle"],
+    )
     # browser model from user settings
     browser_llm = models.ModelConfig(
         type=models.ModelType.CHAT,
@@ -120,8 +134,9 @@ def initialize_agent(override_settings: dict | None = None):
     return config
 
 def initialize_chats():
-    from python.helpers import persist_chat
+    from python.helpers import persist_chat, log
     async def initialize_chats_async():
+        log.clear_segments()  # segments of the previous run are not referenced anymore
         persist_chat.load_tmp_chats()
     return defer.DeferredTask().start_task(initialize_chats_async)
 
@@ -1,5 +1,7 @@
 from dataclasses import dataclass, field
 from enum import Enum
+import hashlib
+import json
 import logging
 import os
 from typing import (
@@ -26,6 +28,7 @@ from python.helpers.providers import get_provider_config
 from python.helpers.rate_limiter import RateLimiter
 from python.helpers.tokens import approximate_tokens
 from python.helpers import dirty_json, browser_use_monkeypatch
+from python.helpers.embedding_batcher import EmbeddingBatcher
 
 from langchain_core.language_models.chat_models import SimpleChatModel
 from langchain_core.outputs.chat_generation import ChatGenerationChunk
@@ -198,14 +201,19 @@ rate_limiters: dict[str, RateLimiter] = {}
 api_keys_round_robin: dict[str, int] = {}
 
 
-def get_api_key(service: str) -> str:
-    # get api key for the service
-    key = (
+def _get_api_key_source(service: str) -> str:
+    # configured api key value(s) for the service, without round-robin selection
+    return (
         dotenv.get_dotenv_value(f"API_KEY_{service.upper()}")
         or dotenv.get_dotenv_value(f"{service.upper()}_API_KEY")
         or dotenv.get_dotenv_value(f"{service.upper()}_API_TOKEN")
         or "None"
     )
+
+
+def get_api_key(service: str) -> str:
+    # get api key for the service
+    key = _get_api_key_source(service)
     # if the key contains a comma, use round-robin
     if "," in key:
         api_keys = [k.strip() for k in key.split(",") if k.strip()]
@@ -913,7 +921,18 @@ def get_browser_model(
 
 def get_embedding_model(
     provider: str, name: str, model_config: Optional[ModelConfig] = None, **kwargs: Any
-) -> LiteLLMEmbeddingWrapper | LocalSentenceTransformerWrapper:
+) -> EmbeddingBatcher:
     orig = provider.lower()
     provider_name, kwargs = _merge_provider_defaults("embedding", orig, kwargs)
-    return _get_litellm_embedding(name, provider_name, model_config, **kwargs)
+    # one shared batcher per configuration, concurrent requests are embedded together,
+    # the registry key is a digest so credentials in the config are never kept in it
+    config = json.dumps(
+        [provider_name, name, repr(model_config), kwargs, _get_api_key_source(provider_name)],
+        sort_keys=True,
+        default=str,
+    )
+    key = hashlib.sha256(config.encode("utf-8")).hexdigest()
+    return EmbeddingBatcher.get(
+        key,
+        lambda: _get_litellm_embedding(name, provider_name, model_config, **kwargs),
+    )
@@ -38,13 +38,13 @@ class ApiLogGet(ApiHandler):
 
         try:
             # Get total number of log items
-            total_items = len(context.log.logs)
+            total_items = context.log.get_length()
 
             # Calculate start position (from newest, so we work backwards)
             start_pos = max(0, total_items - length)
 
             # Get log items from the calculated start position
-            log_items = context.log.output(start=start_pos)
+            log_items = context.log.get_items(start=start_pos)
 
             # Return log data with metadata
             return {
@@ -11,5 +11,7 @@ class GetHistory(ApiHandler):
 
         return {
             "history": history,
-            "tokens": size
-        }
\ No newline at end of file
+            "tokens": size,
+            "compression": agent.history.compression_stats.output(),
+            "blobs": agent.history.blob_store.stats(),
+        }
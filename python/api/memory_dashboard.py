@@ -1,9 +1,11 @@
 from python.helpers.api import ApiHandler, Request, Response
 from python.helpers.memory import Memory, get_existing_memory_subdirs, get_context_memory_subdir
-from python.helpers import files
+from python.helpers.memory_reindex import MemoryReindex
+from python.helpers import files, memory_dedup, vector_index
 from models import ModelConfig, ModelType
 from langchain_core.documents import Document
 from agent import AgentContext
+from typing import get_args
 
 
 class MemoryDashboard(ApiHandler):
@@ -15,6 +17,16 @@ class MemoryDashboard(ApiHandler):
                 return await self._get_memory_subdirs()
             elif action == "get_current_memory_subdir":
                 return await self._get_current_memory_subdir(input)
+            elif action == "get_loaded_memory_subdirs":
+                return {"success": True, "loaded": Memory.index.get_stats()}
+            elif action == "get_memory_reindexes":
+                return {"success": True, "reindexes": MemoryReindex.get_stats()}
+            elif action == "get_memory_dedup_stats":
+                return {"success": True, "dedup": memory_dedup.get_stats()}
+            elif action == "get_index_config":
+                return await self._get_index_config(input)
+            elif action == "set_index_config":
+                return await self._set_index_config(input)
             elif action == "search":
                 return await self._search_memories(input)
             elif action == "delete":
@@ -105,6 +117,31 @@ class MemoryDashboard(ApiHandler):
                 "error": f"Failed to bulk delete memories: {str(e)}",
             }
 
+    async def _get_index_config(self, input: dict) -> dict:
+        """Get the configured and current vector indexes of a memory subdirectory."""
+        try:
+            memory_subdir = input.get("memory_subdir", "default")
+            memory = await Memory.get_by_subdir(memory_subdir, preload_knowledge=False)
+            return {"success": True, **memory.get_index_config()}
+        except Exception as e:
+            return {"success": False, "error": f"Failed to get index config: {str(e)}"}
+
+    async def _set_index_config(self, input: dict) -> dict:
+        """Change the vector index or quantization of a memory subdirectory, rebuilt in the background."""
+        try:
+            memory_subdir = input.get("memory_subdir", "default")
+            index_type = input.get("index_type")
+            if index_type is not None and index_type not in get_args(vector_index.IndexType):
+                return {"success": False, "error": f"Unknown index type: {index_type}"}
+            quantization = input.get("quantization")
+            if quantization is not None and quantization not in get_args(vector_index.Quantization):
+                return {"success": False, "error": f"Unknown quantization: {quantization}"}
+
+            memory = await Memory.get_by_subdir(memory_subdir, preload_knowledge=False)
+            return {"success": True, **memory.set_index_config(index_type=index_type, quantization=quantization)}
+        except Exception as e:
+            return {"success": False, "error": f"Failed to set index config: {str(e)}"}
+
     async def _get_current_memory_subdir(self, input: dict) -> dict:
         """Get the current memory subdirectory from the active context."""
         try:
@@ -141,59 +178,68 @@ class MemoryDashboard(ApiHandler):
             }
 
     async def _search_memories(self, input: dict) -> dict:
-        """Search memories in the specified subdirectory."""
+        """Search memories in the specified subdirectory.
+
+        Without a search query memories are listed newest first, one page per
+        request: page_size with a cursor (or offset) from the previous page.
+        count_only returns just the counts.
+        """
         try:
             # Get search parameters
             memory_subdir = input.get("memory_subdir", "default")
             area_filter = input.get("area", "")  # Filter by memory area
+            source_filter = input.get("source", "")  # "knowledge", "conversation" or all
             search_query = input.get("search", "")  # Full-text search query
             limit = input.get("limit", 100)  # Number of results to return
             threshold = input.get("threshold", 0.6)  # Similarity threshold
+            page_size = input.get("page_size", 0)  # Page of newest memories, 0 for limit
+            cursor = input.get("cursor")  # [timestamp, id] of the last memory of the previous page
+            offset = input.get("offset", 0)  # Memories to skip when there is no cursor
+            count_only = input.get("count_only", False)
 
             memory = await Memory.get_by_subdir(memory_subdir, preload_knowledge=False)
 
-            memories = []
+            areas = {area_filter} if area_filter else None
+            knowledge = {"knowledge": True, "conversation": False}.get(source_filter)
+            next_cursor = None
 
-            if search_query:
+            if search_query and not count_only:
                 docs = await memory.search_similarity_threshold(
                     query=search_query,
                     limit=limit,
                     threshold=threshold,
                     filter=f"area == '{area_filter}'" if area_filter else "",
                 )
+                if knowledge is not None:
+                    docs = [d for d in docs if bool(d.metadata.get("knowledge_source", False)) == knowledge]
                 memories = docs
-            else:
-                # If no search query, get all memories from specified area(s)
-                all_docs = memory.db.get_all_docs()
-                for doc_id, doc in all_docs.items():
-                    # Apply area filter if specified
-                    if area_filter and doc.metadata.get("area", "") != area_filter:
-                        continue
-                    memories.append(doc)
-
-                # sort by timestamp
-                def get_sort_key(m):
-                    timestamp = m.metadata.get("timestamp", "0000-00-00 00:00:00")
-                    return timestamp
 
-                memories.sort(key=get_sort_key, reverse=True)
-
-                # Apply limit AFTER sorting to get the newest entries
-                if limit and len(memories) > limit:
-                    memories = memories[:limit]
+                # summary statistics of the results
+                total_memories = len(memories)
+                knowledge_count = sum(1 for m in memories if m.metadata.get("knowledge_source", False))
+                conversation_count = total_memories - knowledge_count
+            else:
+                # newest memories from the timestamp index, the store is not loaded as a whole
+                memories = []
+                if not count_only:
+                    memories, next_cursor = memory.db.get_docs_page(
+                        limit=page_size or limit,
+                        cursor=tuple(cursor) if cursor else None,  # type: ignore
+                        offset=0 if cursor else offset,
+                        areas=areas,
+                        knowledge=knowledge,
+                    )
+
+                # summary statistics of the filtered store, from the indexes
+                total_memories = memory.db.count_docs(areas, knowledge)
+                knowledge_count = memory.db.count_docs(areas, True) if knowledge is not False else 0
+                conversation_count = memory.db.count_docs(areas, False) if knowledge is not True else 0
 
             # Format memories for the dashboard
             formatted_memories = [self._format_memory_for_dashboard(m) for m in memories]
 
-            # Get summary statistics
-            total_memories = len(formatted_memories)
-            knowledge_count = sum(
-                1 for m in formatted_memories if m["knowledge_source"]
-            )
-            conversation_count = total_memories - knowledge_count
-
             # Get total count of all memories in database (unfiltered)
-            total_db_count = len(memory.db.get_all_docs())
+            total_db_count = memory.db.count_docs()
 
             return {
                 "success": True,
@@ -202,9 +248,15 @@ class MemoryDashboard(ApiHandler):
                 "total_db_count": total_db_count,
                 "knowledge_count": knowledge_count,
                 "conversation_count": conversation_count,
+                "next_cursor": list(next_cursor) if next_cursor else None,
                 "search_query": search_query,
                 "area_filter": area_filter,
+                "source_filter": source_filter,
                 "memory_subdir": memory_subdir,
+                "reindex": next(
+                    (job for job in MemoryReindex.get_stats() if job["memory_subdir"] == memory_subdir),
+                    None,
+                ),
             }
 
         except Exception as e:
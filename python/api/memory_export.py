@@ -0,0 +1,41 @@
+from python.helpers.api import ApiHandler, Request, Response, send_file
+from python.helpers.memory import Memory
+import os
+import shutil
+import tempfile
+
+
+class MemoryExport(ApiHandler):
+    @classmethod
+    def requires_auth(cls) -> bool:
+        return True
+
+    @classmethod
+    def requires_loopback(cls) -> bool:
+        return False
+
+    async def process(self, input: dict, request: Request) -> dict | Response:
+        folder = tempfile.mkdtemp()
+        try:
+            memory_subdir = input.get("memory_subdir", "default")
+            areas = input.get("areas") or None  # all areas when empty
+            since = input.get("since", "")
+            until = input.get("until", "")
+
+            memory = await Memory.get_by_subdir(memory_subdir, preload_knowledge=False)
+            path = os.path.join(folder, "memory.npz")
+            await memory.export_memories(path, set(areas) if areas else None, since, until)
+
+            response = send_file(
+                path,
+                as_attachment=True,
+                download_name=f"{memory_subdir.replace('/', '_')}-memory.npz",
+                mimetype="application/zip",
+            )
+            # the export can be large, it is removed once sent
+            response.call_on_close(lambda: shutil.rmtree(folder, ignore_errors=True))
+            return response
+
+        except Exception as e:
+            shutil.rmtree(folder, ignore_errors=True)
+            return {"success": False, "error": str(e)}
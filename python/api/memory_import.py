@@ -0,0 +1,48 @@
+from python.helpers.api import ApiHandler, Request, Response
+from werkzeug.datastructures import FileStorage
+from python.helpers.memory import Memory
+import json
+import os
+import shutil
+import tempfile
+
+
+class MemoryImport(ApiHandler):
+    @classmethod
+    def requires_auth(cls) -> bool:
+        return True
+
+    @classmethod
+    def requires_loopback(cls) -> bool:
+        return False
+
+    async def process(self, input: dict, request: Request) -> dict | Response:
+        if "export_file" not in request.files:
+            return {"success": False, "error": "No export file provided"}
+
+        export_file: FileStorage = request.files["export_file"]
+        if export_file.filename == "":
+            return {"success": False, "error": "No file selected"}
+
+        memory_subdir = request.form.get("memory_subdir", "default")
+        since = request.form.get("since", "")
+        until = request.form.get("until", "")
+        reembed = request.form.get("reembed", "false").lower() == "true"
+        try:
+            areas = json.loads(request.form.get("areas", "[]")) or None  # all areas when empty
+        except json.JSONDecodeError:
+            return {"success": False, "error": "Invalid areas JSON"}
+
+        folder = tempfile.mkdtemp()
+        try:
+            path = os.path.join(folder, "memory.npz")
+            export_file.save(path)
+            memory = await Memory.get_by_subdir(memory_subdir, preload_knowledge=False)
+            result = await memory.import_memories(
+                path, set(areas) if areas else None, since, until, reembed=reembed
+            )
+            return {"success": True, **result}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
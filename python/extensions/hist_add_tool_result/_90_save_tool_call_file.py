@@ -1,7 +1,6 @@
 from typing import Any
 from python.helpers.extension import Extension
-from python.helpers import files, persist_chat
-import os, re
+from python.helpers import blob_store
 
 LEN_MIN = 500
 
@@ -19,19 +18,10 @@ class SaveToolCallFile(Extension):
         if len(str(result)) < LEN_MIN:
             return
 
-        # message files directory
-        msgs_folder = persist_chat.get_chat_msg_files_folder(self.agent.context.id)
-        os.makedirs(msgs_folder, exist_ok=True)
-
-        # count the files in the directory
-        last_num = len(os.listdir(msgs_folder))
-
-        # create new file
-        new_file = files.get_abs_path(msgs_folder, f"{last_num+1}.txt")
-        files.write_file(
-            new_file,
-            result,
-        )
+        # store the result in the content-addressed message files store, identical outputs share one file,
+        # saved as a readable .txt, the history message refers to the same file once it is externalized
+        store = blob_store.get_chat_store(self.agent.context.id)
+        hash = store.put(str(result))
 
         # add the path to the history
-        data["file"] = new_file
+        data["file"] = store.find(hash)
@@ -12,7 +12,11 @@ class OrganizeHistory(Extension):
         if task and not task.done():
             return
 
+        # start compressing pre-emptively only once history crosses the soft limit
+        if not self.agent.history.is_over_soft_limit():
+            return
+
         # start task
-        task = asyncio.create_task(self.agent.history.compress())
+        task = asyncio.create_task(self.agent.history.compress(soft=True))
         # set to agent to be able to wait for it
         self.agent.set_data(DATA_NAME_TASK, task)
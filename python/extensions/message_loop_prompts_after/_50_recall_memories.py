@@ -1,13 +1,15 @@
 import asyncio
 from python.helpers.extension import Extension
 from python.helpers.memory import Memory
-from agent import LoopData
+from agent import Agent, LoopData
 from python.tools.memory_load import DEFAULT_THRESHOLD as DEFAULT_MEMORY_THRESHOLD
-from python.helpers import dirty_json, errors, settings, log 
+from python.helpers import dirty_json, errors, settings, log, recall_cache
+from python.helpers.history import Message
 
 
 DATA_NAME_TASK = "_recall_memories_task"
 DATA_NAME_ITER = "_recall_memories_iter"
+DATA_NAME_SPECULATIVE = "_recall_memories_speculative"
 
 
 class RecallMemories(Extension):
@@ -31,14 +33,21 @@ class RecallMemories(Extension):
         # every X iterations (or the first one) recall memories
         if loop_data.iteration % set["memory_recall_interval"] == 0:
 
-            # show util message right away
-            log_item = self.agent.context.log.log(
-                type="util",
-                heading="Searching memories...",
-            )
+            # recall started when the user message arrived
+            recall = take_speculative_recall(self.agent, loop_data.user_message)
+
+            if recall is None:
+                # show util message right away
+                log_item = self.agent.context.log.log(
+                    type="util",
+                    heading="Searching memories...",
+                )
+                recall = asyncio.create_task(
+                    recall_memories(self.agent, loop_data.user_message, log_item)
+                )
 
             task = asyncio.create_task(
-                self.search_memories(loop_data=loop_data, log_item=log_item, **kwargs)
+                self.search_memories(recall=recall, loop_data=loop_data, **kwargs)
             )
         else:
             task = None
@@ -47,7 +56,7 @@ class RecallMemories(Extension):
         self.agent.set_data(DATA_NAME_TASK, task)
         self.agent.set_data(DATA_NAME_ITER, loop_data.iteration)
 
-    async def search_memories(self, log_item: log.LogItem, loop_data: LoopData, **kwargs):
+    async def search_memories(self, recall: asyncio.Task, loop_data: LoopData, **kwargs):
 
         # cleanup
         extras = loop_data.extras_persistent
@@ -56,159 +65,220 @@ class RecallMemories(Extension):
         if "solutions" in extras:
             del extras["solutions"]
 
+        memories, solutions = await recall
 
-        set = settings.get_settings()
-        # try:
-
-        # get system message and chat history for util llm
-        system = self.agent.read_prompt("memory.memories_query.sys.md")
+        memories_txt = "\n\n".join([mem.page_content for mem in memories]) if memories else ""
+        solutions_txt = "\n\n".join([sol.page_content for sol in solutions]) if solutions else ""
 
-        # log query streamed by LLM
-        async def log_callback(content):
-            log_item.stream(query=content)
+        # place to prompt
+        if memories_txt:
+            extras["memories"] = self.agent.parse_prompt(
+                "agent.system.memories.md", memories=memories_txt
+            )
+        if solutions_txt:
+            extras["solutions"] = self.agent.parse_prompt(
+                "agent.system.solutions.md", solutions=solutions_txt
+            )
 
-        # call util llm to summarize conversation
-        user_instruction = (
-            loop_data.user_message.output_text() if loop_data.user_message else "None"
-        )
-        history = self.agent.history.output_text()[-set["memory_recall_history_len"]:]
-        message = self.agent.read_prompt(
-            "memory.memories_query.msg.md", history=history, message=user_instruction
-        )
 
-        # if query preparation by AI is enabled
-        if set["memory_recall_query_prep"]:
-            try:
+def start_speculative_recall(agent: Agent, user_message: Message | None):
+    """Start recall for a new user message while the rest of the prompt is prepared."""
+    set = settings.get_settings()
+    if not set["memory_recall_enabled"] or not user_message:
+        return
+    log_item = agent.context.log.log(
+        type="util",
+        heading="Searching memories...",
+    )
+    task = asyncio.create_task(recall_memories(agent, user_message, log_item))
+    agent.set_data(DATA_NAME_SPECULATIVE, (user_message, task))
+
+
+def take_speculative_recall(agent: Agent, user_message: Message | None) -> asyncio.Task | None:
+    """Speculative recall of this user message, each one is used once."""
+    speculative = agent.get_data(DATA_NAME_SPECULATIVE)
+    if not speculative:
+        return None
+    agent.set_data(DATA_NAME_SPECULATIVE, None)
+    message, task = speculative
+    if message is not user_message:
+        task.cancel()  # a newer message arrived meanwhile
+        return None
+    return task
+
+
+async def recall_memories(
+    agent: Agent, user_message: Message | None, log_item: log.LogItem
+) -> tuple[list, list]:
+    """Memories and solutions relevant to the conversation, as (memories, solutions)."""
+
+    set = settings.get_settings()
+    # try:
+
+    # get system message and chat history for util llm
+    system = agent.read_prompt("memory.memories_query.sys.md")
+
+    # log query streamed by LLM
+    async def log_callback(content):
+        log_item.stream(query=content)
+
+    # call util llm to summarize conversation
+    user_instruction = (
+        user_message.output_text() if user_message else "None"
+    )
+    history = agent.history.output_text()[-set["memory_recall_history_len"]:]
+    message = agent.read_prompt(
+        "memory.memories_query.msg.md", history=history, message=user_instruction
+    )
+
+    # if query preparation by AI is enabled
+    if set["memory_recall_query_prep"]:
+        try:
+            # same conversation, reuse its query so the search results are reused too
+            queries = recall_cache.QueryCache.get()
+            query_key = recall_cache.get_key(message, system=system)
+            query = queries.get_query(query_key)
+            if query is not None:
+                log_item.update(query=query)
+            else:
                 # call util llm to generate search query from the conversation
-                query = await self.agent.call_utility_model(
+                query = await agent.call_utility_model(
                     system=system,
                     message=message,
                     callback=log_callback,
                 )
                 query = query.strip()
-            except Exception as e:
-                err = errors.format_error(e)
-                self.agent.context.log.log(
-                    type="error", heading="Recall memories extension error:", content=err
-                )
-                query = ""
-
-            # no query, no search
-            if not query:
-                log_item.update(
-                    heading="Failed to generate memory query",
-                )
-                return
-        
-        # otherwise use the message and history as query
-        else:
-            query = user_instruction + "\n\n" + history
+                if query:
+                    queries.set_query(query_key, query)
+        except Exception as e:
+            err = errors.format_error(e)
+            agent.context.log.log(
+                type="error", heading="Recall memories extension error:", content=err
+            )
+            query = ""
 
-        # if there is no query (or just dash by the LLM), do not continue
-        if not query or len(query) <= 3:
+        # no query, no search
+        if not query:
             log_item.update(
-                query="No relevant memory query generated, skipping search",
+                heading="Failed to generate memory query",
             )
-            return
+            return [], []
 
-        # get memory database
-        db = await Memory.get(self.agent)
+    # otherwise use the message and history as query
+    else:
+        query = user_instruction + "\n\n" + history
 
-        # search for general memories and fragments
-        memories = await db.search_similarity_threshold(
-            query=query,
-            limit=set["memory_recall_memories_max_search"],
-            threshold=set["memory_recall_similarity_threshold"],
-            filter=f"area == '{Memory.Area.MAIN.value}' or area == '{Memory.Area.FRAGMENTS.value}'",  # exclude solutions
+    # if there is no query (or just dash by the LLM), do not continue
+    if not query or len(query) <= 3:
+        log_item.update(
+            query="No relevant memory query generated, skipping search",
         )
-
-        # search for solutions
-        solutions = await db.search_similarity_threshold(
-            query=query,
-            limit=set["memory_recall_solutions_max_search"],
-            threshold=set["memory_recall_similarity_threshold"],
-            filter=f"area == '{Memory.Area.SOLUTIONS.value}'",  # exclude solutions
+        return [], []
+
+    # get memory database
+    db = await Memory.get(agent)
+
+    # same query on unchanged memory, reuse the last search
+    cache = recall_cache.RecallCache.get(db.memory_subdir)
+    version = db.db.version
+    key = recall_cache.get_key(
+        query,
+        memories=set["memory_recall_memories_max_search"],
+        solutions=set["memory_recall_solutions_max_search"],
+        threshold=set["memory_recall_similarity_threshold"],
+        hybrid=set["memory_recall_hybrid"],
+    )
+    cached = cache.get_result(key, version)
+    if cached is not None:
+        memories, solutions = cached
+    else:
+        # search for general memories and fragments, and for solutions
+        memories, solutions = await asyncio.gather(
+            db.search_similarity_threshold(
+                query=query,
+                limit=set["memory_recall_memories_max_search"],
+                threshold=set["memory_recall_similarity_threshold"],
+                filter=f"area == '{Memory.Area.MAIN.value}' or area == '{Memory.Area.FRAGMENTS.value}'",  # exclude solutions
+                hybrid=set["memory_recall_hybrid"],
+            ),
+            db.search_similarity_threshold(
+                query=query,
+                limit=set["memory_recall_solutions_max_search"],
+                threshold=set["memory_recall_similarity_threshold"],
+                filter=f"area == '{Memory.Area.SOLUTIONS.value}'",  # exclude solutions
+                hybrid=set["memory_recall_hybrid"],
+            ),
         )
+        cache.set_result(key, version, (memories, solutions))
 
-        if not memories and not solutions:
-            log_item.update(
-                heading="No memories or solutions found",
+    if not memories and not solutions:
+        log_item.update(
+            heading="No memories or solutions found",
+        )
+        return [], []
+
+    # if post filtering is enabled
+    if set["memory_recall_post_filter"]:
+        # assemble an enumerated dict of memories and solutions for AI validation
+        mems_list = {i: memory.page_content for i, memory in enumerate(memories + solutions)}
+
+        # call AI to validate the memories
+        try:
+            filter = await agent.call_utility_model(
+                system=agent.read_prompt("memory.memories_filter.sys.md"),
+                message=agent.read_prompt(
+                    "memory.memories_filter.msg.md",
+                    memories=mems_list,
+                    history=history,
+                    message=user_instruction,
+                ),
             )
-            return
-
-        # if post filtering is enabled
-        if set["memory_recall_post_filter"]:
-            # assemble an enumerated dict of memories and solutions for AI validation
-            mems_list = {i: memory.page_content for i, memory in enumerate(memories + solutions)}
-
-            # call AI to validate the memories
-            try:
-                filter = await self.agent.call_utility_model(
-                    system=self.agent.read_prompt("memory.memories_filter.sys.md"),
-                    message=self.agent.read_prompt(
-                        "memory.memories_filter.msg.md",
-                        memories=mems_list,
-                        history=history,
-                        message=user_instruction,
-                    ),
-                )
-                filter_inds = dirty_json.try_parse(filter)
-
-                # filter memories and solutions based on filter_inds
-                filtered_memories = []
-                filtered_solutions = []
-                mem_len = len(memories)
-
-                # process each index in filter_inds
-                # make sure filter_inds is a list and contains valid integers
-                if isinstance(filter_inds, list):
-                    for idx in filter_inds:
-                        if isinstance(idx, int):
-                            if idx < mem_len:
-                                # this is a memory
-                                filtered_memories.append(memories[idx])
-                            else:
-                                # this is a solution, adjust index
-                                sol_idx = idx - mem_len
-                                if sol_idx < len(solutions):
-                                    filtered_solutions.append(solutions[sol_idx])
-
-                # replace original lists with filtered ones
-                memories = filtered_memories
-                solutions = filtered_solutions
-
-            except Exception as e:
-                err = errors.format_error(e)
-                self.agent.context.log.log(
-                    type="error", heading="Failed to filter relevant memories", content=err
-                )
-                filter_inds = []
+            filter_inds = dirty_json.try_parse(filter)
+
+            # filter memories and solutions based on filter_inds
+            filtered_memories = []
+            filtered_solutions = []
+            mem_len = len(memories)
+
+            # process each index in filter_inds
+            # make sure filter_inds is a list and contains valid integers
+            if isinstance(filter_inds, list):
+                for idx in filter_inds:
+                    if isinstance(idx, int):
+                        if idx < mem_len:
+                            # this is a memory
+                            filtered_memories.append(memories[idx])
+                        else:
+                            # this is a solution, adjust index
+                            sol_idx = idx - mem_len
+                            if sol_idx < len(solutions):
+                                filtered_solutions.append(solutions[sol_idx])
+
+            # replace original lists with filtered ones
+            memories = filtered_memories
+            solutions = filtered_solutions
+
+        except Exception as e:
+            err = errors.format_error(e)
+            agent.context.log.log(
+                type="error", heading="Failed to filter relevant memories", content=err
+            )
+            filter_inds = []
 
 
-        # limit the number of memories and solutions
-        memories = memories[: set["memory_recall_memories_max_result"]]
-        solutions = solutions[: set["memory_recall_solutions_max_result"]]
+    # limit the number of memories and solutions
+    memories = memories[: set["memory_recall_memories_max_result"]]
+    solutions = solutions[: set["memory_recall_solutions_max_result"]]
 
-        # log the search result
-        log_item.update(
-            heading=f"{len(memories)} memories and {len(solutions)} relevant solutions found",
-        )
+    # log the search result
+    log_item.update(
+        heading=f"{len(memories)} memories and {len(solutions)} relevant solutions found",
+    )
 
-        memories_txt = "\n\n".join([mem.page_content for mem in memories]) if memories else ""
-        solutions_txt = "\n\n".join([sol.page_content for sol in solutions]) if solutions else ""
+    # log the full results
+    if memories:
+        log_item.update(memories="\n\n".join([mem.page_content for mem in memories]))
+    if solutions:
+        log_item.update(solutions="\n\n".join([sol.page_content for sol in solutions]))
 
-        # log the full results
-        if memories_txt:
-            log_item.update(memories=memories_txt)
-        if solutions_txt:
-            log_item.update(solutions=solutions_txt)
-
-        # place to prompt
-        if memories_txt:
-            extras["memories"] = self.agent.parse_prompt(
-                "agent.system.memories.md", memories=memories_txt
-            )
-        if solutions_txt:
-            extras["solutions"] = self.agent.parse_prompt(
-                "agent.system.solutions.md", solutions=solutions_txt
-            )
+    return memories, solutions
@@ -2,13 +2,18 @@ from python.helpers.extension import Extension
 from agent import LoopData
 from python.extensions.message_loop_end._10_organize_history import DATA_NAME_TASK
 import asyncio
+import time
 
 
 class OrganizeHistoryWait(Extension):
     async def execute(self, loop_data: LoopData = LoopData(), **kwargs):
+        start = None
 
         # sync action only required if the history is too large, otherwise leave it in background
         while self.agent.history.is_over_limit():
+            if start is None:
+                start = time.perf_counter()
+
             # get task
             task = self.agent.get_data(DATA_NAME_TASK)
 
@@ -27,3 +32,7 @@ class OrganizeHistoryWait(Extension):
                 self.agent.context.log.set_progress("Compressing history...")
                 await self.agent.history.compress()
 
+        # record whether this prompt had to wait for compression
+        self.agent.history.compression_stats.record_check(
+            time.perf_counter() - start if start is not None else None
+        )
@@ -88,81 +88,65 @@ class MemorizeMemories(Extension):
             memories_txt = "\n\n".join([str(memory) for memory in memories]).strip()
             log_item.update(heading=f"{len(memories)} entries to memorize.", memories=memories_txt)
 
+        # exact and near duplicates of existing memories are not processed further
+        texts, skipped, merged = await db.filter_duplicates(
+            [f"{memory}" for memory in memories],
+            Memory.Area.FRAGMENTS.value,
+            set["memory_memorize_dedup_threshold"],
+        )
+        if skipped or merged:
+            log_item.update(duplicates_skipped=skipped, duplicates_merged=merged)
+        if not texts:
+            log_item.update(heading=f"No new information to memorize, {skipped + merged} duplicates.")
+            return
+
         # Process memories with intelligent consolidation
         total_processed = 0
         total_consolidated = 0
         rem = []
 
-        for memory in memories:
-            # Convert memory to plain text
-            txt = f"{memory}"
-
-            if set["memory_memorize_consolidation"]:
-                
-                try:
-                    # Use intelligent consolidation system
-                    from python.helpers.memory_consolidation import create_memory_consolidator
-                    consolidator = create_memory_consolidator(
-                        self.agent,
-                        similarity_threshold=DEFAULT_MEMORY_THRESHOLD,  # More permissive for discovery
-                        max_similar_memories=8,
-                        max_llm_context_memories=4
-                    )
+        if set["memory_memorize_consolidation"]:
 
-                    # Create memory item-specific log for detailed tracking
-                    memory_log = None # too many utility messages, skip log for now
-                    # memory_log = self.agent.context.log.log(
-                    #     type="util",
-                    #     heading=f"Processing memory fragment: {txt[:50]}...",
-                    #     temp=False,
-                    #     update_progress="none"  # Don't affect status bar
-                    # )
-
-                    # Process with intelligent consolidation
-                    result_obj = await consolidator.process_new_memory(
-                        new_memory=txt,
-                        area=Memory.Area.FRAGMENTS.value,
-                        metadata={"area": Memory.Area.FRAGMENTS.value},
-                        log_item=memory_log
-                    )
+            try:
+                # Use intelligent consolidation system, all fragments in one batch
+                from python.helpers.memory_consolidation import create_memory_consolidator
+                consolidator = create_memory_consolidator(
+                    self.agent,
+                    similarity_threshold=DEFAULT_MEMORY_THRESHOLD,  # More permissive for discovery
+                    max_similar_memories=8,
+                    max_llm_context_memories=4
+                )
 
-                    # Update the individual log item with completion status but keep it temporary
-                    if result_obj.get("success"):
-                        total_consolidated += 1
-                        if memory_log:
-                            memory_log.update(
-                                result="Fragment processed successfully",
-                                heading=f"Memory fragment completed: {txt[:50]}...",
-                                temp=False,  # Show completion message
-                                update_progress="none"  # Show briefly then disappear
-                            )
-                    else:
-                        if memory_log:
-                            memory_log.update(
-                                result="Fragment processing failed",
-                                heading=f"Memory fragment failed: {txt[:50]}...",
-                                temp=False,  # Show completion message
-                                update_progress="none"  # Show briefly then disappear
-                            )
-                    total_processed += 1
-
-                except Exception as e:
-                    # Log error but continue processing
-                    log_item.update(consolidation_error=str(e))
-                    total_processed += 1
-
-                # Update final results with structured logging
-                log_item.update(
-                    heading=f"Memorization completed: {total_processed} memories processed, {total_consolidated} intelligently consolidated",
-                    memories=memories_txt,
-                    result=f"{total_processed} memories processed, {total_consolidated} intelligently consolidated",
-                    memories_processed=total_processed,
-                    memories_consolidated=total_consolidated,
-                    update_progress="none"
+                # too many utility messages, skip per fragment log
+                result_obj = await consolidator.process_new_memories(
+                    new_memories=texts,
+                    area=Memory.Area.FRAGMENTS.value,
+                    metadata={"area": Memory.Area.FRAGMENTS.value},
+                    log_item=None
                 )
 
-            else:
+                total_processed = len(texts)
+                if result_obj.get("success"):
+                    total_consolidated = len(texts)
+
+            except Exception as e:
+                # Log error, the fragments stay unprocessed
+                log_item.update(consolidation_error=str(e))
+                total_processed = len(texts)
+
+            # Update final results with structured logging
+            log_item.update(
+                heading=f"Memorization completed: {total_processed} memories processed, {total_consolidated} intelligently consolidated",
+                memories=memories_txt,
+                result=f"{total_processed} memories processed, {total_consolidated} intelligently consolidated",
+                memories_processed=total_processed,
+                memories_consolidated=total_consolidated,
+                update_progress="none"
+            )
+
+        else:
 
+            for txt in texts:
                 # remove previous fragments too similiar to this one
                 if set["memory_memorize_replace_threshold"] > 0:
                     rem += await db.delete_documents_by_query(
@@ -178,12 +162,11 @@ class MemorizeMemories(Extension):
                 await db.insert_text(text=txt, metadata={"area": Memory.Area.FRAGMENTS.value})
 
                 log_item.update(
-                    result=f"{len(memories)} entries memorized.",
-                    heading=f"{len(memories)} entries memorized.",
+                    result=f"{len(texts)} entries memorized.",
+                    heading=f"{len(texts)} entries memorized.",
                 )
                 if rem:
                     log_item.stream(result=f"\nReplaced {len(rem)} previous memories.")
-            
 
 
 
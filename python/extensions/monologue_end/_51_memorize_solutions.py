@@ -90,84 +90,74 @@ class MemorizeSolutions(Extension):
                 heading=f"{len(solutions)} successful solutions to memorize.", solutions=solutions_txt
             )
 
-        # Process solutions with intelligent consolidation
-        total_processed = 0
-        total_consolidated = 0
-        rem = []
-
+        texts = []
         for solution in solutions:
             # Convert solution to structured text
             if isinstance(solution, dict):
                 problem = solution.get('problem', 'Unknown problem')
                 solution_text = solution.get('solution', 'Unknown solution')
-                txt = f"# Problem\n {problem}\n# Solution\n {solution_text}"
+                texts.append(f"# Problem\n {problem}\n# Solution\n {solution_text}")
             else:
                 # If solution is not a dict, convert it to string
-                txt = f"# Solution\n {str(solution)}"
-
-            if set["memory_memorize_consolidation"]:
-                try:
-                    # Use intelligent consolidation system
-                    from python.helpers.memory_consolidation import create_memory_consolidator
-                    consolidator = create_memory_consolidator(
-                        self.agent,
-                        similarity_threshold=DEFAULT_MEMORY_THRESHOLD,  # More permissive for discovery
-                        max_similar_memories=6,    # Fewer for solutions (more complex)
-                        max_llm_context_memories=3
-                    )
+                texts.append(f"# Solution\n {str(solution)}")
 
-                    # Create solution-specific log for detailed tracking
-                    solution_log = None # too many utility messages, skip log for now
-                    # solution_log = self.agent.context.log.log(
-                    #     type="util",
-                    #     heading=f"Processing solution: {txt[:50]}...",
-                    #     temp=False,
-                    #     update_progress="none"  # Don't affect status bar
-                    # )
-
-                    # Process with intelligent consolidation
-                    result_obj = await consolidator.process_new_memory(
-                        new_memory=txt,
-                        area=Memory.Area.SOLUTIONS.value,
-                        metadata={"area": Memory.Area.SOLUTIONS.value},
-                        log_item=solution_log
-                    )
+        # exact and near duplicates of existing solutions are not processed further
+        texts, skipped, merged = await db.filter_duplicates(
+            texts, Memory.Area.SOLUTIONS.value, set["memory_memorize_dedup_threshold"]
+        )
+        if skipped or merged:
+            log_item.update(duplicates_skipped=skipped, duplicates_merged=merged)
+        if not texts:
+            log_item.update(heading=f"No new solutions to memorize, {skipped + merged} duplicates.")
+            return
 
-                    # Update the individual log item with completion status but keep it temporary
-                    if result_obj.get("success"):
-                        total_consolidated += 1
-                        if solution_log:
-                            solution_log.update(
-                                result="Solution processed successfully",
-                                heading=f"Solution completed: {txt[:50]}...",
-                                temp=False,  # Show completion message
-                                update_progress="none"  # Show briefly then disappear
-                            )
-                    else:
-                        if solution_log:
-                            solution_log.update(
-                                result="Solution processing failed",
-                                heading=f"Solution failed: {txt[:50]}...",
-                                temp=False,  # Show completion message
-                                update_progress="none"  # Show briefly then disappear
-                            )
-                    total_processed += 1
-
-                except Exception as e:
-                    # Log error but continue processing
-                    log_item.update(consolidation_error=str(e))
-                    total_processed += 1
-
-                # Update final results with structured logging
-                log_item.update(
-                    heading=f"Solution memorization completed: {total_processed} solutions processed, {total_consolidated} intelligently consolidated",
-                    solutions=solutions_txt,
-                    result=f"{total_processed} solutions processed, {total_consolidated} intelligently consolidated",
-                    solutions_processed=total_processed,
-                    solutions_consolidated=total_consolidated,
-                    update_progress="none"
+        # Process solutions with intelligent consolidation
+        total_processed = 0
+        total_consolidated = 0
+        rem = []
+
+        if set["memory_memorize_consolidation"]:
+
+            try:
+                # Use intelligent consolidation system, all solutions in one batch
+                from python.helpers.memory_consolidation import create_memory_consolidator
+                consolidator = create_memory_consolidator(
+                    self.agent,
+                    similarity_threshold=DEFAULT_MEMORY_THRESHOLD,  # More permissive for discovery
+                    max_similar_memories=6,    # Fewer for solutions (more complex)
+                    max_llm_context_memories=3
                 )
-            else:
+
+                # too many utility messages, skip per solution log
+                result_obj = await consolidator.process_new_memories(
+                    new_memories=texts,
+                    area=Memory.Area.SOLUTIONS.value,
+                    metadata={"area": Memory.Area.SOLUTIONS.value},
+                    log_item=None
+                )
+
+                total_processed = len(texts)
+                if result_obj.get("success"):
+                    total_consolidated = len(texts)
+
+            except Exception as e:
+                # Log error, the solutions stay unprocessed
+                log_item.update(consolidation_error=str(e))
+                total_processed = len(texts)
+
+            # Update final results with structured logging
+            log_item.update(
+                heading=f"Solution memorization completed: {total_processed} solutions processed, {total_consolidated} intelligently consolidated",
+                solutions=solutions_txt,
+                result=f"{total_processed} solutions processed, {total_consolidated} intelligently consolidated",
+                solutions_processed=total_processed,
+                solutions_consolidated=total_consolidated,
+                update_progress="none"
+            )
+
+        else:
+
+            for txt in texts:
                 # remove previous solutions too similiar to this one
                 if set["memory_memorize_replace_threshold"] > 0:
                     rem += await db.delete_documents_by_query(
@@ -183,13 +173,14 @@ class MemorizeSolutions(Extension):
                 await db.insert_text(text=txt, metadata={"area": Memory.Area.SOLUTIONS.value})
 
                 log_item.update(
-                    result=f"{len(solutions)} solutions memorized.",
-                    heading=f"{len(solutions)} solutions memorized.",
+                    result=f"{len(texts)} solutions memorized.",
+                    heading=f"{len(texts)} solutions memorized.",
                 )
                 if rem:
                     log_item.stream(result=f"\nReplaced {len(rem)} previous solutions.")
 
 
+
     # except Exception as e:
     #     err = errors.format_error(e)
     #     self.agent.context.log.log(
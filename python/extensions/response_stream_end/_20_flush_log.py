@@ -0,0 +1,11 @@
+from python.helpers.extension import Extension
+from agent import LoopData
+
+
+class FlushResponseLog(Extension):
+    async def execute(self, loop_data: LoopData = LoopData(), **kwargs):
+        # apply throttled stream updates and mask the final content in full
+        for key in ("log_item_generating", "log_item_response"):
+            log_item = loop_data.params_temporary.get(key)
+            if log_item:
+                log_item.flush()
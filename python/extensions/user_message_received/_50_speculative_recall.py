@@ -0,0 +1,9 @@
+from python.helpers.extension import Extension
+from python.extensions.message_loop_prompts_after._50_recall_memories import start_speculative_recall
+
+
+class SpeculativeRecall(Extension):
+    async def execute(self, **kwargs):
+        # recall runs while the monologue starts and the prompt is prepared,
+        # the recall extension picks up the result on the first iteration
+        start_speculative_recall(self.agent, self.agent.last_user_message)
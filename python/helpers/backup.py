@@ -71,6 +71,7 @@ class BackupService:
 # Memory (excluding embeddings cache)
 {agent_root}/memory/**
 !{agent_root}/memory/**/embeddings/**
+!{agent_root}/memory/embeddings.db*
 
 # Configuration and Settings (CRITICAL)
 {agent_root}/.env
@@ -0,0 +1,149 @@
+import gzip
+import hashlib
+import os
+import threading
+from typing import Any
+
+from python.helpers import files
+
+REF_KEY = "_blob_ref"
+MIN_LENGTH = 2000  # strings shorter than this stay inline when externalizing
+COMPRESSED_SUFFIX = ".gz"
+TEXT_SUFFIX = ".txt"  # uncompressed text, readable where the path is shown to the user
+SUFFIXES = (TEXT_SUFFIX, COMPRESSED_SUFFIX, "")  # one file per hash, whichever put first
+MISSING_CONTENT = "Content lost"
+
+
+class BlobStore:
+    """Content-addressed store, blobs are named by their SHA-256 and written only once.
+
+    The first put of a content decides its file, later puts of the same content use it
+    whether compressed or not, so a tool result saved as text is also the blob of its history message.
+    """
+
+    _stores: dict[str, "BlobStore"] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, root: str):
+        self.root = root
+        self.puts = 0
+        self.dedup_hits = 0
+        self.dedup_bytes = 0
+
+    @staticmethod
+    def get(root: str) -> "BlobStore":
+        with BlobStore._lock:
+            store = BlobStore._stores.get(root)
+            if store is None:
+                store = BlobStore(root)
+                BlobStore._stores[root] = store
+            return store
+
+    @staticmethod
+    def remove(root: str):
+        with BlobStore._lock:
+            BlobStore._stores.pop(root, None)
+
+    def put(self, data: str | bytes, compress: bool = False) -> str:
+        raw = data.encode("utf-8") if isinstance(data, str) else data
+        hash = hashlib.sha256(raw).hexdigest()
+        self.puts += 1
+
+        if self.find(hash):
+            self.dedup_hits += 1
+            self.dedup_bytes += len(raw)
+            return hash
+
+        path = self._path(hash, COMPRESSED_SUFFIX if compress else TEXT_SUFFIX if isinstance(data, str) else "")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(gzip.compress(raw, compresslevel=6) if compress else raw)
+        os.replace(tmp_path, path)
+        return hash
+
+    def get_bytes(self, hash: str) -> bytes | None:
+        path = self.find(hash)
+        if not path:
+            return None
+        with open(path, "rb") as f:
+            data = f.read()
+        if path.endswith(COMPRESSED_SUFFIX):
+            data = gzip.decompress(data)
+        return data
+
+    def get_text(self, hash: str) -> str | None:
+        data = self.get_bytes(hash)
+        return data.decode("utf-8", errors="replace") if data is not None else None
+
+    def find(self, hash: str) -> str | None:
+        for suffix in SUFFIXES:
+            path = self._path(hash, suffix)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def stats(self) -> dict:
+        blobs, disk_bytes = 0, 0
+        if os.path.isdir(self.root):
+            for dirpath, _dirnames, filenames in os.walk(self.root):
+                for name in filenames:
+                    if name.endswith(".tmp"):
+                        continue
+                    blobs += 1
+                    disk_bytes += os.path.getsize(os.path.join(dirpath, name))
+        return {
+            "blobs": blobs,
+            "disk_bytes": disk_bytes,
+            "puts": self.puts,
+            "dedup_hits": self.dedup_hits,
+            "dedup_bytes": self.dedup_bytes,
+        }
+
+    def _path(self, hash: str, suffix: str) -> str:
+        return os.path.join(self.root, hash[:2], hash + suffix)
+
+
+def is_ref(obj: Any) -> bool:
+    return isinstance(obj, dict) and REF_KEY in obj
+
+
+def externalize(store: BlobStore, obj: Any, min_length: int = MIN_LENGTH) -> Any:
+    """Replace long strings in a JSON-like structure with blob references."""
+    if isinstance(obj, str):
+        if len(obj) < min_length:
+            return obj
+        return {REF_KEY: store.put(obj, compress=True), "length": len(obj)}
+    if isinstance(obj, dict):
+        return {k: externalize(store, v, min_length) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [externalize(store, v, min_length) for v in obj]
+    return obj
+
+
+def resolve(store: BlobStore, obj: Any) -> Any:
+    """Replace blob references in a JSON-like structure with their content."""
+    if is_ref(obj):
+        text = store.get_text(obj[REF_KEY])
+        return text if text is not None else MISSING_CONTENT
+    if isinstance(obj, dict):
+        return {k: resolve(store, v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [resolve(store, v) for v in obj]
+    return obj
+
+
+def has_refs(obj: Any) -> bool:
+    if is_ref(obj):
+        return True
+    if isinstance(obj, dict):
+        return any(has_refs(v) for v in obj.values())
+    if isinstance(obj, list):
+        return any(has_refs(v) for v in obj)
+    return False
+
+
+def get_chat_store(ctxid: str) -> BlobStore:
+    from python.helpers.persist_chat import get_chat_msg_files_folder
+
+    return BlobStore.get(files.get_abs_path(get_chat_msg_files_folder(ctxid)))
@@ -0,0 +1,136 @@
+import math
+import re
+import threading
+from collections import Counter
+from typing import Any, Callable, Iterable
+
+K1 = 1.2  # term frequency saturation
+B = 0.75  # document length normalization
+QUERY_TERMS_MAX = 64  # rarest query terms scored, recall queries can be long
+RRF_K = 60  # rank offset of reciprocal rank fusion
+
+# words shared by unrelated texts, they are neither indexed nor searched
+STOPWORDS = frozenset(
+    """a about above after again against all am an and any are as at be because been before
+    being below between both but by can could did do does doing down during each few for from
+    further had has have having he her here hers herself him himself his how i if in into is it
+    its itself just me more most my myself no nor not now of off on once only or other our ours
+    ourselves out over own same she should so some such than that the their theirs them
+    themselves then there these they this those through to too under until up very was we were
+    what when where which while who whom why will with would you your yours yourself
+    yourselves""".split()
+)
+
+_TOKEN = re.compile(r"[\w./\\-]+")
+_PARTS = re.compile(r"[./\\_-]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase words without stopwords, identifiers and paths are kept whole and also split into parts."""
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        token = token.strip("./\\-_")
+        if not token or token in STOPWORDS:
+            continue
+        tokens.append(token)
+        parts = [part for part in _PARTS.split(token) if part]
+        if len(parts) > 1:
+            tokens += [part for part in parts if part not in STOPWORDS]
+    return tokens
+
+
+class Bm25Index:
+    """Incremental BM25 index of document texts by id."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.postings: dict[str, dict[str, int]] = {}
+        self.lengths: dict[str, int] = {}
+        self.terms: dict[str, tuple[str, ...]] = {}  # distinct terms per id, for removal
+        self.total_length = 0
+
+    @staticmethod
+    def build(docs: Iterable[tuple[str, Any]]) -> "Bm25Index":
+        index = Bm25Index()
+        for id, doc in docs:
+            index.add(id, doc.page_content)
+        return index
+
+    def add(self, id: str, text: str):
+        counts = Counter(tokenize(text))
+        with self.lock:
+            if id in self.lengths:
+                self._remove(id)
+            for term, count in counts.items():
+                self.postings.setdefault(term, {})[id] = count
+            length = sum(counts.values())
+            self.lengths[id] = length
+            self.terms[id] = tuple(counts)
+            self.total_length += length
+
+    def remove(self, id: str):
+        with self.lock:
+            self._remove(id)
+
+    def search(
+        self,
+        query: str,
+        k: int,
+        accept: Callable[[str], bool] | None = None,
+    ) -> list[tuple[str, float]]:
+        """Best k (id, score) pairs, accept filters ids before they are ranked.
+
+        Scores are relative to a document of average length containing each query term once,
+        terms no document contains count too, so matching few words of a query scores low.
+        """
+        with self.lock:
+            count = len(self.lengths)
+            if not count:
+                return []
+            query_terms = set(tokenize(query))
+            terms = [term for term in query_terms if term in self.postings]
+            terms.sort(key=lambda term: len(self.postings[term]))
+            terms = terms[:QUERY_TERMS_MAX]
+            # terms no document contains lower the scores of documents matching the others
+            unknown = min(len(query_terms) - len(terms), QUERY_TERMS_MAX)
+            total = unknown * math.log(1 + (count + 0.5) / 0.5)
+            avg_length = self.total_length / count
+            scores: dict[str, float] = {}
+            for term in terms:
+                postings = self.postings[term]
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                total += idf
+                for id, tf in postings.items():
+                    norm = K1 * (1 - B + B * self.lengths[id] / avg_length)
+                    scores[id] = scores.get(id, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+        if not total:
+            return []
+        ranked = sorted(
+            ((id, min(1.0, score / total)) for id, score in scores.items()),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+        if accept:
+            ranked = [item for item in ranked if accept(item[0])]
+        return ranked[:k]
+
+    def _remove(self, id: str):
+        length = self.lengths.pop(id, None)
+        if length is None:
+            return
+        self.total_length -= length
+        for term in self.terms.pop(id, ()):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(id, None)
+                if not postings:
+                    del self.postings[term]
+
+
+def fuse(rankings: list[list[str]], k: int = RRF_K) -> list[tuple[str, float]]:
+    """Reciprocal rank fusion of ranked id lists, best first."""
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, id in enumerate(ranking):
+            scores[id] = scores.get(id, 0.0) + 1 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,101 @@
+import json
+import zlib
+from typing import Any
+
+try:
+    import msgpack
+
+    MSGPACK_AVAILABLE = True
+except ImportError:  # fall back to compact json payloads
+    MSGPACK_AVAILABLE = False
+
+try:
+    import zstandard
+
+    ZSTD_AVAILABLE = True
+except ImportError:  # fall back to zlib compression
+    ZSTD_AVAILABLE = False
+
+
+MAGIC = b"A0C"
+VERSION = 1
+
+ENCODING_MSGPACK = 1
+ENCODING_JSON = 2
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZSTD = 1
+COMPRESSION_ZLIB = 2
+
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 1
+
+
+class ChatFormatError(Exception):
+    pass
+
+
+def dumps(data: Any, compress: bool | None = None) -> bytes:
+    """Encode data into the versioned compact chat format.
+
+    By default payloads are compressed only when zstd is available, zlib is
+    offered as an explicit fallback as it costs more time than it saves on save.
+    """
+    if compress is None:
+        compress = ZSTD_AVAILABLE
+
+    if MSGPACK_AVAILABLE:
+        encoding = ENCODING_MSGPACK
+        payload = msgpack.packb(data, default=_default, use_bin_type=True)
+    else:
+        encoding = ENCODING_JSON
+        payload = json.dumps(
+            data, default=_default, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+
+    compression = COMPRESSION_NONE
+    if compress:
+        if ZSTD_AVAILABLE:
+            compression = COMPRESSION_ZSTD
+            payload = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(payload)
+        else:
+            compression = COMPRESSION_ZLIB
+            payload = zlib.compress(payload, ZLIB_LEVEL)
+
+    return MAGIC + bytes([VERSION, encoding, compression]) + payload
+
+
+def loads(data: bytes) -> Any:
+    """Decode data written by dumps."""
+    if not is_compact(data):
+        raise ChatFormatError("Not a compact chat file")
+    version, encoding, compression = data[3], data[4], data[5]
+    if version > VERSION:
+        raise ChatFormatError(f"Unsupported chat format version {version}")
+    payload = data[6:]
+
+    if compression == COMPRESSION_ZSTD:
+        if not ZSTD_AVAILABLE:
+            raise ChatFormatError("zstandard is required to read this chat file")
+        payload = zstandard.ZstdDecompressor().decompress(payload)
+    elif compression == COMPRESSION_ZLIB:
+        payload = zlib.decompress(payload)
+    elif compression != COMPRESSION_NONE:
+        raise ChatFormatError(f"Unknown compression {compression}")
+
+    if encoding == ENCODING_MSGPACK:
+        if not MSGPACK_AVAILABLE:
+            raise ChatFormatError("msgpack is required to read this chat file")
+        return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+    if encoding == ENCODING_JSON:
+        return json.loads(payload.decode("utf-8"))
+    raise ChatFormatError(f"Unknown encoding {encoding}")
+
+
+def is_compact(data: bytes) -> bool:
+    return data[: len(MAGIC)] == MAGIC and len(data) >= len(MAGIC) + 3
+
+
+def _default(obj: Any):
+    # same policy as the json chat files, values that cannot be serialized are dropped
+    return None
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any
+
+import numpy as np
+
+MAX_BYTES = 512 * 2**20  # stored texts, chunks and vectors of all cached documents
+EVICT_RATIO = 0.1  # share of MAX_BYTES freed by removing least recently used documents when full
+
+
+class DocumentCache:
+    """Extracted texts of documents with their chunks and chunk vectors in a single SQLite file.
+
+    A document is found by its uri and a validator of the source (file stat, ETag or
+    Last-Modified) before it is fetched, or by the hash of its text once extracted.
+    Vectors are kept per embedding model and dropped when the text changes.
+    """
+
+    _caches: dict[str, "DocumentCache"] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, path: str, max_bytes: int = MAX_BYTES):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "uri TEXT PRIMARY KEY, validator TEXT NOT NULL, text_hash TEXT NOT NULL, "
+            "text BLOB NOT NULL, chunking TEXT NOT NULL, chunks BLOB, "
+            "size INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            "uri TEXT NOT NULL, model TEXT NOT NULL, value BLOB NOT NULL, "
+            "PRIMARY KEY (uri, model)) WITHOUT ROWID"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS documents_accessed ON documents (accessed)")
+        self.size = self.conn.execute(
+            "SELECT (SELECT COALESCE(SUM(size), 0) FROM documents) + "
+            "(SELECT COALESCE(SUM(LENGTH(value)), 0) FROM vectors)"
+        ).fetchone()[0]
+        self.hits = 0
+        self.text_hits = 0
+        self.vector_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def get(path: str) -> "DocumentCache":
+        """Cache of a file, shared by all contexts of the process."""
+        with DocumentCache._lock:
+            cache = DocumentCache._caches.get(path)
+            if cache is None:
+                cache = DocumentCache(path)
+                DocumentCache._caches[path] = cache
+            return cache
+
+    def get_document(self, uri: str, validator: str = "", text_hash: str = "") -> dict[str, Any] | None:
+        """Cached text and chunks of a document with an unchanged source or text, None otherwise.
+
+        Counted as a hit by validator, when the document need not be fetched, or by text.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT validator, text_hash, text, chunking, chunks FROM documents WHERE uri = ?",
+                (uri,),
+            ).fetchone()
+            found = row is not None and (
+                (validator and row[0] == validator) or (text_hash and row[1] == text_hash)
+            )
+            if not found:
+                if validator:
+                    self.misses += 1
+                return None
+            self.conn.execute("UPDATE documents SET accessed = ? WHERE uri = ?", (time.time(), uri))
+        if validator and row[0] == validator:
+            self.hits += 1
+        else:
+            self.text_hits += 1
+        return {
+            "validator": row[0],
+            "text_hash": row[1],
+            "text": zlib.decompress(row[2]).decode("utf-8"),
+            "chunking": row[3],
+            "chunks": json.loads(zlib.decompress(row[4])) if row[4] is not None else None,
+        }
+
+    def put_document(
+        self,
+        uri: str,
+        validator: str,
+        text: str,
+        chunking: str = "",
+        chunks: list[str] | None = None,
+    ):
+        """Store the text of a document, vectors are kept only when its text and chunks are unchanged."""
+        text_hash = get_text_hash(text)
+        text_blob = zlib.compress(text.encode("utf-8"))
+        chunks_blob = zlib.compress(json.dumps(chunks).encode("utf-8")) if chunks is not None else None
+        size = len(text_blob) + len(chunks_blob or b"")
+        with self.lock:
+            conn = self.conn
+            conn.execute("BEGIN")
+            try:
+                row = conn.execute(
+                    "SELECT text_hash, chunking, chunks IS NOT NULL, size FROM documents WHERE uri = ?",
+                    (uri,),
+                ).fetchone()
+                if row is not None:
+                    self.size -= row[3]
+                    if row[0] != text_hash or (chunks is not None and row[2] and row[1] != chunking):
+                        self._delete_vectors(uri)
+                    elif chunks is None and row[2]:
+                        # same text, the stored chunks and their vectors stay valid
+                        conn.execute(
+                            "UPDATE documents SET validator = ?, accessed = ? WHERE uri = ?",
+                            (validator, time.time(), uri),
+                        )
+                        self.size += row[3]
+                        conn.execute("COMMIT")
+                        return
+                conn.execute(
+                    "INSERT OR REPLACE INTO documents "
+                    "(uri, validator, text_hash, text, chunking, chunks, size, accessed) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (uri, validator, text_hash, text_blob, chunking, chunks_blob, size, time.time()),
+                )
+                self.size += size
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def get_vectors(self, uri: str, model: str) -> np.ndarray | None:
+        """Vectors of the cached chunks of a document by an embedding model."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM vectors WHERE uri = ? AND model = ?", (uri, model)
+            ).fetchone()
+        if row is None:
+            return None
+        self.vector_hits += 1
+        dim = int(np.frombuffer(row[0][:4], dtype=np.int32)[0])
+        return np.frombuffer(row[0][4:], dtype=np.float32).reshape(-1, dim)
+
+    def put_vectors(self, uri: str, model: str, vectors: np.ndarray | list[list[float]]):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        value = np.int32(vectors.shape[1]).tobytes() + vectors.tobytes()
+        with self.lock:
+            if self.conn.execute("SELECT 1 FROM documents WHERE uri = ?", (uri,)).fetchone() is None:
+                return  # evicted meanwhile
+            old = self.conn.execute(
+                "SELECT LENGTH(value) FROM vectors WHERE uri = ? AND model = ?", (uri, model)
+            ).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO vectors (uri, model, value) VALUES (?, ?, ?)", (uri, model, value)
+            )
+            self.size += len(value) - (old[0] if old else 0)
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def stats(self) -> dict:
+        with self.lock:
+            documents = self.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        return {
+            "documents": documents,
+            "bytes": self.size,
+            "hits": self.hits,
+            "text_hits": self.text_hits,
+            "vector_hits": self.vector_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _delete_vectors(self, uri: str):
+        freed = self.conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(value)), 0) FROM vectors WHERE uri = ?", (uri,)
+        ).fetchone()[0]
+        self.conn.execute("DELETE FROM vectors WHERE uri = ?", (uri,))
+        self.size -= freed
+
+    def _evict(self):
+        target = int(self.max_bytes * (1 - EVICT_RATIO))
+        rows = self.conn.execute("SELECT uri, size FROM documents ORDER BY accessed").fetchall()
+        self.conn.execute("BEGIN")
+        for uri, size in rows:
+            if self.size <= target:
+                break
+            self._delete_vectors(uri)
+            self.conn.execute("DELETE FROM documents WHERE uri = ?", (uri,))
+            self.size -= size
+            self.evictions += 1
+        self.conn.execute("COMMIT")
+
+
+def get_text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def get_file_validator(path: str) -> str:
+    """Validator of a local file, it changes with the file's modification time or size."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return ""
+    return f"stat:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def get_http_validator(headers: Any) -> str:
+    """Validator of a web document from response headers, empty when the server sends none."""
+    etag = headers.get("etag")
+    if etag:
+        return f"etag:{etag}"
+    modified = headers.get("last-modified")
+    if modified:
+        return f"modified:{modified}"
+    return ""
@@ -23,13 +23,15 @@ from langchain_core.documents import Document
 from langchain.schema import SystemMessage, HumanMessage
 
 from python.helpers.print_style import PrintStyle
-from python.helpers import files, errors
+from python.helpers import files, errors, document_cache
+from python.helpers.document_cache import DocumentCache
 from agent import Agent
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 
 DEFAULT_SEARCH_THRESHOLD = 0.5
+CACHE_FILE = "tmp/document_cache.db"  # extracted documents with chunks and vectors, shared by all contexts
 
 
 class DocumentQueryStore:
@@ -97,16 +99,31 @@ class DocumentQueryStore:
     def init_vector_db(self):
         return VectorDB(self.agent, cache=True)
 
+    @staticmethod
+    def get_cache() -> DocumentCache:
+        """Persistent cache of extracted documents, their chunks and vectors."""
+        return DocumentCache.get(files.get_abs_path(CACHE_FILE))
+
+    def get_embedding_model_id(self) -> str:
+        model = self.agent.config.embeddings_model
+        return files.safe_file_name(model.provider + "_" + model.name)
+
     async def add_document(
-        self, text: str, document_uri: str, metadata: dict | None = None
+        self,
+        text: str,
+        document_uri: str,
+        metadata: dict | None = None,
+        validator: str = "",
     ) -> tuple[bool, list[str]]:
         """
         Add a document to the store with the given URI.
+        Chunks and their vectors are reused from the document cache when the text is unchanged.
 
         Args:
             text: The document text content
             document_uri: The URI that uniquely identifies this document
             metadata: Optional metadata for the document
+            validator: Validator of the document source for the document cache
 
         Returns:
             True if successful, False otherwise
@@ -122,11 +139,23 @@ class DocumentQueryStore:
         doc_metadata["document_uri"] = document_uri
         doc_metadata["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-        # Split text into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.DEFAULT_CHUNK_SIZE, chunk_overlap=self.DEFAULT_CHUNK_OVERLAP
-        )
-        chunks = text_splitter.split_text(text)
+        # Split text into chunks, unless cached for the same text
+        cache = self.get_cache()
+        chunking = f"{self.DEFAULT_CHUNK_SIZE}/{self.DEFAULT_CHUNK_OVERLAP}"
+        text_hash = document_cache.get_text_hash(text)
+        cached = cache.get_document(document_uri, text_hash=text_hash)
+        vectors = None
+        if cached and cached["chunks"] is not None and cached["chunking"] == chunking:
+            chunks = cached["chunks"]
+            vectors = cache.get_vectors(document_uri, self.get_embedding_model_id())
+            if validator and cached["validator"] != validator:
+                cache.put_document(document_uri, validator, text)  # touched, but the same text
+        else:
+            text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=self.DEFAULT_CHUNK_SIZE, chunk_overlap=self.DEFAULT_CHUNK_OVERLAP
+            )
+            chunks = text_splitter.split_text(text)
+            cache.put_document(document_uri, validator, text, chunking, chunks)
 
         # Create documents
         docs = []
@@ -145,9 +174,14 @@ class DocumentQueryStore:
             if not self.vector_db:
                 self.vector_db = self.init_vector_db()
 
-            ids = await self.vector_db.insert_documents(docs)
+            cached_vectors = vectors is not None and len(vectors) == len(docs)
+            if not cached_vectors:
+                vectors = await self.vector_db.embeddings.aembed_documents(chunks)
+                cache.put_vectors(document_uri, self.get_embedding_model_id(), vectors)
+            ids = await self.vector_db.insert_documents(docs, [list(v) for v in vectors])  # type: ignore
             PrintStyle.standard(
                 f"Added document '{document_uri}' with {len(docs)} chunks"
+                + (" from cache" if cached_vectors else "")
             )
             return True, ids
         except Exception as e:
@@ -448,10 +482,10 @@ class DocumentQueryHelper:
         scheme = url.scheme or "file"
         mimetype, encoding = mimetypes.guess_type(document_uri)
         mimetype = mimetype or "application/octet-stream"
+        response: aiohttp.ClientResponse | None = None
 
         if mimetype == "application/octet-stream":
             if url.scheme in ["http", "https"]:
-                response: aiohttp.ClientResponse | None = None
                 retries = 0
                 last_error = ""
                 while not response and retries < 3:
@@ -512,7 +546,13 @@ class DocumentQueryHelper:
         document_content = ""
         if not exists:
             await self.agent.handle_intervention()
-            if mimetype.startswith("image/"):
+            validator = await self.get_validator(document_uri, scheme, response)
+            cache = self.store.get_cache()
+            cached = cache.get_document(document_uri_norm, validator) if validator else None
+            if cached:
+                self.progress_callback(f"Loaded document from cache")
+                document_content = cached["text"]
+            elif mimetype.startswith("image/"):
                 document_content = self.handle_image_document(document_uri, scheme)
             elif mimetype == "text/html":
                 document_content = self.handle_html_document(document_uri, scheme)
@@ -528,7 +568,7 @@ class DocumentQueryHelper:
                 self.progress_callback(f"Indexing document")
                 await self.agent.handle_intervention()
                 success, ids = await self.store.add_document(
-                    document_content, document_uri_norm
+                    document_content, document_uri_norm, validator=validator
                 )
                 if not success:
                     self.progress_callback(f"Failed to index document")
@@ -536,6 +576,8 @@ class DocumentQueryHelper:
                         f"DocumentQueryHelper::document_get_content: Failed to index document: {document_uri_norm}"
                     )
                 self.progress_callback(f"Indexed {len(ids)} chunks")
+            elif validator and not cached:
+                cache.put_document(document_uri_norm, validator, document_content)
         else:
             await self.agent.handle_intervention()
             doc = await self.store.get_document(document_uri_norm)
@@ -547,6 +589,28 @@ class DocumentQueryHelper:
                 )
         return document_content
 
+    async def get_validator(
+        self, document: str, scheme: str, response: aiohttp.ClientResponse | None = None
+    ) -> str:
+        """Validator of the document source for the document cache, empty when there is none."""
+        if scheme == "file":
+            return document_cache.get_file_validator(document)
+        if scheme not in ["http", "https"]:
+            return ""
+        if response is None:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    response = await session.head(
+                        document,
+                        timeout=aiohttp.ClientTimeout(total=2.0),
+                        allow_redirects=True,
+                    )
+            except Exception:
+                return ""  # validated by the hash of the text once fetched
+            if response.status > 399:
+                return ""
+        return document_cache.get_http_validator(response.headers)
+
     def handle_image_document(self, document: str, scheme: str) -> str:
         return self.handle_unstructured_document(document, scheme)
 
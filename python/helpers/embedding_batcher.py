@@ -0,0 +1,163 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List
+
+from langchain_core.embeddings import Embeddings
+
+MAX_BATCH_SIZE = 64  # texts sent to the provider or local model in one call
+LINGER = 0.005  # seconds to wait for more requests before a batch is dispatched
+IDLE_TIMEOUT = 60  # seconds after which an idle dispatcher thread exits
+
+
+class EmbeddingBatcher(Embeddings):
+    """Embeddings that merge concurrent requests into micro-batches.
+
+    Sync and async callers queue their texts for a dispatcher thread, which waits up to
+    linger seconds for more requests, embeds up to max_batch_size texts in one call of
+    the wrapped model and fans the vectors back out to the callers.
+    """
+
+    _batchers: dict[str, "EmbeddingBatcher"] = {}
+    _lock = threading.Lock()
+    _max_batch_size = MAX_BATCH_SIZE  # of shared batchers, set from the settings by configure
+    _linger = LINGER
+
+    def __init__(
+        self,
+        model: Embeddings,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        linger: float = LINGER,
+    ):
+        self.model = model
+        self.model_name = getattr(model, "model_name", "default")
+        self.max_batch_size = max(1, max_batch_size)
+        self.linger = max(0.0, linger)
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+        self._pending: list[tuple[list[str], Future]] = []
+        self._pending_texts = 0
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    @staticmethod
+    def get(key: str, factory: Callable[[], Embeddings]) -> "EmbeddingBatcher":
+        """Shared batcher for a model configuration, the model is created on first use."""
+        with EmbeddingBatcher._lock:
+            batcher = EmbeddingBatcher._batchers.get(key)
+            if batcher is None:
+                batcher = EmbeddingBatcher(
+                    factory(), EmbeddingBatcher._max_batch_size, EmbeddingBatcher._linger
+                )
+                EmbeddingBatcher._batchers[key] = batcher
+            return batcher
+
+    @staticmethod
+    def configure(max_batch_size: int, linger: float):
+        """Batch size and linger seconds of shared batchers, existing ones included."""
+        with EmbeddingBatcher._lock:
+            EmbeddingBatcher._max_batch_size = max(1, int(max_batch_size))
+            EmbeddingBatcher._linger = max(0.0, float(linger))
+            for batcher in EmbeddingBatcher._batchers.values():
+                with batcher._cond:
+                    batcher.max_batch_size = EmbeddingBatcher._max_batch_size
+                    batcher.linger = EmbeddingBatcher._linger
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.submit(texts).result()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.submit([text]).result()[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.wrap_future(self.submit(texts))
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def submit(self, texts: List[str]) -> Future:
+        future: Future = Future()
+        if not texts:
+            future.set_result([])
+            return future
+        with self._cond:
+            self._pending.append((list(texts), future))
+            self._pending_texts += len(texts)
+            self.requests += 1
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="embedding-batcher", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch": round(self.texts / self.batches, 2) if self.batches else 0,
+        }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._pending:
+                    self._cond.wait(IDLE_TIMEOUT)
+                    if not self._pending:
+                        self._thread = None
+                        return
+                # linger for more requests unless the batch is already full
+                deadline = time.monotonic() + self.linger
+                while self._pending_texts < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take_batch()
+            if batch:
+                self._dispatch(batch)
+
+    def _take_batch(self) -> list[tuple[list[str], Future]]:
+        batch, count = [], 0
+        while self._pending:
+            texts, future = self._pending[0]
+            if batch and count + len(texts) > self.max_batch_size:
+                break
+            self._pending.pop(0)
+            self._pending_texts -= len(texts)
+            # skip requests of callers that gave up meanwhile
+            if future.set_running_or_notify_cancel():
+                batch.append((texts, future))
+                count += len(texts)
+        return batch
+
+    def _dispatch(self, batch: list[tuple[list[str], Future]]):
+        texts = [text for request, _ in batch for text in request]
+        try:
+            vectors = self._embed(texts)
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            # do not let one bad request fail the others
+            for request in batch:
+                self._dispatch([request])
+            return
+
+        pos = 0
+        for request, future in batch:
+            future.set_result(vectors[pos : pos + len(request)])
+            pos += len(request)
+
+    def _embed(self, texts: list[str]) -> list[list[float]]:
+        vectors = []
+        for i in range(0, len(texts), self.max_batch_size):
+            chunk = texts[i : i + self.max_batch_size]
+            vectors += self.model.embed_documents(chunk)
+            self.batches += 1
+            self.texts += len(chunk)
+        return vectors
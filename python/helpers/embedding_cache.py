@@ -0,0 +1,225 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Iterator, Optional, Sequence
+
+from langchain_core.stores import ByteStore
+
+from python.helpers.print_style import PrintStyle
+
+MAX_ENTRIES = 2_000_000  # cached vectors kept across all models
+EVICT_RATIO = 0.1  # share of least recently used entries removed when full
+MIGRATION_BATCH = 1000
+# keys of CacheBackedEmbeddings are the namespace followed by a uuid of the text hash
+KEY_HASH = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+# stored values, vectors are packed as float32, anything else is kept as is
+FORMAT_FLOAT32 = b"f"
+FORMAT_RAW = b"r"
+
+
+class _Database:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, hash TEXT NOT NULL, value BLOB NOT NULL, "
+            "accessed REAL NOT NULL, PRIMARY KEY (model, hash)) WITHOUT ROWID"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings (accessed)"
+        )
+        self.count = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self.evictions = 0
+
+
+class EmbeddingCache(ByteStore):
+    """Byte store for CacheBackedEmbeddings in a single SQLite file.
+
+    Keys are split into the model id (the cache namespace) and the text hash,
+    the least recently used entries are evicted once MAX_ENTRIES is exceeded.
+    """
+
+    _databases: dict[str, _Database] = {}
+    _migrated: set[tuple[str, str]] = set()
+    _lock = threading.Lock()
+
+    def __init__(self, path: str, namespace: str, max_entries: int = MAX_ENTRIES):
+        with EmbeddingCache._lock:
+            db = EmbeddingCache._databases.get(path)
+            if db is None:
+                db = _Database(path)
+                EmbeddingCache._databases[path] = db
+        self.db = db
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get(path: str, namespace: str, legacy_dir: str | None = None) -> "EmbeddingCache":
+        """Cache for a model, entries of a LocalFileStore in legacy_dir are migrated on first use."""
+        cache = EmbeddingCache(path, namespace)
+        if legacy_dir and (path, namespace) not in EmbeddingCache._migrated:
+            EmbeddingCache._migrated.add((path, namespace))
+            if os.path.isdir(legacy_dir):
+                cache.migrate(legacy_dir)
+        return cache
+
+    def mget(self, keys: Sequence[str]) -> list[Optional[bytes]]:
+        if not keys:
+            return []
+        hashes = [self._hash(key) for key in keys]
+        found: dict[str, bytes] = {}
+        with self.db.lock:
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i : i + 500]
+                rows = self.db.conn.execute(
+                    f"SELECT hash, value FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(chunk))})",
+                    [self.namespace, *chunk],
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self.db.conn.executemany(
+                    "UPDATE embeddings SET accessed = ? WHERE model = ? AND hash = ?",
+                    [(now, self.namespace, hash) for hash in found],
+                )
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return [_decode(found[hash]) if hash in found else None for hash in hashes]
+
+    def mset(self, key_value_pairs: Sequence[tuple[str, bytes]]) -> None:
+        if not key_value_pairs:
+            return
+        now = time.time()
+        rows = [(self.namespace, self._hash(key), _encode(value), now) for key, value in key_value_pairs]
+        self._insert(rows)
+
+    def mdelete(self, keys: Sequence[str]) -> None:
+        with self.db.lock:
+            deleted = self.db.conn.executemany(
+                "DELETE FROM embeddings WHERE model = ? AND hash = ?",
+                [(self.namespace, self._hash(key)) for key in keys],
+            ).rowcount
+            self.db.count -= max(0, deleted)
+
+    def yield_keys(self, *, prefix: str | None = None) -> Iterator[str]:
+        with self.db.lock:
+            hashes = [
+                row[0]
+                for row in self.db.conn.execute(
+                    "SELECT hash FROM embeddings WHERE model = ?", (self.namespace,)
+                )
+            ]
+        for hash in hashes:
+            key = self.namespace + hash
+            if not prefix or key.startswith(prefix):
+                yield key
+
+    def stats(self) -> dict:
+        with self.db.lock:
+            entries = self.db.conn.execute(
+                "SELECT COUNT(*) FROM embeddings WHERE model = ?", (self.namespace,)
+            ).fetchone()[0]
+        return {
+            "entries": entries,
+            "total_entries": self.db.count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.db.evictions,
+            "file_bytes": os.path.getsize(self.db.path) if os.path.exists(self.db.path) else 0,
+        }
+
+    def migrate(self, legacy_dir: str):
+        """Move entries of this model from a LocalFileStore folder into the database.
+
+        Only files named by the namespace and a key hash are moved, models whose namespace
+        starts with this one keep their files until they are migrated themselves.
+        """
+        names = [name for name in os.listdir(legacy_dir) if self._is_key(name)]
+        if not names:
+            return
+        PrintStyle.standard(f"Migrating {len(names)} cached embeddings to {self.db.path}...")
+        for i in range(0, len(names), MIGRATION_BATCH):
+            batch = names[i : i + MIGRATION_BATCH]
+            rows = []
+            for name in batch:
+                try:
+                    with open(os.path.join(legacy_dir, name), "rb") as f:
+                        rows.append((self.namespace, self._hash(name), _encode(f.read()), 0.0))
+                except OSError:
+                    continue
+            self._insert(rows)
+            # files are removed only once their batch is committed
+            for name in batch:
+                try:
+                    os.remove(os.path.join(legacy_dir, name))
+                except OSError:
+                    pass
+        try:
+            os.rmdir(legacy_dir)  # only succeeds once all models were migrated
+        except OSError:
+            pass
+
+    def _insert(self, rows: list[tuple]):
+        with self.db.lock:
+            conn = self.db.conn
+            conn.execute("BEGIN")
+            try:
+                before = conn.total_changes
+                conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (model, hash, value, accessed) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+                self.db.count += conn.total_changes - before
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            if self.db.count > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        remove = self.db.count - int(self.max_entries * (1 - EVICT_RATIO))
+        deleted = self.db.conn.execute(
+            "DELETE FROM embeddings WHERE (model, hash) IN "
+            "(SELECT model, hash FROM embeddings ORDER BY accessed LIMIT ?)",
+            (remove,),
+        ).rowcount
+        self.db.count -= max(0, deleted)
+        self.db.evictions += max(0, deleted)
+
+    def _is_key(self, name: str) -> bool:
+        return name.startswith(self.namespace) and KEY_HASH.fullmatch(name, len(self.namespace)) is not None
+
+    def _hash(self, key: str) -> str:
+        return key[len(self.namespace) :] if key.startswith(self.namespace) else key
+
+
+def _encode(value: bytes) -> bytes:
+    # CacheBackedEmbeddings stores vectors as json lists, float32 takes a fraction of the space
+    try:
+        vector = json.loads(value)
+        if isinstance(vector, list) and all(isinstance(v, (int, float)) for v in vector):
+            return FORMAT_FLOAT32 + array("f", vector).tobytes()
+    except (ValueError, UnicodeDecodeError):
+        pass
+    return FORMAT_RAW + value
+
+
+def _decode(value: bytes) -> bytes:
+    if value[:1] == FORMAT_FLOAT32:
+        vector = array("f")
+        vector.frombytes(value[1:])
+        return json.dumps(vector.tolist()).encode()
+    return value[1:]
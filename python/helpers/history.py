@@ -2,10 +2,12 @@ from abc import abstractmethod
 import asyncio
 from collections import OrderedDict
 from collections.abc import Mapping
+from dataclasses import dataclass
 import json
 import math
+import time
 from typing import Coroutine, Literal, TypedDict, cast, Union, Dict, List, Any
-from python.helpers import messages, tokens, settings, call_llm
+from python.helpers import messages, tokens, settings, call_llm, summary_cache, blob_store
 from enum import Enum
 from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, AIMessage
 
@@ -17,6 +19,8 @@ HISTORY_BULK_RATIO = 0.2
 TOPIC_COMPRESS_RATIO = 0.65
 LARGE_MESSAGE_TO_TOPIC_RATIO = 0.25
 RAW_MESSAGE_OUTPUT_TEXT_TRIM = 100
+COMPRESSION_SOFT_RATIO = 0.8  # background compression starts at this share of the history limit
+COMPRESSION_CONCURRENCY = 3  # max parallel utility model calls during compression
 
 
 class RawMessage(TypedDict):
@@ -39,6 +43,38 @@ class OutputMessage(TypedDict):
     content: MessageContent
 
 
+@dataclass
+class CompressionStats:
+    runs: int = 0
+    total_time: float = 0.0
+    last_time: float = 0.0
+    checks: int = 0
+    waits: int = 0
+    wait_time: float = 0.0
+
+    def record_run(self, duration: float):
+        self.runs += 1
+        self.total_time += duration
+        self.last_time = duration
+
+    def record_check(self, waited: float | None = None):
+        self.checks += 1
+        if waited is not None:
+            self.waits += 1
+            self.wait_time += waited
+
+    def output(self) -> dict:
+        return {
+            "runs": self.runs,
+            "avg_time": self.total_time / self.runs if self.runs else 0.0,
+            "last_time": self.last_time,
+            "checks": self.checks,
+            "waits": self.waits,
+            "wait_ratio": self.waits / self.checks if self.checks else 0.0,
+            "wait_time": self.wait_time,
+        }
+
+
 class Record:
     def __init__(self):
         pass
@@ -76,12 +112,44 @@ class Record:
 
 
 class Message(Record):
-    def __init__(self, ai: bool, content: MessageContent, tokens: int = 0):
+    def __init__(
+        self,
+        ai: bool,
+        content: MessageContent,
+        tokens: int = 0,
+        history: "History|None" = None,
+    ):
         self.ai = ai
-        self.content = content
+        self.history = history
+        self._content: MessageContent | None = content
+        self._stored: MessageContent | None = None  # content with blob references
         self.summary: str = ""
         self.tokens: int = tokens or self.calculate_tokens()
 
+    @property
+    def content(self) -> MessageContent:
+        # large content of loaded messages is resolved from the blob store on first use
+        if self._content is None:
+            if self.history and self._stored is not None:
+                self._content = blob_store.resolve(self.history.blob_store, self._stored)
+            else:
+                self._content = self._stored or ""
+        return self._content
+
+    @content.setter
+    def content(self, content: MessageContent):
+        self._content = content
+        self._stored = None
+
+    def get_stored_content(self) -> MessageContent:
+        # large strings are written once to the blob store and referenced afterwards
+        if self._stored is None:
+            if self.history:
+                self._stored = blob_store.externalize(self.history.blob_store, self.content)
+            else:
+                return self.content
+        return self._stored
+
     def get_tokens(self) -> int:
         if not self.tokens:
             self.tokens = self.calculate_tokens()
@@ -111,7 +179,7 @@ class Message(Record):
         return {
             "_cls": "Message",
             "ai": self.ai,
-            "content": self.content,
+            "content": self.get_stored_content(),
             "summary": self.summary,
             "tokens": self.tokens,
         }
@@ -119,7 +187,14 @@ class Message(Record):
     @staticmethod
     def from_dict(data: dict, history: "History"):
         content = data.get("content", "Content lost")
-        msg = Message(ai=data["ai"], content=content)
+        if blob_store.has_refs(content):
+            # keep references only, content is loaded lazily
+            msg = Message(
+                ai=data["ai"], content="", tokens=data.get("tokens", 0) or 1, history=history
+            )
+            msg._content, msg._stored = None, content
+        else:
+            msg = Message(ai=data["ai"], content=content, history=history)
         msg.summary = data.get("summary", "")
         msg.tokens = data.get("tokens", 0)
         return msg
@@ -140,7 +215,7 @@ class Topic(Record):
     def add_message(
         self, ai: bool, content: MessageContent, tokens: int = 0
     ) -> Message:
-        msg = Message(ai=ai, content=content, tokens=tokens)
+        msg = Message(ai=ai, content=content, tokens=tokens, history=self.history)
         self.messages.append(msg)
         return msg
 
@@ -209,7 +284,7 @@ class Topic(Record):
             sum_msg_content = self.history.agent.parse_prompt(
                 "fw.msg_summary.md", summary=summary
             )
-            sum_msg = Message(False, sum_msg_content)
+            sum_msg = Message(False, sum_msg_content, history=self.history)
             self.messages[1 : cnt_to_sum + 1] = [sum_msg]
             return True
         return False
@@ -217,13 +292,7 @@ class Topic(Record):
     async def summarize_messages(self, messages: list[Message]):
         # FIXME: vision bytes are sent to utility LLM, send summary instead
         msg_txt = [m.output_text() for m in messages]
-        summary = await self.history.agent.call_utility_model(
-            system=self.history.agent.read_prompt("fw.topic_summary.sys.md"),
-            message=self.history.agent.read_prompt(
-                "fw.topic_summary.msg.md", content=msg_txt
-            ),
-        )
-        return summary
+        return await self.history.summarize_content(msg_txt)
 
     def to_dict(self):
         return {
@@ -267,12 +336,7 @@ class Bulk(Record):
         return False
 
     async def summarize(self):
-        self.summary = await self.history.agent.call_utility_model(
-            system=self.history.agent.read_prompt("fw.topic_summary.sys.md"),
-            message=self.history.agent.read_prompt(
-                "fw.topic_summary.msg.md", content=self.output_text()
-            ),
-        )
+        self.summary = await self.history.summarize_content(self.output_text())
         return self.summary
 
     def to_dict(self):
@@ -300,6 +364,7 @@ class History(Record):
         self.topics: list[Topic] = []
         self.current = Topic(history=self)
         self.agent: Agent = agent
+        self.compression_stats = CompressionStats()
 
     def get_tokens(self) -> int:
         return (
@@ -313,6 +378,11 @@ class History(Record):
         total = self.get_tokens()
         return total > limit
 
+    def is_over_soft_limit(self):
+        limit = _get_ctx_size_for_history(soft=True)
+        total = self.get_tokens()
+        return total > limit
+
     def get_bulks_tokens(self) -> int:
         return sum(record.get_tokens() for record in self.bulks)
 
@@ -357,11 +427,38 @@ class History(Record):
             "current": self.current.to_dict(),
         }
 
-    def serialize(self):
+    @property
+    def blob_store(self) -> blob_store.BlobStore:
+        return blob_store.get_chat_store(self.agent.context.id)
+
+    def serialize(self, inline: bool = False):
         data = self.to_dict()
+        if inline:
+            # resolve blob references for portable exports
+            data = blob_store.resolve(self.blob_store, data)
         return _json_dumps(data)
 
-    async def compress(self):
+    async def summarize_content(self, content: MessageContent) -> str:
+        system = self.agent.read_prompt("fw.topic_summary.sys.md")
+        message = self.agent.read_prompt("fw.topic_summary.msg.md", content=content)
+
+        # identical inputs are common across subordinates and reloads, reuse their summaries
+        cache = summary_cache.get_chat_cache(self.agent.context.id)
+        key = summary_cache.get_key(system, message)
+        summary = cache.get_summary(key)
+        if summary is None:
+            summary = await self.agent.call_utility_model(system=system, message=message)
+            cache.set_summary(key, summary)
+        return summary
+
+    async def compress(self, soft: bool = False):
+        start = time.perf_counter()
+        try:
+            return await self._compress(soft=soft)
+        finally:
+            self.compression_stats.record_run(time.perf_counter() - start)
+
+    async def _compress(self, soft: bool = False):
         compressed = False
         while True:
             curr, hist, bulk = (
@@ -369,7 +466,7 @@ class History(Record):
                 self.get_topics_tokens(),
                 self.get_bulks_tokens(),
             )
-            total = _get_ctx_size_for_history()
+            total = _get_ctx_size_for_history(soft=soft)
             ratios = [
                 (curr, CURRENT_TOPIC_RATIO, "current_topic"),
                 (hist, HISTORY_TOPIC_RATIO, "history_topic"),
@@ -396,11 +493,11 @@ class History(Record):
                 return compressed
 
     async def compress_topics(self) -> bool:
-        # summarize topics one by one
-        for topic in self.topics:
-            if not topic.summary:
-                await topic.summarize()
-                return True
+        # summarize oldest unsummarized topics, a few in parallel
+        pending = [t for t in self.topics if not t.summary][:COMPRESSION_CONCURRENCY]
+        if pending:
+            await _gather_limited([t.summarize() for t in pending])
+            return True
 
         # move oldest topic to bulks and summarize
         for topic in self.topics:
@@ -429,8 +526,8 @@ class History(Record):
         if len(self.bulks) == 0:
             return False
         # merge bulks in groups of count, even if there are fewer than count
-        bulks = await asyncio.gather(
-            *[
+        bulks = await _gather_limited(
+            [
                 self.merge_bulks(self.bulks[i : i + count])
                 for i in range(0, len(self.bulks), count)
             ]
@@ -445,17 +542,30 @@ class History(Record):
         return bulk
 
 
-def deserialize_history(json_data: str, agent) -> History:
+def deserialize_history(json_data: str | dict, agent) -> History:
     history = History(agent=agent)
     if json_data:
-        data = _json_loads(json_data)
+        data = _json_loads(json_data) if isinstance(json_data, str) else json_data
         history = History.from_dict(data, history=history)
     return history
 
 
-def _get_ctx_size_for_history() -> int:
+def _get_ctx_size_for_history(soft: bool = False) -> int:
     set = settings.get_settings()
-    return int(set["chat_model_ctx_length"] * set["chat_model_ctx_history"])
+    size = set["chat_model_ctx_length"] * set["chat_model_ctx_history"]
+    if soft:
+        size *= COMPRESSION_SOFT_RATIO
+    return int(size)
+
+
+async def _gather_limited(coros: list[Coroutine], limit: int = COMPRESSION_CONCURRENCY):
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def run(coro: Coroutine):
+        async with semaphore:
+            return await coro
+
+    return list(await asyncio.gather(*[run(c) for c in coros]))
 
 
 def _stringify_output(output: OutputMessage, ai_label="ai", human_label="human"):
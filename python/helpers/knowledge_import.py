@@ -1,7 +1,11 @@
 import glob
+import json
 import os
 import hashlib
-from typing import Any, Dict, Literal, TypedDict
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Literal, NotRequired, TypedDict
+from langchain_core.documents import Document
 from langchain_community.document_loaders import (
     CSVLoader,
     PyPDFLoader,
@@ -13,11 +17,30 @@ from python.helpers.print_style import PrintStyle
 
 text_loader_kwargs = {"autodetect_encoding": True}
 
+LOAD_WORKERS = min(8, os.cpu_count() or 1)  # threads hashing and parsing changed files
+HASH_BLOCK = 1024 * 1024  # bytes read at once when hashing a file
+CHUNK_SIZE = 4000  # max characters of a knowledge chunk
+CHUNK_MIN = 1000  # characters before a chunk may end at a heading or boundary paragraph
+CHUNK_BOUNDARY = 4  # one in this many paragraphs ends a chunk, chosen by its hash
+
+# Mapping file extensions to corresponding loader classes
+# Note: Using TextLoader for JSON and MD to avoid parsing issues with consolidation
+file_types_loaders = {
+    "txt": TextLoader,
+    "pdf": PyPDFLoader,
+    "csv": CSVLoader,
+    "html": UnstructuredHTMLLoader,
+    "json": TextLoader,  # Use TextLoader for better consolidation compatibility
+    "md": TextLoader,    # Use TextLoader for better consolidation compatibility
+}
+
 
 class KnowledgeImport(TypedDict):
     file: str
     checksum: str
+    stat: NotRequired[list[int]]  # size, mtime and inode when the checksum was taken
     ids: list[str]
+    chunks: NotRequired[list[str]]  # content hash of the document of each id
     state: Literal["changed", "original", "removed"]
     documents: list[Any]
 
@@ -25,11 +48,130 @@ class KnowledgeImport(TypedDict):
 def calculate_checksum(file_path: str) -> str:
     hasher = hashlib.md5()
     with open(file_path, "rb") as f:
-        buf = f.read()
-        hasher.update(buf)
+        while block := f.read(HASH_BLOCK):
+            hasher.update(block)
     return hasher.hexdigest()
 
 
+def get_file_stat(file_path: str) -> list[int]:
+    """Size, mtime and inode, a file with the same ones is taken as unchanged without hashing it."""
+    stat = os.stat(file_path)
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+
+def split_text(text: str) -> list[str]:
+    """Split text into chunks at paragraphs, the same text always into the same chunks.
+
+    Chunks end at paragraphs picked by their own content, so an edit changes only the
+    chunks around it and the ones after it line up with their previous version again.
+    """
+    chunks: list[str] = []
+    current: list[str] = []
+    size = 0
+    for piece in _get_pieces(text):
+        if current and (
+            size + len(piece) > CHUNK_SIZE or (size >= CHUNK_MIN and piece.startswith("#"))
+        ):
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(piece)
+        size += len(piece) + 2
+        if size >= CHUNK_MIN and _is_boundary(piece):
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def _get_pieces(text: str) -> list[str]:
+    # paragraphs, the ones over the chunk size split by lines and then by characters
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if len(paragraph) <= CHUNK_SIZE:
+            if paragraph:
+                pieces.append(paragraph)
+            continue
+        for line in paragraph.splitlines():
+            line = line.strip()
+            pieces.extend(line[i : i + CHUNK_SIZE] for i in range(0, len(line), CHUNK_SIZE))
+    return pieces
+
+
+def _is_boundary(piece: str) -> bool:
+    digest = hashlib.md5(piece.encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") % CHUNK_BOUNDARY == 0
+
+
+def split_documents(documents: list[Document]) -> list[Document]:
+    return [
+        Document(page_content=chunk, metadata=dict(doc.metadata))
+        for doc in documents
+        for chunk in split_text(doc.page_content)
+    ]
+
+
+def get_chunk_hash(doc: Document) -> str:
+    """Hash of the text and metadata of a knowledge chunk, before it is inserted."""
+    data = json.dumps(
+        {"text": doc.page_content, "metadata": doc.metadata},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.md5(data.encode("utf-8")).hexdigest()
+
+
+def match_chunks(
+    ids: list[str], hashes: list[str], new_hashes: list[str]
+) -> tuple[list[str | None], list[str]]:
+    """Ids of imported chunks that can stay for the new chunks of a file.
+
+    Returns the id kept for each new chunk, None for chunks to insert, and the ids
+    of the imported chunks to delete.
+    """
+    if len(hashes) != len(ids):  # imported without chunk hashes, replaced in full
+        return [None] * len(new_hashes), list(ids)
+    free: dict[str, list[str]] = {}
+    for id, hash in zip(ids, hashes):
+        free.setdefault(hash, []).append(id)
+    kept: list[str | None] = []
+    for hash in new_hashes:
+        same = free.get(hash)
+        kept.append(same.pop(0) if same else None)
+    return kept, [id for same in free.values() for id in same]
+
+
+def _load_file(
+    file_path: str, ext: str, checksum: str, metadata: dict[str, Any]
+) -> tuple[str, list[Any] | None]:
+    # (checksum, documents) of a file with a changed stat, no documents if the content is the same
+    new_checksum = calculate_checksum(file_path)
+    if new_checksum == checksum:
+        return new_checksum, None
+    loader = file_types_loaders[ext](
+        file_path,
+        **(text_loader_kwargs if ext in ["txt", "csv", "html", "md"] else {}),
+    )
+    documents = split_documents(loader.load())
+
+    # Enhanced metadata for better consolidation compatibility
+    enhanced_metadata = {
+        **metadata,
+        "source_file": os.path.basename(file_path),
+        "source_path": file_path,
+        "file_type": ext,
+        "knowledge_source": True,  # Flag to distinguish from conversation memories
+        "import_timestamp": None,  # Will be set when inserted into memory
+    }
+
+    # Apply metadata to all documents
+    for doc in documents:
+        doc.metadata = {**doc.metadata, **enhanced_metadata}
+    return new_checksum, documents
+
+
 def load_knowledge(
     log_item: LogItem | None,
     knowledge_dir: str,
@@ -43,18 +185,10 @@ def load_knowledge(
 
     This function now includes enhanced error handling and compatibility with the
     intelligent memory consolidation system.
-    """
 
-    # Mapping file extensions to corresponding loader classes
-    # Note: Using TextLoader for JSON and MD to avoid parsing issues with consolidation
-    file_types_loaders = {
-        "txt": TextLoader,
-        "pdf": PyPDFLoader,
-        "csv": CSVLoader,
-        "html": UnstructuredHTMLLoader,
-        "json": TextLoader,  # Use TextLoader for better consolidation compatibility
-        "md": TextLoader,    # Use TextLoader for better consolidation compatibility
-    }
+    Files with the size, mtime and inode of their last import are not read at all,
+    the others are hashed and, if their content changed, parsed by a thread pool.
+    """
 
     cnt_files = 0
     cnt_docs = 0
@@ -114,6 +248,8 @@ def load_knowledge(
                 progress=f"\nFound {len(kn_files)} knowledge files in {knowledge_dir}, processing...",
             )
 
+    # files to hash and parse, with their existing index entry
+    pending: list[tuple[str, str, KnowledgeImport]] = []
     for file_path in kn_files:
         try:
             # Get file extension safely
@@ -125,10 +261,6 @@ def load_knowledge(
             if ext not in file_types_loaders:
                 continue  # Skip unsupported file types
 
-            checksum = calculate_checksum(file_path)
-            if not checksum:
-                continue  # Skip files with checksum errors
-
             file_key = file_path
 
             # Load existing data from the index or create a new entry
@@ -140,58 +272,50 @@ def load_knowledge(
                 "documents": []
             })
 
-            # Check if file has changed
-            if file_data.get("checksum") == checksum:
+            # Check if file has changed, by its stat first
+            stat = get_file_stat(file_path)
+            if file_data.get("checksum") and file_data.get("stat") == stat:
                 file_data["state"] = "original"
+                index[file_key] = file_data
             else:
-                file_data["state"] = "changed"
+                file_data["stat"] = stat
+                pending.append((file_path, ext, file_data))
 
-            # Process changed files
-            if file_data["state"] == "changed":
-                file_data["checksum"] = checksum
-                loader_cls = file_types_loaders[ext]
+        except Exception as e:
+            PrintStyle(font_color="red").print(f"Error processing {file_path}: {e}")
+            continue
 
+    if pending:
+        with ThreadPoolExecutor(max_workers=LOAD_WORKERS, thread_name_prefix="knowledge-load") as pool:
+            futures = [
+                pool.submit(_load_file, file_path, ext, file_data.get("checksum", ""), metadata)
+                for file_path, ext, file_data in pending
+            ]
+            for (file_path, ext, file_data), future in zip(pending, futures):
                 try:
-                    loader = loader_cls(
-                        file_path,
-                        **(
-                            text_loader_kwargs
-                            if ext in ["txt", "csv", "html", "md"]
-                            else {}
-                        ),
-                    )
-                    documents = loader.load_and_split()
-
-                    # Enhanced metadata for better consolidation compatibility
-                    enhanced_metadata = {
-                        **metadata,
-                        "source_file": os.path.basename(file_path),
-                        "source_path": file_path,
-                        "file_type": ext,
-                        "knowledge_source": True,  # Flag to distinguish from conversation memories
-                        "import_timestamp": None,  # Will be set when inserted into memory
-                    }
-
-                    # Apply metadata to all documents
-                    for doc in documents:
-                        doc.metadata = {**doc.metadata, **enhanced_metadata}
-
-                    file_data["documents"] = documents
-                    cnt_files += 1
-                    cnt_docs += len(documents)
-
+                    checksum, documents = future.result()
                 except Exception as e:
                     PrintStyle(font_color="red").print(f"Error loading {file_path}: {e}")
                     if log_item:
                         log_item.stream(progress=f"\nError loading {os.path.basename(file_path)}: {e}")
+                    # imported documents stay, the file is tried again next time
+                    file_data.pop("stat", None)
+                    if file_data["file"] in index:
+                        file_data["state"] = "original"
                     continue
 
-            # Update the index
-            index[file_key] = file_data
+                file_data["checksum"] = checksum
+                if documents is None:
+                    file_data["state"] = "original"  # touched, same content
+                else:
+                    # Process changed files
+                    file_data["state"] = "changed"
+                    file_data["documents"] = documents
+                    cnt_files += 1
+                    cnt_docs += len(documents)
 
-        except Exception as e:
-            PrintStyle(font_color="red").print(f"Error processing {file_path}: {e}")
-            continue
+                # Update the index
+                index[file_data["file"]] = file_data
 
     # Mark removed files
     current_files = set(kn_files)
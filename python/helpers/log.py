@@ -1,12 +1,17 @@
+from array import array
 from dataclasses import dataclass, field
 import json
+import os
+import threading
+import time
 from typing import Any, Literal, Optional, Dict, TypeVar, TYPE_CHECKING
+import weakref
 
 T = TypeVar("T")
 import uuid
-from collections import OrderedDict  # Import OrderedDict
+from collections import OrderedDict, deque  # Import OrderedDict
+from python.helpers import files
 from python.helpers.strings import truncate_text_by_ratio
-import copy
 from typing import TypeVar
 from python.helpers.secrets import get_secrets_manager
 
@@ -42,6 +47,12 @@ KEY_MAX_LEN: int = 60
 VALUE_MAX_LEN: int = 5000
 PROGRESS_MAX_LEN: int = 120
 
+MEMORY_ITEMS: int = 500  # log items kept in memory, older ones are spilled to a segment file
+SEGMENTS_FOLDER = "tmp/log_segments"
+
+STREAM_UPDATE_INTERVAL: float = 0.1  # seconds between streamed updates of one item
+CONTENT_MARKS: int = 64  # content lengths remembered per item to serve appended deltas
+
 
 def _truncate_heading(text: str | None) -> str:
     if text is None:
@@ -94,6 +105,15 @@ def _truncate_value(val: T) -> T:
     return truncated
 
 
+def _copy_containers(val: T) -> T:
+    # cheaper than deepcopy, leaves are immutable json values
+    if isinstance(val, dict):
+        return {k: _copy_containers(v) for k, v in val.items()}  # type: ignore
+    if isinstance(val, list):
+        return [_copy_containers(v) for v in val]  # type: ignore
+    return val
+
+
 def _truncate_content(text: str | None, type: Type) -> str:
 
     max_len = CONTENT_MAX_LEN if type != "response" else RESPONSE_CONTENT_MAX_LEN
@@ -131,6 +151,13 @@ class LogItem:
     kvps: Optional[OrderedDict] = None  # Use OrderedDict for kvps
     id: Optional[str] = None  # Add id field
     guid: str = ""
+    version: int = 0  # log version of the last update of this item
+    # unmasked content of the last streamed update and (version, content length) marks since
+    _raw_content: str = field(default="", repr=False)
+    _content_marks: deque = field(default_factory=lambda: deque(maxlen=CONTENT_MARKS), repr=False)
+    _pending: dict = field(default_factory=dict, repr=False)
+    _last_stream: float = field(default=0.0, repr=False)
+    _streamed: bool = field(default=False, repr=False)
 
     def __post_init__(self):
         self.guid = self.log.guid
@@ -145,17 +172,49 @@ class LogItem:
         update_progress: ProgressUpdate | None = None,
         **kwargs,
     ):
+        fields = {
+            "type": type,
+            "heading": heading,
+            "content": content,
+            "kvps": kvps,
+            "temp": temp,
+            "update_progress": update_progress,
+        }
+        # pending streamed fields are applied first, explicit values win
+        fields = {**self._pending, **{k: v for k, v in fields.items() if v is not None}, **kwargs}
+        self._pending = {}
+        if self.guid == self.log.guid:
+            self.log._update_item(self.no, **fields)
+
+    def stream_update(self, **fields):
+        """Update of a streamed item whose content grows by appending.
+
+        Updates are throttled to STREAM_UPDATE_INTERVAL, only the appended content
+        is masked and the item is fully masked once flush is called.
+        """
+        self._pending.update(fields)
+        now = time.monotonic()
+        if now - self._last_stream < STREAM_UPDATE_INTERVAL:
+            return
+        self._last_stream = now
+        fields, self._pending = self._pending, {}
+        self._streamed = True
+        if self.guid == self.log.guid:
+            self.log._update_item(self.no, _stream=True, **fields)
+
+    def flush(self):
+        """Apply pending streamed fields and re-mask the final content in full."""
+        if not self._pending and not self._streamed:
+            return
+        fields, self._pending = self._pending, {}
+        if self._streamed:
+            if self._raw_content:
+                fields.setdefault("content", self._raw_content)
+            if self.kvps:
+                fields.setdefault("kvps", self.kvps)
+            self._streamed = False
         if self.guid == self.log.guid:
-            self.log._update_item(
-                self.no,
-                type=type,
-                heading=heading,
-                content=content,
-                kvps=kvps,
-                temp=temp,
-                update_progress=update_progress,
-                **kwargs,
-            )
+            self.log._update_item(self.no, **fields)
 
     def stream(
         self,
@@ -189,10 +248,22 @@ class Log:
     def __init__(self):
         self.context: "AgentContext|None" = None # set from outside
         self.guid: str = str(uuid.uuid4())
-        self.updates: list[int] = []
-        self.logs: list[LogItem] = []
+        self.version: int = 0  # incremented on every item update
+        self.logs: list[LogItem] = []  # in-memory window, items from self.offset on
+        self.offset: int = 0  # number of items spilled to the segment file
+        self._lock = threading.RLock()
+        self._init_segment()
         self.set_initial_progress()
 
+    def __del__(self):
+        try:
+            self._remove_segment()
+        except Exception:
+            pass
+
+    def get_length(self) -> int:
+        return self.offset + len(self.logs)
+
     def log(
         self,
         type: Type,
@@ -208,7 +279,7 @@ class Log:
         # add a minimal item to the log
         item = LogItem(
             log=self,
-            no=len(self.logs),
+            no=self.get_length(),
             type=type,
         )
         self.logs.append(item)
@@ -225,8 +296,18 @@ class Log:
             id=id,
             **kwargs,
         )
+        self._trim_memory()
         return item
 
+    def add_item(self, item: LogItem):
+        """Append an already built item, used when restoring a saved log."""
+        with self._lock:
+            item.no = self.get_length()
+            self.logs.append(item)
+            self.version += 1
+            item.version = self.version
+            self._trim_memory()
+
     def _update_item(
         self,
         no: int,
@@ -237,9 +318,13 @@ class Log:
         temp: bool | None = None,
         update_progress: ProgressUpdate | None = None,
         id: Optional[str] = None,
+        _stream: bool = False,
         **kwargs,
     ):
-        item = self.logs[no]
+        item = self._get_item(no)
+        if item is None:
+            return
+        secrets_mgr = self._get_secrets_manager()
 
         if id is not None:
             item.id = id
@@ -256,26 +341,37 @@ class Log:
 
         # adjust all content before processing
         if heading is not None:
-            heading = self._mask_recursive(heading)
+            heading = _mask_recursive(secrets_mgr, heading)
             heading = _truncate_heading(heading)
             item.heading = heading
         if content is not None:
-            content = self._mask_recursive(content)
-            content = _truncate_content(content, item.type)
-            item.content = content
+            content = str(content)
+            if _stream and self._is_append(item, content):
+                # streamed text only grows, mask and append just the new part
+                item.content += _mask_recursive(secrets_mgr, content[len(item._raw_content) :])
+            else:
+                item.content = _truncate_content(_mask_recursive(secrets_mgr, content), item.type)
+                item._content_marks.clear()
+            item._raw_content = content if _stream else ""
         if kvps is not None:
-            kvps = OrderedDict(copy.deepcopy(kvps))
-            kvps = self._mask_recursive(kvps)
-            kvps = _truncate_value(kvps)
+            # streamed values come from already masked stream text, full masking happens on flush
+            kvps = _copy_containers(kvps) if _stream else _mask_recursive(secrets_mgr, kvps)
+            kvps = _truncate_value(OrderedDict(kvps))
             item.kvps = kvps
         elif item.kvps is None:
             item.kvps = OrderedDict()
         if kwargs:
-            kwargs = copy.deepcopy(kwargs)
-            kwargs = self._mask_recursive(kwargs)
+            kwargs = _copy_containers(kwargs) if _stream else _mask_recursive(secrets_mgr, kwargs)
             item.kvps.update(kwargs)
 
-        self.updates += [item.no]
+        with self._lock:
+            self.version += 1
+            item.version = self.version
+            if _stream and content is not None:
+                item._content_marks.append((item.version, len(item.content)))
+            # items outside of the memory window are re-appended to the segment
+            if item.no < self.offset:
+                self._write_segment(item)
         self._update_progress_from_item(item)
 
     def set_progress(self, progress: str, no: int = 0, active: bool = True):
@@ -283,7 +379,7 @@ class Log:
         progress = _truncate_progress(progress)
         self.progress = progress
         if not no:
-            no = len(self.logs)
+            no = self.get_length()
         self.progress_no = no
         self.progress_active = active
 
@@ -291,26 +387,124 @@ class Log:
         self.set_progress("Waiting for input", 0, False)
 
     def output(self, start=None, end=None):
+        """Items updated after log version start (up to version end), old ones are paged from disk."""
         if start is None:
             start = 0
         if end is None:
-            end = len(self.updates)
+            end = self.version
 
         out = []
-        seen = set()
-        for update in self.updates[start:end]:
-            if update not in seen:
-                out.append(self.logs[update].output())
-                seen.add(update)
+        with self._lock:
+            # spilled items, scanned only when the client is behind the newest spilled update
+            if start < self._segment_max_version:
+                for no in range(self.offset):
+                    if start < self._segment_versions[no] <= end:
+                        out.append(self._read_segment(no))
+
+            for item in self.logs:
+                if start < item.version <= end:
+                    out.append(self._output_item(item, start))
 
         return out
 
+    def _output_item(self, item: LogItem, start: int) -> dict:
+        # a client that has seen the item since its last rewrite only gets the appended content
+        out = item.output()
+        if start and item._content_marks and item._content_marks[0][0] <= start:
+            length = 0
+            for version, marked in item._content_marks:
+                if version > start:
+                    break
+                length = marked
+            del out["content"]
+            out["content_delta"] = {"offset": length, "text": item.content[length:]}
+        return out
+
+    def _is_append(self, item: LogItem, content: str) -> bool:
+        max_len = CONTENT_MAX_LEN if item.type != "response" else RESPONSE_CONTENT_MAX_LEN
+        return (
+            bool(item._raw_content)
+            and len(content) <= max_len
+            and content.startswith(item._raw_content)
+        )
+
+    def get_items(self, start: int = 0) -> list[dict]:
+        """Outputs of items starting with item number start, old ones are paged from disk."""
+        with self._lock:
+            start = max(0, start)
+            out = [self._read_segment(no) for no in range(start, self.offset)]
+            out += [item.output() for item in self.logs[max(0, start - self.offset) :]]
+        return out
+
     def reset(self):
-        self.guid = str(uuid.uuid4())
-        self.updates = []
-        self.logs = []
+        with self._lock:
+            self._remove_segment()
+            self.guid = str(uuid.uuid4())
+            self.version = 0
+            self.logs = []
+            self.offset = 0
+            self._init_segment()
         self.set_initial_progress()
 
+    def _get_item(self, no: int) -> LogItem | None:
+        if no >= self.offset:
+            return self.logs[no - self.offset]
+        # spilled items can still be updated as long as someone holds the item
+        return self._spilled_items.get(no)
+
+    def _trim_memory(self):
+        with self._lock:
+            while len(self.logs) > MEMORY_ITEMS:
+                item = self.logs.pop(0)
+                self.offset += 1
+                self._spilled_items[item.no] = item
+                self._write_segment(item)
+
+    def _init_segment(self):
+        self._segment_path: str | None = None  # set on first spill, the guid may change until then
+        self._segment_file = None
+        self._segment_offsets = array("q")  # file offset of the latest record per item
+        self._segment_versions = array("q")  # version of the latest record per item
+        self._segment_max_version = 0
+        self._spilled_items: weakref.WeakValueDictionary[int, LogItem] = (
+            weakref.WeakValueDictionary()
+        )
+
+    def _write_segment(self, item: LogItem):
+        if self._segment_file is None:
+            self._segment_path = files.get_abs_path(SEGMENTS_FOLDER, f"{self.guid}.jsonl")
+            os.makedirs(os.path.dirname(self._segment_path), exist_ok=True)
+            self._segment_file = open(self._segment_path, "a+b")
+        record = {**item.output(), "version": item.version}
+        line = json.dumps(record, ensure_ascii=False, default=str).encode("utf-8") + b"\n"
+        self._segment_file.seek(0, os.SEEK_END)
+        position = self._segment_file.tell()
+        self._segment_file.write(line)
+        self._segment_file.flush()
+        if item.no < len(self._segment_offsets):
+            self._segment_offsets[item.no] = position
+            self._segment_versions[item.no] = item.version
+        else:
+            self._segment_offsets.append(position)
+            self._segment_versions.append(item.version)
+        self._segment_max_version = max(self._segment_max_version, item.version)
+
+    def _read_segment(self, no: int) -> dict:
+        if self._segment_file is None:
+            raise IndexError(f"Log item {no} is not available")
+        self._segment_file.seek(self._segment_offsets[no])
+        record = json.loads(self._segment_file.readline())
+        record.pop("version", None)
+        return record
+
+    def _remove_segment(self):
+        if self._segment_file is not None:
+            self._segment_file.close()
+            self._segment_file = None
+        if self._segment_path and os.path.exists(self._segment_path):
+            os.remove(self._segment_path)
+        self._segment_path = None
+
     def _update_progress_from_item(self, item: LogItem):
         if item.heading and item.update_progress != "none":
             if item.no >= self.progress_no:
@@ -319,27 +513,37 @@ class Log:
                     (item.no if item.update_progress == "persistent" else -1),
                 )
 
-    def _mask_recursive(self, obj: T) -> T:
-        """Recursively mask secrets in nested objects."""
+    def _get_secrets_manager(self):
         try:
             from agent import AgentContext
-            secrets_mgr = get_secrets_manager(self.context or AgentContext.current())
-
-            # debug helper to identify context mismatch
-            # self_id = self.context.id if self.context else None
-            # current_ctx = AgentContext.current()
-            # current_id = current_ctx.id if current_ctx else None
-            # if self_id != current_id:
-            #     print(f"Context ID mismatch: {self_id} != {current_id}")
-
-            if isinstance(obj, str):
-                return secrets_mgr.mask_values(obj)
-            elif isinstance(obj, dict):
-                return {k: self._mask_recursive(v) for k, v in obj.items()}  # type: ignore
-            elif isinstance(obj, list):
-                return [self._mask_recursive(item) for item in obj]  # type: ignore
-            else:
-                return obj
-        except Exception as _e:
-            # If masking fails, return original object
-            return obj
\ No newline at end of file
+
+            return get_secrets_manager(self.context or AgentContext.current())
+        except Exception:
+            return None
+
+    def _mask_recursive(self, obj: T) -> T:
+        """Recursively mask secrets in nested objects."""
+        return _mask_recursive(self._get_secrets_manager(), obj)
+
+
+def _mask_recursive(secrets_mgr, obj: T) -> T:
+    """Recursively mask secrets in nested objects, containers are always copied."""
+    try:
+        if secrets_mgr is None:
+            return _copy_containers(obj)
+        if isinstance(obj, str):
+            return secrets_mgr.mask_values(obj)
+        elif isinstance(obj, dict):
+            return {k: _mask_recursive(secrets_mgr, v) for k, v in obj.items()}  # type: ignore
+        elif isinstance(obj, list):
+            return [_mask_recursive(secrets_mgr, item) for item in obj]  # type: ignore
+        else:
+            return obj
+    except Exception as _e:
+        # If masking fails, return an unmasked copy
+        return _copy_containers(obj)
+
+
+def clear_segments():
+    """Remove segment files left over by a previous run."""
+    files.delete_dir(SEGMENTS_FOLDER)
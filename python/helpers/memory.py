@@ -1,24 +1,14 @@
 from datetime import datetime
-from typing import Any, List, Sequence
-from langchain.storage import InMemoryByteStore, LocalFileStore
+from typing import Any
+from langchain.storage import InMemoryByteStore
 from langchain.embeddings import CacheBackedEmbeddings
 from python.helpers import guids
 
-# from langchain_chroma import Chroma
-from langchain_community.vectorstores import FAISS
-
-# faiss needs to be patched for python 3.12 on arm #TODO remove once not needed
-from python.helpers import faiss_monkey_patch
-import faiss
-
-
-from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores.utils import (
     DistanceStrategy,
 )
-from langchain_core.embeddings import Embeddings
 
-import os, json
+import os, json, threading, uuid, asyncio, shutil, contextlib, time
 
 import numpy as np
 
@@ -26,30 +16,30 @@ from python.helpers.print_style import PrintStyle
 from . import files
 from langchain_core.documents import Document
 from python.helpers import knowledge_import
+from python.helpers.embedding_cache import EmbeddingCache
+from python.helpers import memory_wal
+from python.helpers.memory_wal import MemoryWal
+from python.helpers import memory_share
+from python.helpers import vector_index
+from python.helpers import memory_dedup
+from python.helpers import memory_export
+from python.helpers import memory_store
+from python.helpers.memory_filter import compile_filter
+from python.helpers.memory_loaded import LoadedMemories
+from python.helpers.memory_reindex import MemoryReindex
+from python.helpers.memory_store import AREAS_FOLDER, MyFaiss, PartitionedFaiss
 from python.helpers.log import Log, LogItem
 from enum import Enum
 from agent import Agent, AgentContext
 import models
 import logging
-from simpleeval import simple_eval
 
 
 # Raise the log level so WARNING messages aren't shown
 logging.getLogger("langchain_core.vectorstores.base").setLevel(logging.ERROR)
 
-
-class MyFaiss(FAISS):
-    # override aget_by_ids
-    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
-        # return all self.docstore._dict[id] in ids
-        return [self.docstore._dict[id] for id in (ids if isinstance(ids, list) else [ids]) if id in self.docstore._dict]  # type: ignore
-
-    async def aget_by_ids(self, ids: Sequence[str], /) -> List[Document]:
-        return self.get_by_ids(ids)
-
-    def get_all_docs(self):
-        return self.docstore._dict  # type: ignore
-
+KNOWLEDGE_INSERT_BATCH = 256  # knowledge documents embedded and logged together
+KNOWLEDGE_INSERT_CONCURRENCY = 4  # knowledge batches embedded at once
 
 class Memory:
 
@@ -59,12 +49,12 @@ class Memory:
         SOLUTIONS = "solutions"
         INSTRUMENTS = "instruments"
 
-    index: dict[str, "MyFaiss"] = {}
+    index = LoadedMemories()
 
     @staticmethod
     async def get(agent: Agent):
         memory_subdir = get_agent_memory_subdir(agent)
-        if Memory.index.get(memory_subdir) is None:
+        if Memory._get_loaded(memory_subdir) is None:
             log_item = agent.context.log.log(
                 type="util",
                 heading=f"Initializing VectorDB in '/{memory_subdir}'",
@@ -80,8 +70,9 @@ class Memory:
             knowledge_subdirs = get_knowledge_subdirs_by_memory_subdir(
                 memory_subdir, agent.config.knowledge_subdirs or []
             )
-            if knowledge_subdirs:
+            if knowledge_subdirs and not db.read_only:  # the writer imports knowledge
                 await wrap.preload_knowledge(log_item, knowledge_subdirs, memory_subdir)
+            Memory._start_threads(db, memory_subdir)
             return wrap
         else:
             return Memory(
@@ -95,7 +86,7 @@ class Memory:
         log_item: LogItem | None = None,
         preload_knowledge: bool = True,
     ):
-        if not Memory.index.get(memory_subdir):
+        if not Memory._get_loaded(memory_subdir):
             import initialize
 
             agent_config = initialize.initialize_agent()
@@ -107,7 +98,7 @@ class Memory:
                 in_memory=False,
             )
             wrap = Memory(db, memory_subdir=memory_subdir)
-            if preload_knowledge:
+            if preload_knowledge and not db.read_only:
                 knowledge_subdirs = get_knowledge_subdirs_by_memory_subdir(
                     memory_subdir, agent_config.knowledge_subdirs or []
                 )
@@ -116,8 +107,51 @@ class Memory:
                         log_item, knowledge_subdirs, memory_subdir
                     )
             Memory.index[memory_subdir] = db
+            Memory._start_threads(db, memory_subdir)
         return Memory(db=Memory.index[memory_subdir], memory_subdir=memory_subdir)
 
+    @staticmethod
+    def _get_loaded(memory_subdir: str) -> "PartitionedFaiss | None":
+        # loaded db of a memory subdir, a read-only one is brought up to date first
+        db = Memory.index.get(memory_subdir)
+        Memory.index.evict()  # loaded stores grow, the limits are checked on every use
+        if db is not None and db.read_only:
+            if memory_share.acquire_writer(db.db_dir):
+                # the writer process is gone, this one takes over and loads as the writer
+                del Memory.index[memory_subdir]
+                return None
+            if db.refresh() and memory_store.get_embedding_set(db.db_dir).get(
+                "areas", AREAS_FOLDER
+            ) != db.areas_folder:
+                # re-indexed by the writer, loaded again with the new model
+                del Memory.index[memory_subdir]
+                return None
+        return db
+
+    @staticmethod
+    def _start_threads(db: "PartitionedFaiss", memory_subdir: str):
+        # background work of a db once it is in Memory.index
+        if db.reindex is not None:
+            db.reindex.start()
+        if db.shared and not db.read_only:
+            threading.Thread(
+                target=Memory._run_writer,
+                args=(db, memory_subdir),
+                name="memory-writer",
+                daemon=True,
+            ).start()
+
+    @staticmethod
+    def _run_writer(db: "PartitionedFaiss", memory_subdir: str):
+        # applies changes forwarded by reader processes and publishes stores while db is loaded
+        while Memory.index.peek(memory_subdir) is db:
+            try:
+                # a wrapper per round, the db can be unloaded while the writer waits
+                Memory(db, memory_subdir=memory_subdir)._apply_inbox()
+            except Exception as e:
+                PrintStyle.error(f"Shared memory writer of '{memory_subdir}' failed: {e}")
+            time.sleep(memory_share.POLL_INTERVAL)
+
     @staticmethod
     async def reload(agent: Agent):
         memory_subdir = get_agent_memory_subdir(agent)
@@ -131,121 +165,169 @@ class Memory:
         model_config: models.ModelConfig,
         memory_subdir: str,
         in_memory=False,
-    ) -> tuple[MyFaiss, bool]:
+    ) -> tuple["PartitionedFaiss", bool]:
 
         PrintStyle.standard("Initializing VectorDB...")
 
         if log_item:
             log_item.stream(progress="\nInitializing VectorDB")
 
-        em_dir = files.get_abs_path(
-            "memory/embeddings"
-        )  # just caching, no need to parameterize
         db_dir = abs_db_dir(memory_subdir)
 
-        # make sure embeddings and database directories exist
+        # make sure database directory exists
         os.makedirs(db_dir, exist_ok=True)
+        MemoryReindex.stop(db_dir)  # a reindex of an unloaded db is continued by this one
+        Memory.index.wait_closed(memory_subdir)  # files and writer lock of an unloaded db
 
-        if in_memory:
-            store = InMemoryByteStore()
-        else:
-            os.makedirs(em_dir, exist_ok=True)
-            store = LocalFileStore(em_dir)
-
-        embeddings_model = models.get_embedding_model(
-            model_config.provider,
-            model_config.name,
-            **model_config.build_kwargs(),
-        )
-        embeddings_model_id = files.safe_file_name(
-            model_config.provider + "_" + model_config.name
-        )
-
-        # here we setup the embeddings model with the chosen cache storage
-        embedder = CacheBackedEmbeddings.from_bytes_store(
-            embeddings_model, store, namespace=embeddings_model_id
+        embedder = Memory._get_embedder(
+            model_config.provider, model_config.name, model_config.build_kwargs(), in_memory
         )
+        model = {"model_provider": model_config.provider, "model_name": model_config.name}
 
-        # initial DB and docs variables
-        db: MyFaiss | None = None
-        docs: dict[str, Document] | None = None
+        # if there is a mismatch in embeddings used, the stores are re-indexed
+        embedding_set = memory_store.get_embedding_set(db_dir)
+        emb_ok = bool(embedding_set) and all(embedding_set.get(key) == value for key, value in model.items())
 
+        # until a reindex is done, the live stores keep using the model they were indexed with
+        live_embedder = embedder
+        if embedding_set and not emb_ok and not in_memory:
+            try:
+                live_embedder = Memory._get_embedder(
+                    embedding_set["model_provider"],
+                    embedding_set["model_name"],
+                    model_config.build_kwargs()
+                    if embedding_set["model_provider"] == model_config.provider
+                    else {},
+                    in_memory,
+                )
+            except Exception as e:
+                PrintStyle.error(f"Previous embedding model not available, re-indexing now: {e}")
+
+        # a shared memory subdir is written by one process only, the others map its images
+        shared = memory_share.is_enabled() and not in_memory
+        read_only = shared and not memory_share.acquire_writer(db_dir)
+        db = PartitionedFaiss(
+            db_dir,
+            live_embedder,
+            use_wal=not in_memory,
+            shared=shared,
+            read_only=read_only,
+            areas_folder=embedding_set.get("areas", AREAS_FOLDER),
+        )
         created = False
 
-        # if db folder exists and is not empty:
-        if os.path.exists(db_dir) and files.exists(db_dir, "index.faiss"):
-            db = MyFaiss.load_local(
-                folder_path=db_dir,
-                embeddings=embedder,
-                allow_dangerous_deserialization=True,
-                distance_strategy=DistanceStrategy.COSINE,
-                # normalize_L2=True,
-                relevance_score_fn=Memory._cosine_normalizer,
-            )  # type: ignore
-
-            # if there is a mismatch in embeddings used, re-index the whole DB
-            emb_ok = False
-            emb_set_file = files.get_abs_path(db_dir, "embedding.json")
-            if files.exists(emb_set_file):
-                embedding_set = json.loads(files.read_file(emb_set_file))
-                if (
-                    embedding_set["model_provider"] == model_config.provider
-                    and embedding_set["model_name"] == model_config.name
-                ):
-                    # model matches
-                    emb_ok = True
-
-            # re-index -  create new DB and insert existing docs
-            if db and not emb_ok:
-                docs = db.get_all_docs()
-                db = None
-
-        # DB not loaded, create one
-        if not db:
-            index = faiss.IndexFlatIP(len(embedder.embed_query("example")))
-
-            db = MyFaiss(
-                embedding_function=embedder,
-                index=index,
-                docstore=InMemoryDocstore(),
-                index_to_docstore_id={},
-                distance_strategy=DistanceStrategy.COSINE,
-                # normalize_L2=True,
-                relevance_score_fn=Memory._cosine_normalizer,
-            )
-
-            # insert docs if reindexing
+        if read_only:
+            db.load()
+            return db, created
+
+        # single index of all areas from before the split
+        if files.exists(db_dir, "index.faiss"):
+            Memory._split_legacy_db(db, log_item)
+        db.load()
+
+        if not emb_ok and live_embedder is not embedder and db.count_docs():
+            # re-embedded in the background, see MemoryReindex
+            MemoryReindex.prepare(db, memory_subdir, model, embedder, Memory.index, Memory._start_threads)
+            PrintStyle.standard("Re-indexing memories in the background...")
+            if log_item:
+                log_item.stream(progress="\nRe-indexing memories in the background")
+            return db, created
+
+        MemoryReindex.discard(db)  # leftovers of a reindex that is not needed anymore
+        if not emb_ok:
+            # re-index - recreate area stores and insert existing docs
+            db.embedding_function = embedder
+            docs = db.get_all_docs()
+            for area in list(db.partitions):
+                db.drop_partition(area)
             if docs:
                 PrintStyle.standard("Indexing memories...")
                 if log_item:
                     log_item.stream(progress="\nIndexing memories")
-                db.add_documents(documents=list(docs.values()), ids=list(docs.keys()))
-
-            # save DB
-            Memory._save_db_file(db, memory_subdir)
+                for area, area_docs in memory_store.group_by_area(docs).items():
+                    part = db.get_partition(area)
+                    part.add_documents(
+                        documents=list(area_docs.values()), ids=list(area_docs.keys())
+                    )
+                    memory_store.save_store(part)
             # save meta file
-            meta_file_path = files.get_abs_path(db_dir, "embedding.json")
-            files.write_file(
-                meta_file_path,
-                json.dumps(
-                    {
-                        "model_provider": model_config.provider,
-                        "model_name": model_config.name,
-                    }
-                ),
-            )
+            memory_store.save_embedding_set(db_dir, {**model, "areas": db.areas_folder})
 
             created = True
 
         return db, created
 
+    @staticmethod
+    def _get_embedder(
+        provider: str, name: str, kwargs: dict[str, Any], in_memory: bool
+    ) -> CacheBackedEmbeddings:
+        em_file = files.get_abs_path(
+            "memory/embeddings.db"
+        )  # just caching, no need to parameterize
+        em_legacy_dir = files.get_abs_path("memory/embeddings")  # former LocalFileStore
+
+        embeddings_model = models.get_embedding_model(provider, name, **kwargs)
+        embeddings_model_id = files.safe_file_name(provider + "_" + name)
+
+        if in_memory:
+            store = InMemoryByteStore()
+        else:
+            store = EmbeddingCache.get(em_file, embeddings_model_id, legacy_dir=em_legacy_dir)
+
+        # here we setup the embeddings model with the chosen cache storage
+        return CacheBackedEmbeddings.from_bytes_store(
+            embeddings_model, store, namespace=embeddings_model_id
+        )
+
+    @staticmethod
+    def _split_legacy_db(db: "PartitionedFaiss", log_item: LogItem | None):
+        # move the documents and their vectors into area stores, nothing is re-embedded
+        PrintStyle.standard("Splitting memory into areas...")
+        if log_item:
+            log_item.stream(progress="\nSplitting memory into areas")
+        legacy_wal = MemoryWal(db.db_dir)
+        with MemoryWal.get_lock(db.db_dir):
+            legacy = MyFaiss.load_local(
+                folder_path=db.db_dir,
+                embeddings=db.embedding_function,
+                allow_dangerous_deserialization=True,
+                distance_strategy=DistanceStrategy.COSINE,
+                relevance_score_fn=memory_store.cosine_normalizer,
+            )  # type: ignore
+            legacy_wal.replay(legacy)
+        db.load()  # stores of an interrupted split
+        labels = {id: label for label, id in legacy.index_to_docstore_id.items()}
+        docs = {id: doc for id, doc in legacy.get_all_docs().items() if id in labels}
+        for area, area_docs in memory_store.group_by_area(docs).items():
+            part = db.get_partition(area)
+            ids = [id for id in area_docs if id not in part.docstore._dict]  # type: ignore
+            if not ids:
+                continue
+            vectors = vector_index.get_vectors(legacy.index, [labels[id] for id in ids])
+            part.add_embeddings(
+                [(area_docs[id].page_content, vector) for id, vector in zip(ids, vectors)],
+                metadatas=[area_docs[id].metadata for id in ids],
+                ids=ids,
+            )
+            memory_store.save_store(part)
+        legacy_wal.close()
+        # area stores are complete, the legacy files can go
+        with MemoryWal.get_lock(db.db_dir):
+            for name in ["index.faiss", "index.pkl", "checkpoint.json"]:
+                path = os.path.join(db.db_dir, name)
+                if os.path.exists(path):
+                    os.remove(path)
+            shutil.rmtree(legacy_wal.wal_dir, ignore_errors=True)
+
     def __init__(
         self,
-        db: MyFaiss,
+        db: PartitionedFaiss,
         memory_subdir: str,
     ):
         self.db = db
         self.memory_subdir = memory_subdir
+        self._changed: set[str] = set()  # areas changed since the last save
+        db.holders.add(self)  # not unloaded while in use
 
     async def preload_knowledge(
         self, log_item: LogItem | None, kn_dirs: list[str], memory_subdir: str
@@ -268,20 +350,44 @@ class Memory:
             with open(index_path, "r") as f:
                 index = json.load(f)
 
-        # preload knowledge folders
-        index = self._preload_knowledge_folders(log_item, kn_dirs, index)
+        # preload knowledge folders, files are scanned and parsed off the event loop
+        loop = asyncio.get_running_loop()
+        index = await loop.run_in_executor(
+            None, self._preload_knowledge_folders, log_item, kn_dirs, index
+        )
 
-        for file in index:
-            if index[file]["state"] in ["changed", "removed"] and index[file].get(
-                "ids", []
-            ):  # for knowledge files that have been changed or removed and have IDs
-                await self.delete_documents_by_ids(
-                    index[file]["ids"]
-                )  # remove original version
-            if index[file]["state"] == "changed":
-                index[file]["ids"] = await self.insert_documents(
-                    index[file]["documents"]
-                )  # insert new version
+        # chunks of changed files that are still there keep their documents,
+        # only removed chunks are deleted and only new ones embedded
+        remove_ids: list[str] = []
+        insert: list[Document] = []
+        kept_by_file: dict[str, list[str | None]] = {}
+        for file, data in index.items():
+            if data["state"] == "removed":
+                remove_ids += data.get("ids", [])
+            elif data["state"] == "changed":
+                hashes = [knowledge_import.get_chunk_hash(doc) for doc in data["documents"]]
+                kept, removed = knowledge_import.match_chunks(
+                    data.get("ids", []), data.get("chunks", []), hashes
+                )
+                data["chunks"] = hashes
+                kept_by_file[file] = kept
+                remove_ids += removed
+                insert += [doc for doc, id in zip(data["documents"], kept) if id is None]
+        if remove_ids:
+            await self.delete_documents_by_ids(remove_ids)
+
+        # new chunks of all files at once, so they are embedded in full batches
+        new_ids = iter(await self._insert_knowledge(insert, log_item))
+        for file, kept in kept_by_file.items():
+            data = index[file]
+            ids = [id if id is not None else next(new_ids) for id in kept]
+            if None in ids:
+                # some chunks failed, the file is loaded again next time and
+                # only chunks missing by hash are inserted then
+                data["chunks"] = [hash for hash, id in zip(data["chunks"], ids) if id is not None]
+                data["checksum"] = ""
+                data.pop("stat", None)
+            data["ids"] = [id for id in ids if id is not None]
 
         # remove index where state="removed"
         index = {k: v for k, v in index.items() if v["state"] != "removed"}
@@ -295,6 +401,44 @@ class Memory:
         with open(index_path, "w") as f:
             json.dump(index, f)
 
+    async def _insert_knowledge(self, docs: list[Document], log_item: LogItem | None) -> list[str | None]:
+        # batches of chunks are embedded a few at a time, the embedding model batches them further,
+        # returns the id of each document, None for documents of failed batches
+        ids = self._prepare_new_docs(docs)
+        if not ids:
+            return []
+        if log_item:
+            log_item.stream(progress=f"\nEmbedding {len(ids)} knowledge documents")
+        batches = [
+            dict(zip(ids[start : start + KNOWLEDGE_INSERT_BATCH], docs[start : start + KNOWLEDGE_INSERT_BATCH]))
+            for start in range(0, len(ids), KNOWLEDGE_INSERT_BATCH)
+        ]
+        semaphore = asyncio.Semaphore(KNOWLEDGE_INSERT_CONCURRENCY)
+
+        async def insert(batch: dict[str, Document]):
+            async with semaphore:
+                try:
+                    await self._add_docs(batch)
+                except Exception:
+                    # a batch is inserted in full or not at all
+                    await self._delete_ids([id for id in batch if self.db.get_area(id) is not None])
+                    raise
+
+        results = await asyncio.gather(*[insert(batch) for batch in batches], return_exceptions=True)
+        self._save_db()  # persist
+        inserted: list[str | None] = []
+        for batch, result in zip(batches, results):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, BaseException):
+                PrintStyle.error(f"Failed to import {len(batch)} knowledge documents: {result}")
+                if log_item:
+                    log_item.stream(progress=f"\nFailed to import {len(batch)} knowledge documents: {result}")
+                inserted += [None] * len(batch)
+            else:
+                inserted += list(batch)
+        return inserted
+
     def _preload_knowledge_folders(
         self,
         log_item: LogItem | None,
@@ -308,7 +452,7 @@ class Memory:
                 log_item,
                 abs_knowledge_dir(kn_dir),
                 index,
-                {"area": Memory.Area.MAIN},
+                {"area": Memory.Area.MAIN.value},
                 filename_pattern="*",
                 recursive=False,
             )
@@ -339,22 +483,37 @@ class Memory:
         return self.db.get_by_ids(id)[0]
 
     async def search_similarity_threshold(
-        self, query: str, limit: int, threshold: float, filter: str = ""
+        self, query: str, limit: int, threshold: float, filter: str = "", hybrid: bool = False
     ):
-        comparator = Memory._get_comparator(filter) if filter else None
+        comparator = compile_filter(filter) if filter else None
+        # only the stores of areas the filter allows are searched
+        self._maintain_index(self.db.select(comparator.get_values("area") if comparator else None))
 
         return await self.db.asearch(
             query,
-            search_type="similarity_score_threshold",
             k=limit,
             score_threshold=threshold,
             filter=comparator,
+            hybrid=hybrid,
+        )
+
+    async def search_similarity_scores(
+        self, query: str, limit: int, threshold: float, filter: str = ""
+    ) -> list[tuple[Document, float]]:
+        """Same as search_similarity_threshold, with the relevance score of each document."""
+        comparator = compile_filter(filter) if filter else None
+        self._maintain_index(self.db.select(comparator.get_values("area") if comparator else None))
+        return await self.db.asearch_with_scores(
+            query, k=limit, score_threshold=threshold, filter=comparator
         )
 
     async def delete_documents_by_query(
         self, query: str, threshold: float, filter: str = ""
     ):
         k = 100
+        if self.db.read_only:
+            # forwarded deletes stay visible here, so everything is found in one search
+            k = max(k, self.db.count_docs())
         tot = 0
         removed = []
 
@@ -371,14 +530,11 @@ class Memory:
 
             # Delete documents with IDs over the threshold score
             if document_ids:
-                # fnd = self.db.get(where={"id": {"$in": document_ids}})
-                # if fnd["ids"]: self.db.delete(ids=fnd["ids"])
-                # tot += len(fnd["ids"])
-                await self.db.adelete(ids=document_ids)
+                await self._delete_ids(document_ids)
                 tot += len(document_ids)
 
             # If fewer than K document IDs, break the loop
-            if len(document_ids) < k:
+            if len(document_ids) < k or self.db.read_only:
                 break
 
         if tot:
@@ -392,7 +548,7 @@ class Memory:
         )  # existing docs to remove (prevents error)
         if rem_docs:
             rem_ids = [doc.metadata["id"] for doc in rem_docs]  # ids to remove
-            await self.db.adelete(ids=rem_ids)
+            await self._delete_ids(rem_ids)
 
         if rem_docs:
             self._save_db()  # persist
@@ -404,29 +560,390 @@ class Memory:
         return ids[0]
 
     async def insert_documents(self, docs: list[Document]):
-        ids = [self._generate_doc_id() for _ in range(len(docs))]
-        timestamp = self.get_timestamp()
-
+        ids = self._prepare_new_docs(docs)
         if ids:
-            for doc, id in zip(docs, ids):
-                doc.metadata["id"] = id  # add ids to documents metadata
-                doc.metadata["timestamp"] = timestamp  # add timestamp
-                if not doc.metadata.get("area", ""):
-                    doc.metadata["area"] = Memory.Area.MAIN.value
+            await self._add_docs(dict(zip(ids, docs)))
+            self._save_db()  # persist
+        return ids
 
-            await self.db.aadd_documents(documents=docs, ids=ids)
+    async def apply_changes(self, remove_ids: list[str], docs: list[Document]) -> list[str]:
+        """Delete and insert documents as one transaction, persisted once, returns the new ids.
+
+        Each area store logs its part as a single record and the parts are committed together,
+        so the changes of all areas are replayed all or nothing.
+        """
+        remove_ids = [doc.metadata["id"] for doc in self.db.get_by_ids(list(dict.fromkeys(remove_ids)))]
+        ids = self._prepare_new_docs(docs)
+        if remove_ids or ids:
+            await self._replace_docs(remove_ids, dict(zip(ids, docs)))
             self._save_db()  # persist
         return ids
 
+    async def filter_duplicates(
+        self, texts: list[str], area: str, threshold: float = memory_dedup.DEFAULT_THRESHOLD
+    ) -> tuple[list[str], int, int]:
+        """New memories of an area that duplicate neither existing ones nor each other.
+
+        Returns the texts to memorize with the numbers of skipped and merged ones.
+        Exact duplicates are skipped. A near duplicate with at least threshold similarity
+        replaces the memory it resembles when it is longer and is skipped otherwise.
+        Nothing is sent to a model for them, but replaced texts are embedded.
+        A threshold of 0 turns the check off.
+        """
+        if threshold <= 0 or not texts:
+            return texts, 0, 0
+        part = self.db.partitions.get(area)
+        index = None
+        if part is not None:
+            # built from all documents of the area on first use
+            index = await asyncio.get_running_loop().run_in_executor(None, part.get_dedup_index)
+        batch = memory_dedup.DedupIndex()  # the new memories against each other
+        result: list[str] = []
+        updates: dict[str, Document] = {}
+        skipped = 0
+        for no, text in enumerate(texts):
+            found = index.find(text, threshold) if index is not None else None
+            if batch.find(text, threshold) is not None or (found and found[0] in updates):
+                skipped += 1
+                continue
+            batch.add(str(no), text)
+            existing = self.db.get_by_ids([found[0]]) if found else []
+            if not existing:
+                result.append(text)
+            elif found[1] < 1 and len(text) > len(existing[0].page_content):  # type: ignore
+                metadata = {**existing[0].metadata, "timestamp": self.get_timestamp()}
+                updates[found[0]] = Document(text, metadata=metadata)  # type: ignore
+            else:
+                skipped += 1
+        if updates:
+            await self.update_documents(list(updates.values()))
+        memory_dedup.count(skipped=skipped, merged=len(updates), checked=len(texts))
+        return result, skipped, len(updates)
+
+    def _prepare_new_docs(self, docs: list[Document]) -> list[str]:
+        ids = [self._generate_doc_id() for _ in range(len(docs))]
+        timestamp = self.get_timestamp()
+        for doc, id in zip(docs, ids):
+            doc.metadata["id"] = id  # add ids to documents metadata
+            doc.metadata["timestamp"] = timestamp  # add timestamp
+            if not doc.metadata.get("area", ""):
+                doc.metadata["area"] = Memory.Area.MAIN.value
+        return ids
+
     async def update_documents(self, docs: list[Document]):
         ids = [doc.metadata["id"] for doc in docs]
-        await self.db.adelete(ids=ids)  # delete originals
-        ins = await self.db.aadd_documents(documents=docs, ids=ids)  # add updated
+        # originals are replaced in one transaction, the area may have changed
+        await self._replace_docs(ids, dict(zip(ids, docs)))
         self._save_db()  # persist
-        return ins
+        return ids
+
+    def clear_area(self, area: str) -> int:
+        """Remove all documents of an area, other areas are not touched."""
+        return self.db.drop_partition(area)
+
+    def get_index_config(self) -> dict[str, Any]:
+        """Configured index of the memory subdir and the index each area store has now."""
+        return {
+            "index_type": vector_index.get_index_type(self.db.db_dir),
+            "quantization": vector_index.get_quantization(self.db.db_dir),
+            "areas": {
+                area: {
+                    "index_type": vector_index.get_kind(part.index),
+                    "quantization": vector_index.get_index_quantization(part.index),
+                    "full_vectors": part.full_vectors is not None,
+                    "documents": len(part.index_to_docstore_id),
+                    "building": part.index_builder is not None,
+                }
+                for area, part in list(self.db.partitions.items())
+            },
+        }
+
+    def set_index_config(
+        self,
+        index_type: vector_index.IndexType | None = None,
+        quantization: vector_index.Quantization | None = None,
+    ) -> dict[str, Any]:
+        """Change the index or vector storage of the memory subdir, the area stores are rebuilt in the background.
+
+        Searches keep using the current indexes until the new ones are swapped in. Quantized stores
+        keep their full precision vectors for re-ranking, they are dropped once rebuilt without quantization.
+        """
+        if self.db.read_only:
+            raise RuntimeError(f"The index of memory '{self.memory_subdir}' is changed by its writer process")
+        if index_type is not None:
+            vector_index.set_index_type(self.db.db_dir, index_type)
+        if quantization is not None:
+            vector_index.set_quantization(self.db.db_dir, quantization)
+        for part in list(self.db.partitions.values()):
+            if index_type is not None:
+                part.index_type = index_type
+            if quantization is not None:
+                part.quantization = quantization
+                if part.full_vectors is None:
+                    # copied from the current index before it is rebuilt with quantized vectors
+                    vector_index.attach_full_vectors(part, quantization)
+            part.index_builder = None  # a build for the previous config is dropped
+            vector_index.maybe_rebuild(part, part.index_type, part.quantization)
+        return self.get_index_config()
+
+    async def export_memories(
+        self, path: str, areas: set[str] | None = None, since: str = "", until: str = ""
+    ) -> dict[str, Any]:
+        """Write the documents of the areas with timestamps from since to until to an export file.
+
+        Documents are written with their vectors and the embedding model, one chunk at a
+        time, so exports of large stores do not need their size in memory. Returns the manifest.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._export_memories, path, areas, since, until
+        )
+
+    def _export_memories(self, path: str, areas: set[str] | None, since: str, until: str) -> dict[str, Any]:
+        embedding_set = memory_store.get_embedding_set(self.db.db_dir)
+        model = {key: embedding_set[key] for key in ("model_provider", "model_name") if key in embedding_set}
+        filters = {"areas": sorted(areas) if areas is not None else None, "since": since, "until": until}
+        writer = memory_export.ExportWriter(path, model, filters)
+        try:
+            for part in self.db.select(areas):
+                docs = part.get_all_docs()
+                ids = list(docs)
+                for start in range(0, len(ids), memory_export.EXPORT_CHUNK):
+                    chunk = {id: doc for id in ids[start : start + memory_export.EXPORT_CHUNK] if (doc := docs.get(id))}
+                    stamps = memory_export.encode([str(doc.metadata.get("timestamp", "")) for doc in chunk.values()])
+                    mask = memory_export.get_mask(stamps, since, until)
+                    chunk_ids, vectors = part.get_vectors([id for id, selected in zip(chunk, mask) if selected])
+                    if chunk_ids:
+                        writer.write(chunk_ids, [chunk[id] for id in chunk_ids], vectors)
+        except BaseException:
+            writer.zip.close()
+            os.remove(path)  # not a readable export without its manifest
+            raise
+        return writer.close()
+
+    async def import_memories(
+        self,
+        path: str,
+        areas: set[str] | None = None,
+        since: str = "",
+        until: str = "",
+        reembed: bool = False,
+    ) -> dict[str, Any]:
+        """Add the documents of an export file that are not in memory yet, one chunk at a time.
+
+        Vectors of the export are used when it was made with the embedding model of this
+        memory, another model raises an error unless reembed is set to embed the texts again.
+        Importing a file again only adds documents missing by id.
+        """
+        loop = asyncio.get_running_loop()
+        manifest = await loop.run_in_executor(None, memory_export.read_manifest, path)
+        embedding_set = memory_store.get_embedding_set(self.db.db_dir)
+        same_model = not embedding_set or all(
+            manifest.get(key) == embedding_set.get(key) for key in ("model_provider", "model_name")
+        )
+        if not same_model and not reembed:
+            raise ValueError(
+                f"Memory export was embedded with {manifest.get('model_provider')}/{manifest.get('model_name')}, "
+                f"this memory uses {embedding_set.get('model_provider')}/{embedding_set.get('model_name')}, "
+                "import it with re-embedding"
+            )
+        imported = skipped = 0
+        chunks = memory_export.read_chunks(path, areas, since, until)
+        while chunk := await loop.run_in_executor(None, next, chunks, None):
+            ids, docs, vectors = chunk
+            new = [no for no, id in enumerate(ids) if self.db.get_area(id) is None]
+            skipped += len(ids) - len(new)
+            if not new:
+                continue
+            new_docs = {ids[no]: docs[no] for no in new}
+            for id, doc in new_docs.items():
+                doc.metadata["id"] = id
+            if same_model:
+                new_vectors = [vectors[no].tolist() for no in new]
+            else:
+                new_vectors = await self.db.embedding_function.aembed_documents(
+                    [doc.page_content for doc in new_docs.values()]
+                )
+            self._add_embedded(new_docs, dict(zip(new_docs, new_vectors)))
+            self._save_db()  # persist
+            imported += len(new)
+        return {"imported": imported, "skipped": skipped, "reembedded": not same_model}
+
+    async def _add_docs(self, docs: dict[str, Document]):
+        if self.db.read_only:
+            # the writer process adds them, this one sees them once they are published
+            vectors = await self.db.embedding_function.aembed_documents(
+                [doc.page_content for doc in docs.values()]
+            )
+            self.db.inbox.put(memory_wal.get_add_record(list(docs), list(docs.values()), vectors))  # type: ignore
+            return
+        for area, area_docs in memory_store.group_by_area(docs).items():
+            part = self.db.get_partition(area)
+            vectors = await part.aadd_documents_with_vectors(
+                list(area_docs.values()), list(area_docs.keys())
+            )
+            memory_store.log_add(part, list(area_docs.keys()), list(area_docs.values()), vectors)
+            self._changed.add(area)
+            self.db.version = memory_store.next_version()
+        self.db.mark_changed(list(docs))
+
+    async def _delete_ids(self, ids: list[str]):
+        if self.db.read_only:
+            self.db.inbox.put(memory_wal.get_delete_record(ids))  # type: ignore
+            return
+        for area, area_ids in self.db.group_ids(ids).items():
+            part = self.db.partitions[area]
+            await part.adelete(ids=area_ids)
+            memory_store.log_delete(part, area_ids)
+            self._changed.add(area)
+            self.db.version = memory_store.next_version()
+            self.db.mark_changed(area_ids)
+
+    def _maintain_index(self, partitions: list[MyFaiss]):
+        # swap in a finished background build, start one when the store outgrew its index
+        if self.db.read_only:
+            return  # mapped images are rebuilt by the writer
+        for db in partitions:
+            if vector_index.maybe_rebuild(db, db.index_type, db.quantization):
+                wal: MemoryWal | None = getattr(db, "wal", None)
+                if wal:
+                    wal.checkpoint(db)  # persist the new index in the background
+                else:
+                    memory_store.save_store(db)
 
     def _save_db(self):
-        Memory._save_db_file(self.db, self.memory_subdir)
+        # only the stores of changed areas are persisted
+        partitions = [self.db.partitions[area] for area in self._changed if area in self.db.partitions]
+        self._changed.clear()
+        self._maintain_index(partitions)
+        for db in partitions:
+            wal: MemoryWal | None = getattr(db, "wal", None)
+            if wal:
+                # changes are in the log already, the full index is written by checkpoints
+                wal.maybe_checkpoint(db)
+            else:
+                memory_store.save_store(db)
+
+    def _apply_inbox(self):
+        # one round of the shared memory writer
+        for path, record in self.db.inbox.take():  # type: ignore
+            self._apply_forwarded(record)
+            self.db.inbox.done(path)  # type: ignore
+        self._save_db()
+        for part in list(self.db.partitions.values()):
+            wal: MemoryWal | None = getattr(part, "wal", None)
+            if wal:
+                wal.maybe_checkpoint(part)
+
+    def _apply_forwarded(self, record: dict[str, Any]):
+        # change of a reader process, records use the write-ahead log format
+        if record["op"] == "add":
+            added = [item for item in memory_wal.read_add_record(record) if self.db.get_area(item[0]) is None]
+            self._add_embedded(
+                {id: doc for id, doc, _vector in added}, {id: vector for id, _doc, vector in added}
+            )
+        elif record["op"] == "delete":
+            for area, area_ids in self.db.group_ids(record["ids"]).items():
+                part = self.db.partitions[area]
+                part.delete(ids=area_ids)
+                memory_store.log_delete(part, area_ids)
+                self._changed.add(area)
+                self.db.mark_changed(area_ids)
+        elif record["op"] == "drop":
+            self.db.drop_partition(record["area"])
+            self._changed.discard(record["area"])
+        elif record["op"] == "batch":
+            remove_ids = [id for op in record["ops"] if op["op"] == "delete" for id in op["ids"]]
+            added = [item for op in record["ops"] if op["op"] == "add" for item in memory_wal.read_add_record(op)]
+            # documents are in already when the record was applied before the writer stopped
+            added = [item for item in added if item[0] in remove_ids or self.db.get_area(item[0]) is None]
+            self._apply_transaction(
+                remove_ids, {id: doc for id, doc, _vector in added}, {id: vector for id, _doc, vector in added}
+            )
+        self.db.version = memory_store.next_version()
+
+    async def _replace_docs(self, remove_ids: list[str], docs: dict[str, Document]):
+        # deletes and inserts of any areas as one transaction, embedded before anything changes
+        vectors: dict[str, list[float]] = {}
+        if docs:
+            embedded = await self.db.embedding_function.aembed_documents(
+                [doc.page_content for doc in docs.values()]
+            )
+            vectors = dict(zip(docs, embedded))
+        if self.db.read_only:
+            # forwarded as one record, the writer applies it as one transaction
+            self.db.inbox.put(  # type: ignore
+                {
+                    "op": "batch",
+                    "ops": [
+                        memory_wal.get_delete_record(remove_ids),
+                        memory_wal.get_add_record(list(docs), list(docs.values()), list(vectors.values())),
+                    ],
+                }
+            )
+            return
+        self._apply_transaction(remove_ids, docs, vectors)
+
+    def _apply_transaction(
+        self, remove_ids: list[str], docs: dict[str, Document], vectors: dict[str, list[float]]
+    ):
+        # nothing is awaited and the stores are locked, so no other change is logged in between,
+        # the parts are logged before they are applied and committed once all are logged
+        deletes = self.db.group_ids(remove_ids)
+        adds = memory_store.group_by_area(docs)
+        areas = sorted(set(deletes) | set(adds))
+        parts = {area: self.db.get_partition(area) for area in areas}
+        txn = uuid.uuid4().hex if len(areas) > 1 and self.db.transactions else None
+        with contextlib.ExitStack() as stack:
+            for area in areas:
+                stack.enter_context(parts[area]._write_lock)
+            for area in areas:
+                part = parts[area]
+                deletes[area] = [id for id in deletes.get(area, []) if id in part.docstore._dict]  # type: ignore
+                records = [memory_wal.get_delete_record(deletes[area])] if deletes[area] else []
+                if area in adds:
+                    ids = list(adds[area])
+                    records.append(
+                        memory_wal.get_add_record(ids, [adds[area][id] for id in ids], [vectors[id] for id in ids])
+                    )
+                wal: MemoryWal | None = getattr(part, "wal", None)
+                if wal and records:
+                    wal.log_batch(records, txn)
+            if txn:
+                self.db.transactions.commit(txn)  # type: ignore
+            for area in areas:
+                part = parts[area]
+                if deletes[area]:
+                    part.delete(ids=deletes[area])
+                if area in adds:
+                    ids = list(adds[area])
+                    part.add_embeddings(
+                        [(adds[area][id].page_content, vectors[id]) for id in ids],
+                        metadatas=[adds[area][id].metadata for id in ids],
+                        ids=ids,
+                    )
+                self._changed.add(area)
+        self.db.version = memory_store.next_version()
+        self.db.mark_changed(list(dict.fromkeys(remove_ids + list(docs))))
+
+    def _add_embedded(self, docs: dict[str, Document], vectors: dict[str, list[float]]):
+        # documents with their vectors, nothing is embedded
+        if self.db.read_only:
+            self.db.inbox.put(  # type: ignore
+                memory_wal.get_add_record(list(docs), list(docs.values()), [vectors[id] for id in docs])
+            )
+            return
+        for area, area_docs in memory_store.group_by_area(docs).items():
+            part = self.db.get_partition(area)
+            ids = list(area_docs)
+            part.add_embeddings(
+                [(area_docs[id].page_content, vectors[id]) for id in ids],
+                metadatas=[area_docs[id].metadata for id in ids],
+                ids=ids,
+            )
+            memory_store.log_add(part, ids, list(area_docs.values()), [vectors[id] for id in ids])
+            self._changed.add(area)
+            self.db.version = memory_store.next_version()
+        self.db.mark_changed(list(docs))
 
     def _generate_doc_id(self):
         while True:
@@ -434,36 +951,11 @@ class Memory:
             if not self.db.get_by_ids(doc_id):  # check if exists
                 return doc_id
 
-    @staticmethod
-    def _save_db_file(db: MyFaiss, memory_subdir: str):
-        abs_dir = abs_db_dir(memory_subdir)
-        db.save_local(folder_path=abs_dir)
-
-    @staticmethod
-    def _get_comparator(condition: str):
-        def comparator(data: dict[str, Any]):
-            try:
-                result = simple_eval(condition, names=data)
-                return result
-            except Exception as e:
-                PrintStyle.error(f"Error evaluating condition: {e}")
-                return False
-
-        return comparator
-
     @staticmethod
     def _score_normalizer(val: float) -> float:
         res = 1 - 1 / (1 + np.exp(val))
         return res
 
-    @staticmethod
-    def _cosine_normalizer(val: float) -> float:
-        res = (1 + val) / 2
-        res = max(
-            0, min(1, res)
-        )  # float precision can cause values like 1.0000000596046448
-        return res
-
     @staticmethod
     def format_docs_plain(docs: list[Document]) -> list[str]:
         result = []
@@ -489,7 +981,7 @@ def get_custom_knowledge_subdir_abs(agent: Agent) -> str:
 
 def reload():
     # clear the memory index, this will force all DBs to reload
-    Memory.index = {}
+    Memory.index.clear()
 
 
 def abs_db_dir(memory_subdir: str) -> str:
@@ -550,9 +1042,7 @@ def get_existing_memory_subdirs() -> list[str]:
 
         project_subdirs = files.get_subdirectories(get_projects_parent_folder())
         for project_subdir in project_subdirs:
-            if files.exists(
-                get_project_meta_folder(project_subdir), "memory", "index.faiss"
-            ):
+            if memory_store.is_memory_dir(get_project_meta_folder(project_subdir, "memory")):
                 subdirs.append(f"projects/{project_subdir}")
 
         # Ensure 'default' is always available
@@ -2,7 +2,7 @@ import asyncio
 import json
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from enum import Enum
 
 from langchain_core.documents import Document
@@ -58,6 +58,15 @@ class MemoryAnalysisContext:
     area: str
     timestamp: str
     existing_metadata: Dict[str, Any]
+    similarity_scores: Dict[str, float] = field(default_factory=dict)
+    new_memories: List[str] = field(default_factory=list)  # the memories of a batch, new_memory lists them numbered
+
+
+@dataclass
+class ConsolidationPlan:
+    """Memories to remove and insert, applied to the database in one transaction."""
+    remove_ids: List[str] = field(default_factory=list)
+    new_docs: List[Document] = field(default_factory=list)
 
 
 class MemoryConsolidator:
@@ -109,6 +118,168 @@ class MemoryConsolidator:
             PrintStyle().error(f"Memory consolidation error for area {area}: {str(e)}")
             return {"success": False, "memory_ids": []}
 
+    async def process_new_memories(
+        self,
+        new_memories: List[str],
+        area: str,
+        metadata: Dict[str, Any],
+        log_item: Optional[LogItem] = None
+    ) -> dict:
+        """
+        Consolidate several new memories together.
+
+        Similar memories of all new memories are searched concurrently, new memories
+        sharing similar memories are analyzed by one LLM call, and all resulting
+        changes are applied to the database in one transaction.
+
+        Returns:
+            dict: {"success": bool, "memory_ids": [str, ...]}
+        """
+        try:
+            return await asyncio.wait_for(
+                self._process_memories_batch(new_memories, area, metadata, log_item),
+                timeout=self.config.processing_timeout_seconds * max(1, len(new_memories))
+            )
+
+        except asyncio.TimeoutError:
+            PrintStyle().error(f"Memory consolidation timeout for area {area}")
+            return {"success": False, "memory_ids": []}
+
+        except Exception as e:
+            PrintStyle().error(f"Memory consolidation error for area {area}: {str(e)}")
+            return {"success": False, "memory_ids": []}
+
+    async def _process_memories_batch(
+        self,
+        new_memories: List[str],
+        area: str,
+        metadata: Dict[str, Any],
+        log_item: Optional[LogItem] = None
+    ) -> dict:
+        """Execute the consolidation pipeline for a batch of new memories."""
+
+        new_memories = [memory for memory in dict.fromkeys(m.strip() for m in new_memories) if memory]
+        if not new_memories:
+            return {"success": True, "memory_ids": []}
+
+        if log_item:
+            log_item.update(progress=f"Consolidating {len(new_memories)} new memories...", temp=True)
+
+        # Step 1: Discover similar memories of all new memories concurrently
+        similar = await asyncio.gather(
+            *[self._find_similar_memories(memory, area, log_item) for memory in new_memories]
+        )
+
+        # Step 2: Group new memories that share similar memories
+        groups = self._group_related(similar)
+
+        # Step 3: Analyze each group with one LLM call, groups run concurrently
+        db = await Memory.get(self.agent)
+        plans = await asyncio.gather(
+            *[
+                self._plan_group([new_memories[i] for i in group], [similar[i] for i in group], db, area, metadata)
+                for group in groups
+            ]
+        )
+
+        # Step 4: Apply all changes in one transaction
+        remove_ids: List[str] = []
+        new_docs: List[Document] = []
+        for plan in plans:
+            remove_ids += plan.remove_ids
+            new_docs += plan.new_docs
+        memory_ids = await db.apply_changes(remove_ids, new_docs)
+
+        if log_item:
+            log_item.update(
+                result=f"Consolidation completed: {len(new_memories)} new memories in {len(groups)} groups",
+                memory_ids=memory_ids,
+                memories_removed=len(set(remove_ids))
+            )
+        return {"success": bool(memory_ids) or not new_docs, "memory_ids": memory_ids}
+
+    def _group_related(self, similar: List[List[Tuple[Document, float]]]) -> List[List[int]]:
+        """Indexes of new memories grouped by shared similar memories."""
+        parent = list(range(len(similar)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        owner: Dict[str, int] = {}
+        for i, hits in enumerate(similar):
+            for doc, _score in hits:
+                doc_id = doc.metadata.get('id')
+                if doc_id in owner:
+                    parent[find(i)] = find(owner[doc_id])
+                elif doc_id:
+                    owner[doc_id] = i
+
+        groups: Dict[int, List[int]] = {}
+        for i in range(len(similar)):
+            groups.setdefault(find(i), []).append(i)
+        return list(groups.values())
+
+    async def _plan_group(
+        self,
+        memories: List[str],
+        similar: List[List[Tuple[Document, float]]],
+        db: Memory,
+        area: str,
+        metadata: Dict[str, Any]
+    ) -> ConsolidationPlan:
+        """Decide the changes for a group of related new memories."""
+
+        # similar memories of the group, best score of each, removed ones left out
+        best: Dict[str, Tuple[Document, float]] = {}
+        for doc, score in (hit for hits in similar for hit in hits):
+            doc_id = doc.metadata.get('id')
+            if doc_id and (doc_id not in best or score > best[doc_id][1]):
+                best[doc_id] = (doc, score)
+        existing = {doc.metadata.get('id') for doc in db.db.get_by_ids(list(best))}
+        ranked = sorted((item for id, item in best.items() if id in existing), key=lambda item: item[1], reverse=True)
+        ranked = ranked[:self.config.max_llm_context_memories * len(memories)]
+
+        def insert_separately(action: str) -> ConsolidationPlan:
+            return ConsolidationPlan(
+                new_docs=[
+                    Document(memory, metadata={'area': area, 'consolidation_action': action, **metadata})
+                    for memory in memories
+                ]
+            )
+
+        if not ranked:
+            return insert_separately("direct_insert")
+
+        context = MemoryAnalysisContext(
+            new_memory=memories[0] if len(memories) == 1 else "\n\n".join(
+                f"{i + 1}. {memory}" for i, memory in enumerate(memories)
+            ),
+            similar_memories=[doc for doc, _score in ranked],
+            area=area,
+            timestamp=self._get_timestamp(),
+            existing_metadata=metadata,
+            similarity_scores={doc.metadata.get('id'): score for doc, score in ranked},
+            new_memories=memories
+        )
+        result = await self._analyze_memory_consolidation(context)
+
+        # a group kept apart is stored as the individual new memories
+        if result.action == ConsolidationAction.SKIP or (
+            result.action == ConsolidationAction.KEEP_SEPARATE and len(memories) > 1
+        ):
+            return insert_separately(result.action.value)
+
+        plan = await self._plan_consolidation_result(db, result, area, metadata, context.similarity_scores)
+        if plan is None or not plan.new_docs:
+            return insert_separately("consolidation_failed")
+        if not result.new_memory_content and len(memories) > 1:
+            # no text for the new memories themselves, they are stored as they are
+            plan.new_docs += insert_separately(result.action.value).new_docs
+        return plan
+
     async def _process_memory_with_consolidation(
         self,
         new_memory: str,
@@ -122,7 +293,9 @@ class MemoryConsolidator:
             log_item.update(progress="Starting intelligent memory consolidation...")
 
         # Step 1: Discover similar memories
-        similar_memories = await self._find_similar_memories(new_memory, area, log_item)
+        similar = await self._find_similar_memories(new_memory, area, log_item)
+        similar_memories = [doc for doc, _score in similar]
+        similarity_scores = {doc.metadata.get('id'): score for doc, score in similar}
 
         # this block always returns
         if not similar_memories:
@@ -211,7 +384,8 @@ class MemoryConsolidator:
             similar_memories=similar_memories,
             area=area,
             timestamp=self._get_timestamp(),
-            existing_metadata=metadata
+            existing_metadata=metadata,
+            similarity_scores=similarity_scores
         )
 
         consolidation_result = await self._analyze_memory_consolidation(analysis_context, log_item)
@@ -246,7 +420,8 @@ class MemoryConsolidator:
             consolidation_result,
             area,
             analysis_context.existing_metadata,  # Pass original metadata
-            log_item
+            log_item,
+            similarity_scores
         )
 
         if log_item:
@@ -329,88 +504,48 @@ class MemoryConsolidator:
         new_memory: str,
         area: str,
         log_item: Optional[LogItem] = None
-    ) -> List[Document]:
+    ) -> List[Tuple[Document, float]]:
         """
         Find similar memories using both semantic similarity and keyword matching.
-        Now includes knowledge source awareness and similarity scores for validation.
+        Returns (document, similarity score) pairs, best first, limited to the LLM context size.
         """
         db = await Memory.get(self.agent)
 
         # Step 1: Extract keywords/queries for enhanced search
-        search_queries = await self._extract_search_keywords(new_memory, log_item)
-
-        all_similar = []
-
-        # Step 2: Semantic similarity search with scores
-        semantic_similar = await db.search_similarity_threshold(
-            query=new_memory,
-            limit=self.config.max_similar_memories,
-            threshold=self.config.similarity_threshold,
-            filter=f"area == '{area}'"
-        )
-        all_similar.extend(semantic_similar)
-
-        # Step 3: Keyword-based searches
-        for query in search_queries:
-            if query.strip():
-                # Fix division by zero: ensure len(search_queries) > 0
-                queries_count = max(1, len(search_queries))  # Prevent division by zero
-                keyword_similar = await db.search_similarity_threshold(
-                    query=query.strip(),
-                    limit=max(3, self.config.max_similar_memories // queries_count),
-                    threshold=self.config.similarity_threshold,
-                    filter=f"area == '{area}'"
-                )
-                all_similar.extend(keyword_similar)
+        search_queries = [query.strip() for query in await self._extract_search_keywords(new_memory, log_item)]
+        search_queries = [query for query in search_queries if query]
+        queries_count = max(1, len(search_queries))  # Prevent division by zero
+
+        # Step 2: Semantic and keyword searches run concurrently, each with real vector scores
+        searches = [
+            db.search_similarity_scores(
+                query=new_memory,
+                limit=self.config.max_similar_memories,
+                threshold=self.config.similarity_threshold,
+                filter=f"area == '{area}'"
+            )
+        ]
+        searches += [
+            db.search_similarity_scores(
+                query=query,
+                limit=max(3, self.config.max_similar_memories // queries_count),
+                threshold=self.config.similarity_threshold,
+                filter=f"area == '{area}'"
+            )
+            for query in search_queries
+        ]
+        results = await asyncio.gather(*searches)
 
-        # Step 4: Deduplicate by document ID and store similarity info
-        seen_ids = set()
-        unique_similar = []
-        for doc in all_similar:
-            doc_id = doc.metadata.get('id')
-            if doc_id and doc_id not in seen_ids:
-                seen_ids.add(doc_id)
-                unique_similar.append(doc)
-
-        # Step 5: Calculate similarity scores for replacement validation
-        # Since FAISS doesn't directly expose similarity scores, use ranking-based estimation
-        # CRITICAL: All documents must have similarity >= search_threshold since FAISS returned them
-        # FIXED: Use conservative scoring that keeps all scores in safe consolidation range
-        similarity_scores = {}
-        total_docs = len(unique_similar)
-        search_threshold = self.config.similarity_threshold
-        safety_threshold = self.config.replace_similarity_threshold
-
-        for i, doc in enumerate(unique_similar):
-            doc_id = doc.metadata.get('id')
-            if doc_id:
-                # Convert ranking to similarity score with conservative distribution
-                if total_docs == 1:
-                    ranking_similarity = 1.0  # Single document gets perfect score
-                else:
-                    # Use conservative scoring: distribute between safety_threshold and 1.0
-                    # This ensures all scores are suitable for consolidation
-                    # First document gets 1.0, last gets safety_threshold (0.9 by default)
-                    ranking_factor = 1.0 - (i / (total_docs - 1))
-                    score_range = 1.0 - safety_threshold  # e.g., 1.0 - 0.9 = 0.1
-                    ranking_similarity = safety_threshold + (score_range * ranking_factor)
-
-                    # Ensure minimum score is search_threshold for logical consistency
-                    ranking_similarity = max(ranking_similarity, search_threshold)
-
-                similarity_scores[doc_id] = ranking_similarity
-
-        # Step 6: Add similarity score to document metadata for LLM analysis
-        for doc in unique_similar:
+        # Step 3: Deduplicate by document ID, keeping the best score of each
+        best: Dict[str, Tuple[Document, float]] = {}
+        for doc, score in (hit for hits in results for hit in hits):
             doc_id = doc.metadata.get('id')
-            estimated_similarity = similarity_scores.get(doc_id, 0.7)
-            # Store for later validation
-            doc.metadata['_consolidation_similarity'] = estimated_similarity
+            if doc_id and (doc_id not in best or score > best[doc_id][1]):
+                best[doc_id] = (doc, float(score))
 
-        # Step 7: Limit to max context for LLM
-        limited_similar = unique_similar[:self.config.max_llm_context_memories]
-
-        return limited_similar
+        # Step 4: Limit to max context for LLM
+        similar = sorted(best.values(), key=lambda item: item[1], reverse=True)
+        return similar[:self.config.max_llm_context_memories]
 
     async def _extract_search_keywords(
         self,
@@ -470,7 +605,9 @@ class MemoryConsolidator:
             for i, doc in enumerate(context.similar_memories):
                 timestamp = doc.metadata.get('timestamp', 'unknown')
                 doc_id = doc.metadata.get('id', f'doc_{i}')
-                similar_memories_text += f"ID: {doc_id}\nTimestamp: {timestamp}\nContent: {doc.page_content}\n\n"
+                similarity = context.similarity_scores.get(doc_id)
+                similarity_line = f"Similarity: {similarity:.2f}\n" if similarity is not None else ""
+                similar_memories_text += f"ID: {doc_id}\nTimestamp: {timestamp}\n{similarity_line}Content: {doc.page_content}\n\n"
 
             # Build system prompt
             system_prompt = self.agent.read_prompt(
@@ -508,8 +645,9 @@ class MemoryConsolidator:
                 action = ConsolidationAction.SKIP
 
             # Determine appropriate fallback for new_memory_content based on action
-            if action in [ConsolidationAction.MERGE, ConsolidationAction.REPLACE]:
+            if action in [ConsolidationAction.MERGE, ConsolidationAction.REPLACE] or len(context.new_memories) > 1:
                 # For MERGE/REPLACE, if no content provided, it's an error - don't use original
+                # A batch is never stored as its numbered list, the caller inserts its memories
                 default_content = ""
             else:
                 # For KEEP_SEPARATE/UPDATE/SKIP, original memory is appropriate fallback
@@ -537,50 +675,67 @@ class MemoryConsolidator:
         result: ConsolidationResult,
         area: str,
         original_metadata: Dict[str, Any],  # Add original metadata parameter
-        log_item: Optional[LogItem] = None
+        log_item: Optional[LogItem] = None,
+        similarity_scores: Optional[Dict[str, float]] = None
     ) -> list:
         """Apply the consolidation decisions to the memory database."""
 
         try:
             db = await Memory.get(self.agent)
+            plan = await self._plan_consolidation_result(
+                db, result, area, original_metadata, similarity_scores or {}
+            )
+            if plan is None:
+                return []
+            # removals and inserts are persisted together
+            return await db.apply_changes(plan.remove_ids, plan.new_docs)
 
-            # Retrieve metadata from memories being consolidated to preserve important fields
-            consolidated_metadata = await self._gather_consolidated_metadata(db, result, original_metadata)
+        except Exception as e:
+            PrintStyle().error(f"Failed to apply consolidation result: {str(e)}")
+            return []
 
-            # Handle each action type specifically
-            if result.action == ConsolidationAction.KEEP_SEPARATE:
-                return await self._handle_keep_separate(db, result, area, consolidated_metadata, log_item)
+    async def _plan_consolidation_result(
+        self,
+        db: Memory,
+        result: ConsolidationResult,
+        area: str,
+        original_metadata: Dict[str, Any],
+        similarity_scores: Dict[str, float]
+    ) -> Optional[ConsolidationPlan]:
+        """Turn the consolidation decisions into memories to remove and insert."""
 
-            elif result.action == ConsolidationAction.MERGE:
-                return await self._handle_merge(db, result, area, consolidated_metadata, log_item)
+        # Retrieve metadata from memories being consolidated to preserve important fields
+        consolidated_metadata = await self._gather_consolidated_metadata(db, result, original_metadata)
 
-            elif result.action == ConsolidationAction.REPLACE:
-                return await self._handle_replace(db, result, area, consolidated_metadata, log_item)
+        # Handle each action type specifically
+        if result.action == ConsolidationAction.KEEP_SEPARATE:
+            return self._plan_keep_separate(result, area, consolidated_metadata)
 
-            elif result.action == ConsolidationAction.UPDATE:
-                return await self._handle_update(db, result, area, consolidated_metadata, log_item)
+        elif result.action == ConsolidationAction.MERGE:
+            return self._plan_merge(result, area, consolidated_metadata)
 
-            else:
-                # Should not reach here, but handle gracefully
-                PrintStyle().warning(f"Unknown consolidation action: {result.action}")
-                return []
+        elif result.action == ConsolidationAction.REPLACE:
+            return self._plan_replace(db, result, area, consolidated_metadata, similarity_scores)
 
-        except Exception as e:
-            PrintStyle().error(f"Failed to apply consolidation result: {str(e)}")
-            return []
+        elif result.action == ConsolidationAction.UPDATE:
+            return self._plan_update(db, result, area, consolidated_metadata)
 
-    async def _handle_keep_separate(
+        else:
+            # Should not reach here, but handle gracefully
+            PrintStyle().warning(f"Unknown consolidation action: {result.action}")
+            return None
+
+    def _plan_keep_separate(
         self,
-        db: Memory,
         result: ConsolidationResult,
         area: str,
         original_metadata: Dict[str, Any],  # Add original metadata parameter
-        log_item: Optional[LogItem] = None
-    ) -> list:
+    ) -> ConsolidationPlan:
         """Handle KEEP_SEPARATE action: Insert new memory without touching existing ones."""
 
+        plan = ConsolidationPlan()
         if not result.new_memory_content:
-            return []
+            return plan
 
         # Prepare metadata for new memory
         # LLM metadata takes precedence over original metadata when there are conflicts
@@ -596,22 +751,21 @@ class MemoryConsolidator:
         # if result.reasoning:
         #     final_metadata['consolidation_reasoning'] = result.reasoning
 
-        new_id = await db.insert_text(result.new_memory_content, final_metadata)
-        return [new_id]
+        plan.new_docs.append(Document(result.new_memory_content, metadata=final_metadata))
+        return plan
 
-    async def _handle_merge(
+    def _plan_merge(
         self,
-        db: Memory,
         result: ConsolidationResult,
         area: str,
         original_metadata: Dict[str, Any],  # Add original metadata parameter
-        log_item: Optional[LogItem] = None
-    ) -> list:
+    ) -> ConsolidationPlan:
         """Handle MERGE action: Combine memories, remove originals, insert consolidated version."""
 
+        plan = ConsolidationPlan()
+
         # Step 1: Remove original memories being merged
-        if result.memories_to_remove:
-            await db.delete_documents_by_ids(result.memories_to_remove)
+        plan.remove_ids += result.memories_to_remove
 
         # Step 2: Insert consolidated memory
         if result.new_memory_content:
@@ -629,29 +783,32 @@ class MemoryConsolidator:
             # if result.reasoning:
             #     final_metadata['consolidation_reasoning'] = result.reasoning
 
-            new_id = await db.insert_text(result.new_memory_content, final_metadata)
-            return [new_id]
+            plan.new_docs.append(Document(result.new_memory_content, metadata=final_metadata))
         else:
-            return []
+            # nothing replaces the originals, keep them
+            plan.remove_ids = []
+        return plan
 
-    async def _handle_replace(
+    def _plan_replace(
         self,
         db: Memory,
         result: ConsolidationResult,
         area: str,
         original_metadata: Dict[str, Any],  # Add original metadata parameter
-        log_item: Optional[LogItem] = None
-    ) -> list:
+        similarity_scores: Dict[str, float]
+    ) -> ConsolidationPlan:
         """Handle REPLACE action: Remove old memories, insert new version with similarity validation."""
 
+        plan = ConsolidationPlan()
+
         # Step 1: Validate similarity scores for replacement safety
         if result.memories_to_remove:
             # Get the memories to be removed and check their similarity scores
-            memories_to_check = await db.db.aget_by_ids(result.memories_to_remove)
+            memories_to_check = db.db.get_by_ids(result.memories_to_remove)
 
             unsafe_replacements = []
             for memory in memories_to_check:
-                similarity = memory.metadata.get('_consolidation_similarity', 0.7)
+                similarity = similarity_scores.get(memory.metadata.get('id'), 0.0)
                 if similarity < self.config.replace_similarity_threshold:
                     unsafe_replacements.append({
                         'id': memory.metadata.get('id'),
@@ -682,17 +839,13 @@ class MemoryConsolidator:
                     # if result.reasoning:
                     #     final_metadata['consolidation_reasoning'] = result.reasoning
 
-                    new_id = await db.insert_text(result.new_memory_content, final_metadata)
-                    return [new_id]
-                else:
-                    return []
-
-        # Step 2: Proceed with normal replacement if similarity checks pass
-        if result.memories_to_remove:
-            await db.delete_documents_by_ids(result.memories_to_remove)
+                    plan.new_docs.append(Document(result.new_memory_content, metadata=final_metadata))
+                return plan
 
-        # Step 3: Insert replacement memory
+        # Step 2: Insert replacement memory, old memories go only when replaced
         if result.new_memory_content:
+            plan.remove_ids += result.memories_to_remove
+
             # LLM metadata takes precedence over original metadata when there are conflicts
             final_metadata = {
                 'area': area,
@@ -707,23 +860,19 @@ class MemoryConsolidator:
             # if result.reasoning:
             #     final_metadata['consolidation_reasoning'] = result.reasoning
 
-            new_id = await db.insert_text(result.new_memory_content, final_metadata)
-            return [new_id]
-        else:
-            return []
+            plan.new_docs.append(Document(result.new_memory_content, metadata=final_metadata))
+        return plan
 
-    async def _handle_update(
+    def _plan_update(
         self,
         db: Memory,
         result: ConsolidationResult,
         area: str,
         original_metadata: Dict[str, Any],  # Add original metadata parameter
-        log_item: Optional[LogItem] = None
-    ) -> list:
+    ) -> ConsolidationPlan:
         """Handle UPDATE action: Modify existing memories in place with additional information."""
 
-        updated_count = 0
-        updated_ids = []
+        plan = ConsolidationPlan()
 
         # Step 1: Update existing memories
         for update_info in result.memories_to_update:
@@ -732,13 +881,12 @@ class MemoryConsolidator:
 
             if memory_id and new_content:
                 # Validate that the memory exists before attempting to delete it
-                existing_docs = await db.db.aget_by_ids([memory_id])
-                if not existing_docs:
+                if not db.db.get_by_ids([memory_id]):
                     PrintStyle().warning(f"Memory ID {memory_id} not found during update, skipping")
                     continue
 
                 # Delete old version and insert updated version
-                await db.delete_documents_by_ids([memory_id])
+                plan.remove_ids.append(memory_id)
 
                 # LLM metadata takes precedence over original metadata when there are conflicts
                 updated_metadata = {
@@ -750,12 +898,9 @@ class MemoryConsolidator:
                     **update_info.get('metadata', {})       # LLM metadata second (wins conflicts)
                 }
 
-                new_id = await db.insert_text(new_content, updated_metadata)
-                updated_count += 1
-                updated_ids.append(new_id)
+                plan.new_docs.append(Document(new_content, metadata=updated_metadata))
 
         # Step 2: Insert additional new memory if provided
-        new_memory_id = None
         if result.new_memory_content:
             # LLM metadata takes precedence over original metadata when there are conflicts
             final_metadata = {
@@ -770,10 +915,9 @@ class MemoryConsolidator:
             # if result.reasoning:
             #     final_metadata['consolidation_reasoning'] = result.reasoning
 
-            new_memory_id = await db.insert_text(result.new_memory_content, final_metadata)
-            updated_ids.append(new_memory_id)
+            plan.new_docs.append(Document(result.new_memory_content, metadata=final_metadata))
 
-        return updated_ids
+        return plan
 
     def _get_timestamp(self) -> str:
         """Get current timestamp in standard format."""
@@ -0,0 +1,142 @@
+import hashlib
+import re
+import threading
+import unicodedata
+from typing import Any, Iterable
+
+import numpy as np
+
+NUM_PERM = 64  # minhash permutations per text
+BANDS = 16  # lsh bands of NUM_PERM // BANDS rows, candidates from about 0.5 similarity
+SHINGLE = 3  # words per shingle
+DEFAULT_THRESHOLD = 0.8  # estimated jaccard similarity of shingles for a near duplicate
+
+_PRIME = 4294967291  # largest prime below 2**32, products of 32 bit values fit in uint64
+_rng = np.random.default_rng(20240601)  # fixed, signatures are compared across restarts
+_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+_WORD = re.compile(r"\w+")
+
+_stats = {"checked": 0, "skipped": 0, "merged": 0}
+_stats_lock = threading.Lock()
+
+
+def normalize(text: str) -> list[str]:
+    """Lowercase words without punctuation, formatting and case do not make texts different."""
+    return _WORD.findall(unicodedata.normalize("NFKC", text).lower())
+
+
+def get_text_hash(words: list[str]) -> str:
+    return hashlib.md5(" ".join(words).encode("utf-8")).hexdigest()
+
+
+def get_signature(words: list[str]) -> np.ndarray:
+    """Minhash signature of the word shingles of a normalized text."""
+    size = min(SHINGLE, len(words)) or 1
+    shingles = {" ".join(words[i : i + size]) for i in range(max(1, len(words) - size + 1))}
+    values = np.array(
+        [
+            int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "big")
+            for shingle in shingles
+        ],
+        dtype=np.uint64,
+    )
+    hashed = (np.outer(values, _A) + _B) % _PRIME
+    return hashed.min(axis=0).astype(np.uint32)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated jaccard similarity of the shingles of two signatures."""
+    return float(np.mean(a == b))
+
+
+def count(skipped: int = 0, merged: int = 0, checked: int = 0):
+    with _stats_lock:
+        _stats["checked"] += checked
+        _stats["skipped"] += skipped
+        _stats["merged"] += merged
+
+
+def get_stats() -> dict[str, int]:
+    """Memories checked before insert, skipped as duplicates and merged into near duplicates."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+class DedupIndex:
+    """Normalized text hashes and minhash signatures of document texts by id.
+
+    Exact duplicates are found by hash, near duplicates through lsh bands of the
+    signatures, only documents sharing a band are compared.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hashes: dict[str, set[str]] = {}
+        self.signatures: dict[str, np.ndarray] = {}
+        self.text_hashes: dict[str, str] = {}
+        self.bands: dict[tuple[int, bytes], set[str]] = {}
+
+    @staticmethod
+    def build(docs: Iterable[tuple[str, Any]]) -> "DedupIndex":
+        index = DedupIndex()
+        for id, doc in docs:
+            index.add(id, doc.page_content)
+        return index
+
+    def add(self, id: str, text: str):
+        words = normalize(text)
+        text_hash = get_text_hash(words)
+        signature = get_signature(words)
+        with self.lock:
+            if id in self.signatures:
+                self._remove(id)
+            self.hashes.setdefault(text_hash, set()).add(id)
+            self.text_hashes[id] = text_hash
+            self.signatures[id] = signature
+            for band in _get_bands(signature):
+                self.bands.setdefault(band, set()).add(id)
+
+    def remove(self, id: str):
+        with self.lock:
+            self._remove(id)
+
+    def _remove(self, id: str):
+        signature = self.signatures.pop(id, None)
+        if signature is None:
+            return
+        text_hash = self.text_hashes.pop(id)
+        self.hashes[text_hash].discard(id)
+        if not self.hashes[text_hash]:
+            del self.hashes[text_hash]
+        for band in _get_bands(signature):
+            ids = self.bands.get(band)
+            if ids is not None:
+                ids.discard(id)
+                if not ids:
+                    del self.bands[band]
+
+    def find(self, text: str, threshold: float = DEFAULT_THRESHOLD) -> tuple[str, float] | None:
+        """(id, similarity) of the most similar document at or above threshold, 1.0 for the same text."""
+        words = normalize(text)
+        with self.lock:
+            same = self.hashes.get(get_text_hash(words))
+            if same:
+                return next(iter(same)), 1.0
+            if threshold >= 1:
+                return None
+            signature = get_signature(words)
+            candidates = set()
+            for band in _get_bands(signature):
+                candidates |= self.bands.get(band, set())
+            best = None
+            for id in candidates:
+                score = similarity(signature, self.signatures[id])
+                if score >= threshold and (best is None or score > best[1]):
+                    best = (id, score)
+            return best
+
+
+def _get_bands(signature: np.ndarray) -> list[tuple[int, bytes]]:
+    rows = NUM_PERM // BANDS
+    return [(band, signature[band * rows : (band + 1) * rows].tobytes()) for band in range(BANDS)]
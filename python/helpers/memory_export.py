@@ -0,0 +1,153 @@
+import json
+import zipfile
+from datetime import datetime
+from typing import Any, Iterator
+
+import numpy as np
+
+from langchain_core.documents import Document
+
+FORMAT = "a0-memory-export"
+VERSION = 1
+MANIFEST = "manifest.json"
+EXPORT_CHUNK = 10_000  # documents per chunk, export and import hold one chunk at a time
+
+
+class ExportWriter:
+    """Writes memories chunk by chunk to an npz archive, readable by numpy.load too.
+
+    Each chunk stores ids, areas, timestamps and vectors as columns, member
+    "<column>_<chunk>.npy", texts with their metadata as a json blob with offsets.
+    The manifest is written last, with the embedding model the vectors belong to.
+    """
+
+    def __init__(self, path: str, model: dict[str, str], filters: dict[str, Any] | None = None):
+        self.zip = zipfile.ZipFile(path, "w", allowZip64=True)
+        self.model = model
+        self.filters = filters or {}
+        self.chunks = 0
+        self.documents = 0
+        self.dim: int | None = None
+        self.areas: set[str] = set()
+
+    def write(self, ids: list[str], docs: list[Document], vectors: np.ndarray):
+        if not ids:
+            return
+        blobs = [
+            json.dumps(
+                {"text": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False, default=str
+            ).encode("utf-8")
+            for doc in docs
+        ]
+        offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+        np.cumsum([len(blob) for blob in blobs], out=offsets[1:])
+        areas = [str(doc.metadata.get("area", "")) for doc in docs]
+        columns = {
+            "ids": encode(ids),
+            "areas": encode(areas),
+            "timestamps": encode([str(doc.metadata.get("timestamp", "")) for doc in docs]),
+            "vectors": np.asarray(vectors, dtype=np.float32),
+            "docs": np.frombuffer(b"".join(blobs), dtype=np.uint8),
+            "doc_offsets": offsets,
+        }
+        for column, array in columns.items():
+            # vectors do not compress, the rest does
+            compress = zipfile.ZIP_STORED if column == "vectors" else zipfile.ZIP_DEFLATED
+            info = zipfile.ZipInfo(f"{column}_{self.chunks:06d}.npy")
+            info.compress_type = compress
+            with self.zip.open(info, "w", force_zip64=True) as f:
+                np.lib.format.write_array(f, array, allow_pickle=False)
+        self.chunks += 1
+        self.documents += len(ids)
+        self.dim = int(columns["vectors"].shape[1])
+        self.areas.update(areas)
+
+    def close(self) -> dict[str, Any]:
+        manifest = {
+            "format": FORMAT,
+            "version": VERSION,
+            **self.model,
+            "dim": self.dim,
+            "chunks": self.chunks,
+            "documents": self.documents,
+            "areas": sorted(self.areas),
+            "filters": self.filters,
+            "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        self.zip.writestr(MANIFEST, json.dumps(manifest))
+        self.zip.close()
+        return manifest
+
+
+def read_manifest(path: str) -> dict[str, Any]:
+    with zipfile.ZipFile(path) as archive:
+        manifest = json.loads(archive.read(MANIFEST))
+    if manifest.get("format") != FORMAT:
+        raise ValueError("Not a memory export")
+    if manifest.get("version", 0) > VERSION:
+        raise ValueError(f"Memory export version {manifest['version']} is not supported")
+    return manifest
+
+
+def read_chunks(
+    path: str,
+    areas: set[str] | None = None,
+    since: str = "",
+    until: str = "",
+) -> Iterator[tuple[list[str], list[Document], np.ndarray]]:
+    """(ids, documents, vectors) of an export, one chunk at a time.
+
+    Documents outside the areas or the timestamp range are dropped by their columns,
+    they are not decoded and chunks without any selected one are not read further.
+    """
+    manifest = read_manifest(path)
+    with zipfile.ZipFile(path) as archive:
+
+        def read(column: str, chunk: int) -> np.ndarray:
+            with archive.open(f"{column}_{chunk:06d}.npy") as f:
+                return np.lib.format.read_array(f, allow_pickle=False)
+
+        for chunk in range(manifest["chunks"]):
+            mask = get_mask(read("timestamps", chunk), since, until, read("areas", chunk), areas)
+            rows = np.flatnonzero(mask)
+            if not len(rows):
+                continue
+            ids = read("ids", chunk)
+            data, offsets = read("docs", chunk), read("doc_offsets", chunk)
+            selected_ids = []
+            docs = []
+            for row in rows:
+                id = bytes(ids[row]).decode("utf-8")
+                record = json.loads(data[offsets[row] : offsets[row + 1]].tobytes())
+                selected_ids.append(id)
+                docs.append(Document(id=id, page_content=record["text"], metadata=record["metadata"]))
+            yield selected_ids, docs, read("vectors", chunk)[rows]
+
+
+def get_mask(
+    timestamps: np.ndarray,
+    since: str = "",
+    until: str = "",
+    areas: np.ndarray | None = None,
+    selected: set[str] | None = None,
+) -> np.ndarray:
+    """Rows with timestamps from since to until, inclusive, and of the selected areas.
+
+    Timestamps are "%Y-%m-%d %H:%M:%S", their order is the order of the strings,
+    a shorter until like a date includes all timestamps starting with it.
+    """
+    mask = np.ones(len(timestamps), dtype=bool)
+    if since:
+        mask &= timestamps >= since.encode("utf-8")
+    if until:
+        mask &= timestamps <= until.encode("utf-8") + b"\xff"
+    if areas is not None and selected is not None:
+        mask &= np.isin(areas, encode(sorted(selected)))
+    return mask
+
+
+def encode(values: list[str]) -> np.ndarray:
+    """Column of utf-8 strings."""
+    if not values:
+        return np.zeros(0, "S1")
+    return np.array([value.encode("utf-8") for value in values], dtype=bytes)
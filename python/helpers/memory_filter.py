@@ -0,0 +1,299 @@
+import ast
+import bisect
+import threading
+from typing import Any, Callable, Iterable
+
+from simpleeval import simple_eval
+
+from python.helpers.print_style import PrintStyle
+
+INDEXED_FIELDS = ("area", "knowledge_source")  # metadata fields indexed by exact value
+TIMESTAMP_FIELD = "timestamp"  # indexed by day, "%Y-%m-%d %H:%M:%S" strings
+TIMESTAMP_BUCKET = 10  # prefix length of a bucket, "YYYY-MM-DD"
+SCAN_MAX = 50_000  # documents a non-indexed compiled filter is evaluated on before a search
+
+# expressions built from these nodes are compiled to bytecode, anything else
+# (multiplication, powers, attributes, ...) is left to simpleeval with its safety limits
+_COMPILED_NODES = (
+    ast.Expression,
+    ast.BoolOp,
+    ast.And,
+    ast.Or,
+    ast.UnaryOp,
+    ast.Not,
+    ast.USub,
+    ast.BinOp,
+    ast.Add,
+    ast.Sub,
+    ast.Div,
+    ast.FloorDiv,
+    ast.Mod,
+    ast.Subscript,
+    ast.Slice,
+    ast.Compare,
+    ast.Eq,
+    ast.NotEq,
+    ast.Lt,
+    ast.LtE,
+    ast.Gt,
+    ast.GtE,
+    ast.In,
+    ast.NotIn,
+    ast.Is,
+    ast.IsNot,
+    ast.IfExp,
+    ast.Name,
+    ast.Load,
+    ast.Constant,
+    ast.List,
+    ast.Tuple,
+    ast.Set,
+)
+_FUNCTIONS = {"int": int, "float": float, "str": str}
+_GLOBALS = {"__builtins__": {}, **_FUNCTIONS}
+
+
+class MemoryFilter:
+    """Metadata filter expression parsed once and evaluated as a Python predicate.
+
+    Accepts the same expressions as simpleeval, e.g. "area == 'main' and knowledge_source".
+    Equality and membership tests on indexed fields also select candidate ids
+    from a MetadataIndex, so a search only needs to score those.
+    """
+
+    def __init__(self, condition: str, report_errors: bool = True):
+        self.condition = condition
+        self.report_errors = report_errors
+        self._reported = False
+        self._code = None
+        self.tree: ast.Expression | None = None
+        try:
+            tree = ast.parse(condition.strip(), mode="eval")
+            if all(_is_compiled_node(node) for node in ast.walk(tree)):
+                self._code = compile(tree, "<filter>", "eval")
+            self.tree = tree
+        except SyntaxError:
+            pass  # simpleeval reports it on evaluation
+
+    def __call__(self, metadata: dict[str, Any]) -> bool:
+        try:
+            if self._code is not None:
+                return bool(eval(self._code, _GLOBALS, metadata))
+            return bool(simple_eval(self.condition, names=metadata))
+        except Exception as e:
+            if self.report_errors and not self._reported:
+                # missing fields are common, report once per filter instead of per document
+                self._reported = True
+                PrintStyle.error(f"Error evaluating condition: {e}")
+            return False
+
+    @property
+    def compiled(self) -> bool:
+        return self._code is not None
+
+    def get_values(self, field: str) -> set[Any] | None:
+        """Values a field is restricted to by the filter, None when it may have any value."""
+        if self.tree is None:
+            return None
+        return _get_values(self.tree.body, field)
+
+    def candidates(self, index: "MetadataIndex") -> set[str] | None:
+        """Ids that may match the filter, None when the index cannot narrow it down."""
+        if self.tree is None:
+            return None
+        with index.lock:
+            return _get_candidates(self.tree.body, index)
+
+
+def compile_filter(condition: str, report_errors: bool = True) -> MemoryFilter:
+    return MemoryFilter(condition, report_errors=report_errors)
+
+
+class MetadataIndex:
+    """Inverted index of document ids by value of common metadata fields,
+    with all ids ordered by timestamp for paging."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values: dict[str, dict[Any, set[str]]] = {
+            field: {} for field in (*INDEXED_FIELDS, TIMESTAMP_FIELD)
+        }
+        self.ordered: list[tuple[str, str]] = []  # (timestamp, id), oldest first
+
+    @staticmethod
+    def build(docs: Iterable[tuple[str, Any]]) -> "MetadataIndex":
+        index = MetadataIndex()
+        for id, doc in docs:
+            for field, key in index._get_keys(doc.metadata):
+                index.values[field].setdefault(key, set()).add(id)
+            index.ordered.append((get_sort_timestamp(doc.metadata), id))
+        index.ordered.sort()  # once, inserting one by one is quadratic
+        return index
+
+    def add(self, id: str, metadata: dict[str, Any]):
+        with self.lock:
+            for field, key in self._get_keys(metadata):
+                self.values[field].setdefault(key, set()).add(id)
+            entry = (get_sort_timestamp(metadata), id)
+            pos = bisect.bisect_left(self.ordered, entry)
+            if pos == len(self.ordered) or self.ordered[pos] != entry:
+                self.ordered.insert(pos, entry)
+
+    def remove(self, id: str, metadata: dict[str, Any]):
+        with self.lock:
+            for field, key in self._get_keys(metadata):
+                ids = self.values[field].get(key)
+                if ids is not None:
+                    ids.discard(id)
+                    if not ids:
+                        del self.values[field][key]
+            entry = (get_sort_timestamp(metadata), id)
+            pos = bisect.bisect_left(self.ordered, entry)
+            if pos < len(self.ordered) and self.ordered[pos] == entry:
+                del self.ordered[pos]
+            else:
+                # timestamp changed in place since the document was added
+                self.ordered = [item for item in self.ordered if item[1] != id]
+
+    def newest(
+        self,
+        limit: int,
+        before: tuple[str, str] | None = None,
+        accept: Callable[[str], bool] | None = None,
+    ) -> list[tuple[str, str]]:
+        """Up to limit (timestamp, id) entries older than before, newest first."""
+        result = []
+        with self.lock:
+            end = bisect.bisect_left(self.ordered, before) if before else len(self.ordered)
+            for pos in range(end - 1, -1, -1):
+                if len(result) >= limit:
+                    break
+                entry = self.ordered[pos]
+                if accept is None or accept(entry[1]):
+                    result.append(entry)
+        return result
+
+    def count(self, field: str, value: Any) -> int:
+        with self.lock:
+            return len(self.get(field, value))
+
+    def get(self, field: str, value: Any) -> set[str]:
+        if field == TIMESTAMP_FIELD:
+            return set()
+        try:
+            return self.values[field].get(value, set())
+        except TypeError:  # unhashable
+            return set()
+
+    def _get_keys(self, metadata: dict[str, Any]):
+        for field in INDEXED_FIELDS:
+            if field in metadata:
+                try:
+                    hash(metadata[field])
+                except TypeError:
+                    continue
+                yield field, metadata[field]
+        timestamp = metadata.get(TIMESTAMP_FIELD)
+        if isinstance(timestamp, str):
+            yield TIMESTAMP_FIELD, timestamp[:TIMESTAMP_BUCKET]
+
+
+def get_sort_timestamp(metadata: dict[str, Any]) -> str:
+    timestamp = metadata.get(TIMESTAMP_FIELD)
+    return timestamp if isinstance(timestamp, str) else ""  # no timestamp sorts as oldest
+
+
+def _is_compiled_node(node: ast.AST) -> bool:
+    if isinstance(node, ast.Call):
+        return (
+            isinstance(node.func, ast.Name)
+            and node.func.id in _FUNCTIONS
+            and not node.keywords
+        )
+    return isinstance(node, _COMPILED_NODES)
+
+
+def _get_candidates(node: ast.AST, index: MetadataIndex) -> set[str] | None:
+    if isinstance(node, ast.BoolOp):
+        parts = [_get_candidates(value, index) for value in node.values]
+        if isinstance(node.op, ast.And):
+            known = [part for part in parts if part is not None]
+            if not known:
+                return None
+            return set.intersection(*sorted(known, key=len))
+        if any(part is None for part in parts):
+            return None
+        return set().union(*parts)  # type: ignore
+
+    compare = _split_compare(node)
+    if compare is None:
+        return None
+    field, op, right = compare
+
+    if field == TIMESTAMP_FIELD:
+        return _get_timestamp_candidates(op, right, index)
+    if field not in INDEXED_FIELDS:
+        return None
+    if isinstance(op, ast.Eq) and isinstance(right, ast.Constant):
+        return set(index.get(field, right.value))
+    if isinstance(op, ast.In) and isinstance(right, (ast.List, ast.Tuple, ast.Set)):
+        if all(isinstance(item, ast.Constant) for item in right.elts):
+            return set().union(*(index.get(field, item.value) for item in right.elts))  # type: ignore
+    return None
+
+
+def _get_values(node: ast.AST, field: str) -> set[Any] | None:
+    if isinstance(node, ast.BoolOp):
+        parts = [_get_values(value, field) for value in node.values]
+        if isinstance(node.op, ast.And):
+            known = [part for part in parts if part is not None]
+            return set.intersection(*known) if known else None
+        if any(part is None for part in parts):
+            return None
+        return set().union(*parts)  # type: ignore
+
+    compare = _split_compare(node)
+    if compare is None or compare[0] != field:
+        return None
+    _field, op, right = compare
+    if isinstance(op, ast.Eq) and isinstance(right, ast.Constant):
+        return {right.value}
+    if isinstance(op, ast.In) and isinstance(right, (ast.List, ast.Tuple, ast.Set)):
+        if all(isinstance(item, ast.Constant) for item in right.elts):
+            return {item.value for item in right.elts}  # type: ignore
+    return None
+
+
+def _split_compare(node: ast.AST) -> tuple[str, ast.cmpop, ast.AST] | None:
+    # single comparison of a metadata field, as (field, operator, other side)
+    if not isinstance(node, ast.Compare) or len(node.ops) != 1:
+        return None
+    left, op, right = node.left, node.ops[0], node.comparators[0]
+    if isinstance(right, ast.Name) and isinstance(left, ast.Constant):
+        # 'main' == area, flip to area == 'main'
+        flipped = {ast.Lt: ast.Gt, ast.LtE: ast.GtE, ast.Gt: ast.Lt, ast.GtE: ast.LtE}
+        if isinstance(op, (ast.Eq, *flipped)):
+            left, right = right, left
+            op = flipped.get(type(op), type(op))()
+    if not isinstance(left, ast.Name):
+        return None
+    return left.id, op, right
+
+
+def _get_timestamp_candidates(op: ast.cmpop, right: ast.AST, index: MetadataIndex) -> set[str] | None:
+    # a timestamp compares like its day prefix, so whole buckets can be selected
+    if not isinstance(right, ast.Constant) or not isinstance(right.value, str):
+        return None
+    day = right.value[:TIMESTAMP_BUCKET]
+    tests: dict[type, Callable[[str], bool]] = {
+        ast.Eq: lambda bucket: bucket == day,
+        ast.Gt: lambda bucket: bucket >= day,
+        ast.GtE: lambda bucket: bucket >= day,
+        ast.Lt: lambda bucket: bucket <= day,
+        ast.LtE: lambda bucket: bucket <= day,
+    }
+    test = tests.get(type(op))
+    if test is None:
+        return None
+    buckets = index.values[TIMESTAMP_FIELD]
+    return set().union(*(ids for bucket, ids in buckets.items() if test(bucket)))
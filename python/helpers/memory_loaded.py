@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from python.helpers import recall_cache
+from python.helpers.memory_store import PartitionedFaiss
+from python.helpers.print_style import PrintStyle
+
+MAX_LOADED_SUBDIRS = 16  # memory subdirs kept loaded, the least recently used are unloaded
+MAX_LOADED_BYTES = 4 * 2**30  # estimated size of all loaded memory subdirs, 0 for no limit
+UNLOAD_MIN_IDLE = 60  # seconds a memory subdir stays loaded after its last use, even over the limits
+
+
+class LoadedMemories:
+    """Loaded memory dbs by memory subdir, the least recently used are unloaded over the limits.
+
+    Unloading checkpoints and closes a db in a thread, the next get of its memory subdir loads
+    it again once that is done. Subdirs used within min_idle seconds or by a live Memory
+    wrapper stay loaded.
+    """
+
+    def __init__(self):
+        self.dbs: OrderedDict[str, PartitionedFaiss] = OrderedDict()
+        self.used: dict[str, float] = {}
+        self.max_subdirs = MAX_LOADED_SUBDIRS
+        self.max_bytes = MAX_LOADED_BYTES
+        self.min_idle: float = UNLOAD_MIN_IDLE
+        self.unloads = 0
+        self.closing: dict[str, threading.Thread] = {}  # unloaded dbs being checkpointed
+        self.lock = threading.RLock()
+
+    def get(self, memory_subdir: str, default: Any = None) -> Any:
+        """Db of a loaded memory subdir, marked as the most recently used."""
+        with self.lock:
+            db = self.dbs.get(memory_subdir)
+            if db is None:
+                return default
+            self.dbs.move_to_end(memory_subdir)
+            self.used[memory_subdir] = time.time()
+            return db
+
+    def peek(self, memory_subdir: str) -> "PartitionedFaiss | None":
+        """Same as get, but does not count as a use."""
+        return self.dbs.get(memory_subdir)
+
+    def __getitem__(self, memory_subdir: str) -> PartitionedFaiss:
+        db = self.get(memory_subdir)
+        if db is None:
+            raise KeyError(memory_subdir)
+        return db
+
+    def __setitem__(self, memory_subdir: str, db: PartitionedFaiss):
+        with self.lock:
+            self.dbs[memory_subdir] = db
+            self.dbs.move_to_end(memory_subdir)
+            self.used[memory_subdir] = time.time()
+        self.evict()
+
+    def __delitem__(self, memory_subdir: str):
+        if not self.unload(memory_subdir):
+            raise KeyError(memory_subdir)
+
+    def __contains__(self, memory_subdir: str) -> bool:
+        return memory_subdir in self.dbs
+
+    def __len__(self) -> int:
+        return len(self.dbs)
+
+    def configure(self, max_subdirs: int, max_bytes: int, min_idle: float):
+        """Limits of the loaded memory subdirs, applied by the next evict."""
+        with self.lock:
+            self.max_subdirs = max(1, int(max_subdirs))
+            self.max_bytes = max(0, int(max_bytes))
+            self.min_idle = max(0.0, float(min_idle))
+
+    def unload(self, memory_subdir: str) -> bool:
+        with self.lock:
+            db = self.dbs.pop(memory_subdir, None)
+            self.used.pop(memory_subdir, None)
+            if db is None:
+                return False
+            # unloads are triggered from the event loop, the checkpoint is written in a thread
+            self.closing = {subdir: thread for subdir, thread in self.closing.items() if thread.is_alive()}
+            thread = threading.Thread(target=db.close, name="memory-unload", daemon=True)
+            self.closing[memory_subdir] = thread
+            thread.start()
+        recall_cache.RecallCache._caches.pop(memory_subdir, None)
+        return True
+
+    def wait_closed(self, memory_subdir: str):
+        """Wait until an unloaded db of the memory subdir has released its files."""
+        with self.lock:
+            thread = self.closing.pop(memory_subdir, None)
+        if thread is not None:
+            thread.join()
+
+    def clear(self):
+        for memory_subdir in list(self.dbs):
+            self.unload(memory_subdir)
+        for memory_subdir in list(self.closing):
+            self.wait_closed(memory_subdir)
+
+    def evict(self) -> list[str]:
+        """Unload the least recently used memory subdirs over the limits, returns them."""
+        unloaded = []
+        with self.lock:
+            now = time.time()
+            sizes = {subdir: db.get_size() for subdir, db in self.dbs.items()}
+            count, total = len(sizes), sum(sizes.values())
+            for subdir in list(self.dbs):  # least recently used first
+                over_count = count > self.max_subdirs
+                over_bytes = self.max_bytes and total > self.max_bytes
+                if not over_count and not over_bytes:
+                    break
+                if now - self.used.get(subdir, 0) < self.min_idle or self.dbs[subdir].holders:
+                    continue
+                unloaded.append(subdir)
+                count -= 1
+                total -= sizes[subdir]
+        for subdir in unloaded:
+            PrintStyle.standard(f"Unloading memory '{subdir}', {sizes[subdir] / 2**20:.0f} MB")
+            self.unload(subdir)
+        self.unloads += len(unloaded)
+        return unloaded
+
+    def get_stats(self) -> list[dict[str, Any]]:
+        """Loaded memory subdirs, most recently used first, with their estimated sizes."""
+        now = time.time()
+        with self.lock:
+            items = list(reversed(self.dbs.items()))
+        return [
+            {
+                "memory_subdir": subdir,
+                "bytes": db.get_size(),
+                "documents": sum(len(part.docstore._dict) for part in list(db.partitions.values())),  # type: ignore
+                "areas": len(db.partitions),
+                "idle_seconds": round(now - self.used.get(subdir, now)),
+                "read_only": db.read_only,
+            }
+            for subdir, db in items
+        ]
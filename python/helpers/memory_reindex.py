@@ -0,0 +1,263 @@
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Sequence
+
+from langchain_core.embeddings import Embeddings
+
+from python.helpers import files
+from python.helpers import memory_share
+from python.helpers import memory_store
+from python.helpers.memory_loaded import UNLOAD_MIN_IDLE, LoadedMemories
+from python.helpers.memory_store import AREAS_FOLDER, PartitionedFaiss
+from python.helpers.memory_wal import MemoryWal
+from python.helpers.print_style import PrintStyle
+
+REINDEX_FILE = "reindex.json"  # target model and areas folder of a running reindex
+REINDEX_BATCH = 64  # documents re-embedded at once by a reindex
+REINDEX_GRACE = UNLOAD_MIN_IDLE  # seconds late changes to replaced stores are carried over
+
+
+class MemoryReindex:
+    """Re-embeds the documents of a memory subdir for a new embedding model in the background.
+
+    The new stores are built in their own areas folder, the live ones keep serving searches
+    and changes with the previous model meanwhile. Documents changed in the live stores are
+    embedded again, once the new stores have caught up they replace the live ones.
+    The new stores log their changes like live ones, an interrupted reindex continues
+    where it stopped the next time the memory subdir is loaded.
+    """
+
+    jobs: dict[str, "MemoryReindex"] = {}  # by db dir
+    jobs_lock = threading.Lock()
+
+    def __init__(
+        self,
+        db: PartitionedFaiss,
+        memory_subdir: str,
+        target: PartitionedFaiss,
+        model: dict[str, str],
+        loaded: LoadedMemories,
+        on_swap: Callable[[PartitionedFaiss, str], None],
+    ):
+        self.db = db
+        self.memory_subdir = memory_subdir
+        self.target = target
+        self.model = model
+        self.loaded = loaded  # the new stores replace the db here
+        self.on_swap = on_swap  # starts the background work of the new stores
+        self.pending: set[str] = set()  # ids to embed again or remove from the new stores
+        self.total = 0
+        self.done = 0
+        self.state = "pending"  # running, swapped, done, stopped or failed
+        self.error = ""
+        self.started = time.time()
+        self.swapped: float | None = None
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @staticmethod
+    def prepare(
+        db: PartitionedFaiss,
+        memory_subdir: str,
+        model: dict[str, str],
+        embedder: Embeddings,
+        loaded: LoadedMemories,
+        on_swap: Callable[[PartitionedFaiss, str], None],
+    ) -> "MemoryReindex":
+        """Reindex job of a db being loaded, started once the db is in loaded."""
+        path = os.path.join(db.db_dir, REINDEX_FILE)
+        state = json.loads(files.read_file(path)) if os.path.exists(path) else {}
+        if not all(state.get(key) == value for key, value in model.items()):
+            areas = f"{AREAS_FOLDER}-{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+            state = {**model, "areas": areas}
+            files.write_file(path, json.dumps(state))
+        # new stores of a reindex to another model are not needed anymore
+        MemoryReindex._remove_folders(db.db_dir, keep={db.areas_folder, state["areas"]})
+        target = PartitionedFaiss(
+            db.db_dir, embedder, shared=db.shared, areas_folder=state["areas"]
+        )
+        job = MemoryReindex(db, memory_subdir, target, model, loaded, on_swap)
+        db.reindex = job  # changes from now on are marked, earlier ones are found by comparing
+        with MemoryReindex.jobs_lock:
+            MemoryReindex.jobs[db.db_dir] = job
+        return job
+
+    @staticmethod
+    def discard(db: PartitionedFaiss):
+        """Remove the files of a reindex the db does not need."""
+        MemoryReindex._remove_folders(db.db_dir, keep={db.areas_folder})
+        path = os.path.join(db.db_dir, REINDEX_FILE)
+        if os.path.exists(path):
+            os.remove(path)
+
+    @staticmethod
+    def stop(db_dir: str):
+        """Stop the reindex of a memory subdir and wait for it, its progress is kept."""
+        with MemoryReindex.jobs_lock:
+            job = MemoryReindex.jobs.pop(db_dir, None)
+        if job is not None:
+            job._stop.set()
+            if job._thread is not None:
+                job._thread.join()
+
+    @staticmethod
+    def get_stats() -> list[dict[str, Any]]:
+        with MemoryReindex.jobs_lock:
+            jobs = list(MemoryReindex.jobs.values())
+        return [job.get_progress() for job in jobs]
+
+    def start(self):
+        if self._thread is None:
+            self.state = "running"
+            self._thread = threading.Thread(target=self._run, name="memory-reindex", daemon=True)
+            self._thread.start()
+
+    def mark(self, ids: Sequence[str]):
+        with self.lock:
+            new = set(ids).difference(self.pending)
+            self.pending |= new
+            self.total += len(new)
+
+    def get_progress(self) -> dict[str, Any]:
+        return {
+            "memory_subdir": self.memory_subdir,
+            "model": f"{self.model['model_provider']}/{self.model['model_name']}",
+            "state": self.state,
+            "done": self.done,
+            "total": max(self.total, self.done),
+            "pending": len(self.pending),
+            "error": self.error,
+            "elapsed_seconds": round(time.time() - self.started),
+        }
+
+    def _run(self):
+        try:
+            self.target.load()  # progress of an interrupted reindex
+            live = self.db.get_all_docs()
+            built = self.target.get_all_docs()
+            stale = [
+                id
+                for id, doc in list(live.items())
+                if id not in built
+                or built[id].page_content != doc.page_content
+                or built[id].metadata != doc.metadata
+            ]
+            self.mark(stale + [id for id in built if id not in live])
+            with self.lock:
+                self.total = len(live) + len(set(built).difference(live))
+                self.done = self.total - len(self.pending)
+
+            while not self._stop.is_set():
+                batch = self._take(REINDEX_BATCH)
+                if batch:
+                    self._sync(batch)
+                elif self.swapped is None:
+                    if self.loaded.peek(self.memory_subdir) is not self.db:
+                        break  # unloaded, continued when it is loaded again
+                    self._swap()
+                elif time.time() - self.swapped > REINDEX_GRACE and not self.db.holders:
+                    break  # nobody writes to the old stores anymore
+                else:
+                    self._stop.wait(memory_share.POLL_INTERVAL)
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            PrintStyle.error(f"Re-indexing memory '{self.memory_subdir}' failed: {e}")
+        finally:
+            self._finish()
+
+    def _take(self, count: int) -> list[str]:
+        with self.lock:
+            return [self.pending.pop() for _ in range(min(count, len(self.pending)))]
+
+    def _sync(self, ids: list[str]):
+        # documents as they are in the live stores now, deleted ones are removed
+        docs = {id: doc for id in ids for doc in self.db.get_by_ids([id])}
+        changed: set[str] = set()
+        for area, area_ids in self.target.group_ids(ids).items():
+            part = self.target.partitions[area]
+            part.delete(ids=area_ids)
+            memory_store.log_delete(part, area_ids)
+            changed.add(area)
+        if docs:
+            vectors = dict(
+                zip(
+                    docs,
+                    self.target.embedding_function.embed_documents(
+                        [doc.page_content for doc in docs.values()]
+                    ),
+                )
+            )
+            for area, area_docs in memory_store.group_by_area(docs).items():
+                part = self.target.get_partition(area)
+                area_ids = list(area_docs)
+                part.add_embeddings(
+                    [(area_docs[id].page_content, vectors[id]) for id in area_ids],
+                    metadatas=[dict(area_docs[id].metadata) for id in area_ids],
+                    ids=area_ids,
+                )
+                memory_store.log_add(part, area_ids, list(area_docs.values()), [vectors[id] for id in area_ids])
+                changed.add(area)
+        self.target.version = memory_store.next_version()
+        for area in changed:
+            part = self.target.partitions.get(area)
+            wal: MemoryWal | None = getattr(part, "wal", None)
+            if wal:
+                wal.maybe_checkpoint(part)  # progress is kept by the checkpoints and the log
+        with self.lock:
+            self.done += len(ids)
+
+    def _swap(self):
+        # the new stores go live, later changes to the old ones are carried over until retired
+        with self.lock:
+            if self.pending:
+                return
+            memory_store.save_embedding_set(
+                self.db.db_dir, {**self.model, "areas": self.target.areas_folder}
+            )
+            os.remove(os.path.join(self.db.db_dir, REINDEX_FILE))
+            self.swapped = time.time()
+            self.state = "swapped"
+        with self.loaded.lock:
+            if self.loaded.peek(self.memory_subdir) is self.db:
+                self.loaded[self.memory_subdir] = self.target
+        if self.target.shared:
+            memory_share.notify(self.db.db_dir)
+        self.on_swap(self.target, self.memory_subdir)
+        PrintStyle.standard(f"Memory '{self.memory_subdir}' re-indexed with {self.get_progress()['model']}")
+
+    def _finish(self):
+        if self.swapped is None:
+            self.db.reindex = None
+            self.target.close(release_writer=False)  # continued from here next time
+            if self.state != "failed":
+                self.state = "stopped"
+        else:
+            # changes made before the old stores were retired are the last ones carried over
+            with self.lock:
+                self.db.reindex = None
+            while batch := self._take(REINDEX_BATCH):
+                self._sync(batch)
+            for part in self.db.partitions.values():
+                wal: MemoryWal | None = getattr(part, "wal", None)
+                if wal:
+                    with MemoryWal.get_lock(part.folder):
+                        wal.close()
+            shutil.rmtree(os.path.join(self.db.db_dir, self.db.areas_folder), ignore_errors=True)
+            self.state = "done"
+        with MemoryReindex.jobs_lock:
+            if MemoryReindex.jobs.get(self.db.db_dir) is self and self.state != "failed":
+                del MemoryReindex.jobs[self.db.db_dir]
+
+    @staticmethod
+    def _remove_folders(db_dir: str, keep: set[str]):
+        # areas folders of earlier reindexes
+        for name in os.listdir(db_dir):
+            if name == AREAS_FOLDER or name.startswith(AREAS_FOLDER + "-"):
+                if name not in keep and os.path.isdir(os.path.join(db_dir, name)):
+                    shutil.rmtree(os.path.join(db_dir, name), ignore_errors=True)
@@ -0,0 +1,262 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import Any, Iterator, Mapping
+
+import numpy as np
+
+from langchain_core.documents import Document
+
+from python.helpers import dotenv
+
+try:
+    import fcntl
+
+    FCNTL_AVAILABLE = True
+except ImportError:  # no advisory file locks on windows, every process keeps its own memory
+    FCNTL_AVAILABLE = False
+
+SHARED_ENV = "A0_SHARED_MEMORY"  # set to true when several processes use the same memory dirs
+PUBLISH_INTERVAL = 5  # seconds after a change before the writer publishes a new image
+POLL_INTERVAL = 1  # seconds between checks of the writer for forwarded changes
+
+WRITER_LOCK_FILE = "writer.lock"  # held by the writer process of a memory subdir
+IMAGE_LOCK_FILE = "image.lock"  # exclusive while an image is written, shared while it is mapped
+NOTIFY_FILE = "shared.json"  # replaced by the writer after every published change
+INBOX_FOLDER = "inbox"  # changes of reader processes, applied by the writer
+DOCS_FILE = "docs.npy"  # concatenated json of all documents, memory-mapped
+DOCS_IDS_FILE = "docs_ids.npy"  # sorted document ids
+DOCS_OFFSETS_FILE = "docs_offsets.npy"  # start of each document in DOCS_FILE, by id row
+DOCS_LABELS_FILE = "docs_labels.npy"  # sorted index labels
+DOCS_LABEL_ROWS_FILE = "docs_label_rows.npy"  # id row of each sorted label
+
+_writers: dict[str, Any] = {}  # open lock files of the memory subdirs this process writes
+_writers_lock = threading.Lock()
+_notify_lock = threading.Lock()  # checkpoints of several stores may notify at once
+
+
+def is_enabled() -> bool:
+    value = str(dotenv.get_dotenv_value(SHARED_ENV, "")).strip().lower()
+    return FCNTL_AVAILABLE and value in ("1", "true", "yes", "on")
+
+
+def acquire_writer(db_dir: str) -> bool:
+    """Become the single writer of a memory subdir, False while another process is."""
+    with _writers_lock:
+        if db_dir in _writers:
+            return True
+        os.makedirs(db_dir, exist_ok=True)
+        file = open(os.path.join(db_dir, WRITER_LOCK_FILE), "a+")
+        try:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            file.close()
+            return False
+        # released by the os when the process exits, a reader then takes over
+        _writers[db_dir] = file
+        return True
+
+
+def release_writer(db_dir: str):
+    """Stop writing a memory subdir, a reader process may take over."""
+    with _writers_lock:
+        file = _writers.pop(db_dir, None)
+    if file is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+        file.close()
+
+
+@contextlib.contextmanager
+def image_lock(folder: str, exclusive: bool):
+    """Keeps readers from mapping the files of a store while the writer replaces them."""
+    with open(os.path.join(folder, IMAGE_LOCK_FILE), "a+") as file:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+def get_stamp(path: str) -> tuple[int, int] | None:
+    """Changes whenever the file is replaced, None while it does not exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def notify(db_dir: str):
+    """Tell readers of a memory subdir that a new image or store is there."""
+    path = os.path.join(db_dir, NOTIFY_FILE)
+    with _notify_lock:
+        generation = 0
+        with contextlib.suppress(FileNotFoundError, ValueError):
+            with open(path, "r", encoding="utf-8") as f:
+                generation = json.load(f).get("generation", 0)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"generation": generation + 1, "time": time.time()}, f)
+        os.replace(path + ".tmp", path)
+
+
+def get_notify_stamp(db_dir: str) -> tuple[int, int] | None:
+    return get_stamp(os.path.join(db_dir, NOTIFY_FILE))
+
+
+def write_docs(folder: str, docs: dict[str, Document], index_to_docstore_id: dict[int, str]):
+    """Write documents in the memory-mappable layout read by MappedDocs, call with image_lock."""
+    labels = {id: label for label, id in index_to_docstore_id.items()}
+    ids = sorted(docs)
+    blobs = [
+        json.dumps(
+            {"text": docs[id].page_content, "metadata": docs[id].metadata},
+            ensure_ascii=False,
+            default=str,
+        ).encode("utf-8")
+        for id in ids
+    ]
+    offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    np.cumsum([len(blob) for blob in blobs], out=offsets[1:])
+    id_labels = np.array([labels.get(id, -1) for id in ids], dtype=np.int64)
+    order = np.argsort(id_labels, kind="stable")
+    order = order[id_labels[order] != -1]
+    arrays = {
+        DOCS_FILE: np.frombuffer(b"".join(blobs), dtype=np.uint8),
+        DOCS_IDS_FILE: np.array([id.encode("utf-8") for id in ids], dtype=bytes) if ids else np.zeros(0, "S1"),
+        DOCS_OFFSETS_FILE: offsets,
+        DOCS_LABELS_FILE: id_labels[order],
+        DOCS_LABEL_ROWS_FILE: order.astype(np.int64),
+    }
+    for name, array in arrays.items():
+        path = os.path.join(folder, name)
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, array)
+    for name in arrays:
+        path = os.path.join(folder, name)
+        os.replace(path + ".tmp", path)
+
+
+def load_docs(folder: str) -> tuple["MappedDocs", "MappedLabels"] | None:
+    """Documents and label mapping of the last written image, None when there is none."""
+    paths = [
+        os.path.join(folder, name)
+        for name in [DOCS_FILE, DOCS_IDS_FILE, DOCS_OFFSETS_FILE, DOCS_LABELS_FILE, DOCS_LABEL_ROWS_FILE]
+    ]
+    if not all(os.path.exists(path) for path in paths):
+        return None
+    data, ids, offsets, labels, label_rows = [_load_array(path) for path in paths]
+    docs = MappedDocs(data, ids, offsets)
+    return docs, MappedLabels(docs, labels, label_rows)
+
+
+def _load_array(path: str) -> np.ndarray:
+    # numpy can not map an empty file region
+    array = np.load(path, mmap_mode="r")
+    return np.load(path) if array.size == 0 else array
+
+
+class MappedDocs(Mapping[str, Document]):
+    """Read-only documents by id, decoded from a memory-mapped image on access.
+
+    Processes mapping the same image share its pages, only decoded documents
+    take memory of their own.
+    """
+
+    def __init__(self, data: np.ndarray, ids: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.ids = ids
+        self.offsets = offsets
+
+    def get_row(self, id: str) -> int:
+        key = id.encode("utf-8")
+        row = int(np.searchsorted(self.ids, key))
+        if row < len(self.ids) and self.ids[row] == key:
+            return row
+        return -1
+
+    def get_id(self, row: int) -> str:
+        return bytes(self.ids[row]).decode("utf-8")
+
+    def __getitem__(self, id: str) -> Document:
+        if not isinstance(id, str):
+            raise KeyError(id)
+        row = self.get_row(id)
+        if row < 0:
+            raise KeyError(id)
+        record = json.loads(bytes(self.data[self.offsets[row] : self.offsets[row + 1]]))
+        return Document(id=id, page_content=record["text"], metadata=record["metadata"])
+
+    def __contains__(self, id: object) -> bool:
+        return isinstance(id, str) and self.get_row(id) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        for raw in self.ids:
+            yield bytes(raw).decode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class MappedLabels(Mapping[int, str]):
+    """Read-only index label to document id mapping of a memory-mapped image."""
+
+    def __init__(self, docs: MappedDocs, labels: np.ndarray, rows: np.ndarray):
+        self.docs = docs
+        self.labels = labels
+        self.rows = rows
+
+    def __getitem__(self, label: int) -> str:
+        pos = int(np.searchsorted(self.labels, label))
+        if pos >= len(self.labels) or self.labels[pos] != label:
+            raise KeyError(label)
+        return self.docs.get_id(int(self.rows[pos]))
+
+    def __iter__(self) -> Iterator[int]:
+        for label in self.labels:
+            yield int(label)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+
+class Inbox:
+    """Changes of reader processes waiting for the writer, one file per record.
+
+    Records use the write-ahead log format and are applied in the order they were put,
+    a batch record is applied as one transaction.
+    """
+
+    def __init__(self, db_dir: str):
+        self.folder = os.path.join(db_dir, INBOX_FOLDER)
+        self._seq = 0
+
+    def put(self, record: dict[str, Any]):
+        os.makedirs(self.folder, exist_ok=True)
+        self._seq += 1
+        name = f"{time.time_ns():020d}-{os.getpid()}-{self._seq:06d}.json"
+        path = os.path.join(self.folder, name)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, default=str)
+        os.replace(path + ".tmp", path)  # the writer never sees a partial record
+
+    def take(self) -> list[tuple[str, dict[str, Any]]]:
+        """Waiting (path, record) pairs, oldest first, remove each with done once applied."""
+        if not os.path.isdir(self.folder):
+            return []
+        result = []
+        for name in sorted(os.listdir(self.folder)):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.folder, name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    result.append((path, json.load(f)))
+            except (OSError, ValueError):
+                continue  # removed meanwhile or not readable, retried next time
+        return result
+
+    def done(self, path: str):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
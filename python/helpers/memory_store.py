@@ -0,0 +1,794 @@
+import asyncio
+import itertools
+import json
+import operator
+import os
+import pickle
+import shutil
+import threading
+import uuid
+import weakref
+from enum import Enum
+from functools import partial
+from typing import TYPE_CHECKING, Any, List, Sequence
+
+import numpy as np
+
+# faiss needs to be patched for python 3.12 on arm #TODO remove once not needed
+from python.helpers import faiss_monkey_patch
+import faiss
+
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from python.helpers import files
+from python.helpers import memory_wal
+from python.helpers.memory_wal import MemoryWal
+from python.helpers import memory_share
+from python.helpers import vector_index
+from python.helpers import bm25_index
+from python.helpers import memory_dedup
+from python.helpers.bm25_index import Bm25Index
+from python.helpers.memory_filter import SCAN_MAX, MemoryFilter, MetadataIndex
+
+if TYPE_CHECKING:
+    from python.helpers.memory_reindex import MemoryReindex
+
+AREAS_FOLDER = "areas"  # one store per memory area below the memory subdir
+AREA_FILE = "area.json"
+DEFAULT_AREA = "main"  # area of documents without one
+EMBEDDING_FILE = "embedding.json"  # embedding model and areas folder of the live stores
+HYBRID_FETCH = 2  # candidates of each ranking per result of a hybrid search
+HYBRID_LEXICAL_MIN = 0.5  # bm25 score of a lexical match the vector search did not find, 0 to 1
+DOC_OVERHEAD = 1000  # estimated bytes of a loaded document besides its text and metadata
+DOC_SAMPLE = 64  # documents measured to estimate the size of a store
+
+_versions = itertools.count(1)  # shared by all stores, a reloaded store never repeats a version
+
+
+class MyFaiss(FAISS):
+    index_builder: "vector_index.IndexBuilder | None" = None
+    index_type: vector_index.IndexType = vector_index.DEFAULT_INDEX_TYPE
+    quantization: vector_index.Quantization = vector_index.DEFAULT_QUANTIZATION
+    full_vectors: "vector_index.FullVectors | None" = None  # kept for a quantized index
+    next_label: int | None = None
+    metadata_index: MetadataIndex | None = None  # built on first filtered access
+    bm25_index: Bm25Index | None = None  # built on first hybrid search
+    dedup_index: memory_dedup.DedupIndex | None = None  # built on first duplicate check
+    _id_labels: dict[str, int] | None = None  # document id to index label, for filtered search
+    folder: str = ""
+    area: str = ""
+    image_stamp: tuple[int, int] | None = None  # checkpoint a read-only store was mapped at
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # guards index and label mapping against a concurrent swap to a rebuilt index
+        self._index_lock = threading.Lock()
+        # guards documents against a checkpoint taken by the shared writer thread
+        self._write_lock = threading.RLock()
+
+    # override aget_by_ids
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        # return all self.docstore._dict[id] in ids
+        return [self.docstore._dict[id] for id in (ids if isinstance(ids, list) else [ids]) if id in self.docstore._dict]  # type: ignore
+
+    async def aget_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        return self.get_by_ids(ids)
+
+    def get_all_docs(self):
+        return self.docstore._dict  # type: ignore
+
+    def _FAISS__add(
+        self,
+        texts: Any,
+        embeddings: Any,
+        metadatas: Any = None,
+        ids: list[str] | None = None,
+    ) -> list[str]:
+        # replaces FAISS.__add, approximate indexes address vectors by stable labels
+        texts = list(texts)
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        if len(ids) != len(set(ids)):
+            raise ValueError("Duplicate ids found in the ids list.")
+        vectors = np.array(embeddings, dtype=np.float32)
+        if self._normalize_L2:
+            faiss.normalize_L2(vectors)
+        with self._write_lock:
+            if self.full_vectors is not None:
+                self.full_vectors.add(ids, vectors)
+            with self._index_lock:
+                labels = vector_index.add_vectors(self, ids, vectors)
+                if self._id_labels is not None:
+                    self._id_labels.update(zip(ids, labels))
+            self.docstore.add(  # type: ignore
+                {
+                    id: Document(id=id, page_content=text, metadata=metadata)
+                    for id, text, metadata in zip(ids, texts, metadatas)
+                }
+            )
+            if self.metadata_index is not None:
+                for id, metadata in zip(ids, metadatas):
+                    self.metadata_index.add(id, metadata)
+            if self.bm25_index is not None:
+                for id, text in zip(ids, texts):
+                    self.bm25_index.add(id, text)
+            if self.dedup_index is not None:
+                for id, text in zip(ids, texts):
+                    self.dedup_index.add(id, text)
+            if self.index_builder:
+                self.index_builder.added += ids
+        return ids
+
+    def delete(self, ids: list[str] | None = None, **kwargs: Any) -> bool | None:
+        if ids is None:
+            raise ValueError("No ids provided to delete.")
+        with self._write_lock:
+            docs = {id: self.docstore._dict[id] for id in ids if id in self.docstore._dict}  # type: ignore
+            with self._index_lock:
+                removed = vector_index.remove_ids(self, ids)
+                self._id_labels = None
+            missing = set(ids).difference(removed)
+            if missing:
+                raise ValueError(f"Some specified ids do not exist in the current store. Ids not found: {missing}")
+            self.docstore.delete(removed)  # type: ignore
+            if self.metadata_index is not None:
+                for id in removed:
+                    if id in docs:
+                        self.metadata_index.remove(id, docs[id].metadata)
+            if self.bm25_index is not None:
+                for id in removed:
+                    self.bm25_index.remove(id)
+            if self.dedup_index is not None:
+                for id in removed:
+                    self.dedup_index.remove(id)
+            if self.full_vectors is not None:
+                self.full_vectors.remove(removed)
+            if self.index_builder:
+                self.index_builder.removed += removed
+        return True
+
+    def save_local(self, folder_path: str, index_name: str = "index") -> None:
+        if self.full_vectors is not None:
+            self.full_vectors.write(self.full_vectors.snapshot())
+        super().save_local(folder_path, index_name)
+
+    def swap_index(self, state: vector_index.IndexState):
+        with self._index_lock:
+            self.index = state.index
+            self.index_to_docstore_id = state.index_to_docstore_id
+            self.next_label = state.next_label
+            self._id_labels = None
+        full = self.full_vectors
+        quantized = vector_index.get_index_quantization(state.index) != "none"
+        if full is not None and self.quantization == "none" and not quantized:
+            # rebuilt back to full precision, the kept vectors are not needed anymore
+            with self._write_lock:
+                self.full_vectors = None
+            full.drop()
+
+    def get_metadata_index(self) -> MetadataIndex:
+        if self.metadata_index is None:
+            with self._index_lock:
+                if self.metadata_index is None:
+                    self.metadata_index = MetadataIndex.build(list(self.docstore._dict.items()))  # type: ignore
+        return self.metadata_index
+
+    def get_bm25_index(self) -> Bm25Index:
+        if self.bm25_index is None:
+            with self._index_lock:
+                if self.bm25_index is None:
+                    self.bm25_index = Bm25Index.build(list(self.docstore._dict.items()))  # type: ignore
+        return self.bm25_index
+
+    def get_dedup_index(self) -> memory_dedup.DedupIndex:
+        if self.dedup_index is None:
+            with self._index_lock:
+                if self.dedup_index is None:
+                    self.dedup_index = memory_dedup.DedupIndex.build(list(self.docstore._dict.items()))  # type: ignore
+        return self.dedup_index
+
+    def get_docs_by_filter(self, filter: MemoryFilter) -> list[Document]:
+        """Documents matching a filter, only indexed candidates are evaluated when possible."""
+        docs: dict[str, Document] = self.docstore._dict  # type: ignore
+        ids = filter.candidates(self.get_metadata_index())
+        if ids is None:
+            return [doc for doc in list(docs.values()) if filter(doc.metadata)]
+        return [docs[id] for id in ids if id in docs and filter(docs[id].metadata)]
+
+    def get_vectors(self, ids: list[str]) -> tuple[list[str], np.ndarray]:
+        """Vectors of the indexed documents among ids, in full precision, and their ids."""
+        with self._index_lock:
+            # labels change with deletes and index rebuilds
+            id_labels = self._get_id_labels()
+            ids = [id for id in ids if id in id_labels]
+            labels = [id_labels[id] for id in ids]
+            return ids, vector_index.get_store_vectors(self, labels, ids)
+
+    def _get_id_labels(self) -> dict[str, int]:
+        # call with _index_lock
+        if self._id_labels is None:
+            self._id_labels = {id: label for label, id in self.index_to_docstore_id.items()}
+        return self._id_labels
+
+    def _get_filtered_labels(self, filter: MemoryFilter, metadata_index: MetadataIndex) -> np.ndarray | None:
+        # prune by the metadata index and predicate before any vector is scored, call with _index_lock
+        docs: dict[str, Document] = self.docstore._dict  # type: ignore
+        ids = filter.candidates(metadata_index)
+        if ids is None:
+            if not filter.compiled or len(docs) > SCAN_MAX:
+                return None  # filtered after the search
+            ids = list(docs)
+        id_labels = self._get_id_labels()
+        labels = [id_labels[id] for id in ids if id in id_labels and id in docs and filter(docs[id].metadata)]
+        return np.array(labels, dtype=np.int64)
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Any = None,
+        fetch_k: int = 20,
+        **kwargs: Any,
+    ):
+        vector = np.array([embedding], dtype=np.float32)
+        if self._normalize_L2:
+            faiss.normalize_L2(vector)
+        fetch = k if filter is None else fetch_k
+        # a quantized index ranks more candidates for re-ranking in full precision
+        full = self.full_vectors
+        rerank = vector_index.RERANK_FACTOR if full is not None else 1
+        fetch *= rerank
+        metadata_index = self.get_metadata_index() if isinstance(filter, MemoryFilter) else None
+        with self._index_lock:
+            mapping = self.index_to_docstore_id
+            candidates = (
+                self._get_filtered_labels(filter, metadata_index)  # type: ignore
+                if metadata_index is not None
+                else None
+            )
+            if candidates is not None:
+                # every candidate passed the filter already
+                scores, labels = vector_index.search_labels(self.index, vector, k * rerank, candidates)
+                filter = None
+            else:
+                # removed hnsw vectors are still found, fetch more to make up for them
+                tombstones = vector_index.get_tombstones(self)
+                if tombstones:
+                    fetch = int(fetch * self.index.ntotal / max(1, len(mapping))) + 1
+                scores, labels = self.index.search(vector, fetch)
+        if full is not None:
+            scores, labels = vector_index.rerank(full, mapping, vector, scores, labels)
+
+        filter_func = self._create_filter_func(filter) if filter is not None else None
+        docs = []
+        for score, label in zip(scores[0], labels[0]):
+            id = mapping.get(int(label)) if label != -1 else None
+            if id is None:
+                continue
+            doc = self.docstore.search(id)
+            if not isinstance(doc, Document):
+                continue
+            if filter_func and not filter_func(doc.metadata):
+                continue
+            docs.append((doc, score))
+
+        score_threshold = kwargs.get("score_threshold")
+        if score_threshold is not None:
+            cmp = (
+                operator.ge
+                if self.distance_strategy
+                in (DistanceStrategy.MAX_INNER_PRODUCT, DistanceStrategy.JACCARD)
+                else operator.le
+            )
+            docs = [(doc, score) for doc, score in docs if cmp(score, score_threshold)]
+        return docs[:k]
+
+    async def aadd_documents_with_vectors(
+        self, documents: list[Document], ids: list[str]
+    ) -> list[list[float]]:
+        # same as aadd_documents, but the vectors are returned for the write-ahead log
+        texts = [doc.page_content for doc in documents]
+        vectors = await self.embedding_function.aembed_documents(texts)  # type: ignore
+        self.add_embeddings(
+            list(zip(texts, vectors)),
+            metadatas=[doc.metadata for doc in documents],
+            ids=ids,
+        )
+        return vectors
+
+
+class PartitionedFaiss:
+    """FAISS stores of a memory subdir, one per area, each with its own files and log.
+
+    Area scoped searches and changes only touch the stores of their areas,
+    documents are routed by their "area" metadata.
+
+    A shared memory subdir is used by several processes. One of them is the writer,
+    the others map the images it publishes read-only and forward their changes
+    to its inbox, they see them once the writer has published them.
+
+    The area stores are in areas_folder, a reindex builds new ones in another folder.
+    """
+
+    def __init__(
+        self,
+        db_dir: str,
+        embedder: Embeddings,
+        use_wal: bool = True,
+        shared: bool = False,
+        read_only: bool = False,
+        areas_folder: str = AREAS_FOLDER,
+    ):
+        self.db_dir = db_dir
+        self.embedding_function = embedder
+        self.use_wal = use_wal
+        self.shared = shared
+        self.read_only = read_only
+        self.areas_folder = areas_folder
+        self.inbox = memory_share.Inbox(db_dir) if shared else None
+        # commits of changes spanning several areas, the writer replays only committed ones
+        self.transactions = (
+            memory_wal.TransactionLog(os.path.join(db_dir, areas_folder))
+            if use_wal and not read_only
+            else None
+        )
+        self.reindex: "MemoryReindex | None" = None  # re-embeds changed documents while it runs
+        self.partitions: dict[str, MyFaiss] = {}
+        self.holders: weakref.WeakSet = weakref.WeakSet()  # Memory wrappers using the db, it stays open for them
+        self.version = next_version()  # changes with every insert or delete, for caches of results
+        self._dim: int | None = None
+        self._notify_stamp = memory_share.get_notify_stamp(db_dir) if read_only else None
+        self._size: tuple[int, int] | None = None  # (version, bytes) of the last estimate
+
+    def load(self):
+        for area, folder in self._get_folders():
+            if area not in self.partitions:
+                self.partitions[area] = self._load_partition(area, folder)
+        if self.transactions:
+            logged: set[str] = set()
+            for db in self.partitions.values():
+                wal: MemoryWal | None = getattr(db, "wal", None)
+                if wal:
+                    logged |= wal.txns
+            self.transactions.compact(logged)
+
+    def refresh(self) -> bool:
+        """Map the images the writer published since the last refresh, for read-only dbs."""
+        stamp = memory_share.get_notify_stamp(self.db_dir)
+        if not self.read_only or stamp == self._notify_stamp:
+            return False
+        self._notify_stamp = stamp
+        current = {db.folder: db for db in self.partitions.values()}
+        partitions: dict[str, MyFaiss] = {}
+        for area, folder in self._get_folders():
+            db = current.get(folder)
+            if db is None or db.image_stamp != memory_share.get_stamp(
+                os.path.join(folder, memory_wal.CHECKPOINT_FILE)
+            ):
+                db = self._load_partition(area, folder)
+            partitions[area] = db
+        self.partitions = partitions  # replaced at once, running searches keep the old stores
+        self.version = next_version()
+        return True
+
+    def get_size(self) -> int:
+        """Estimated bytes of the loaded vectors and documents, mapped ones included."""
+        if self._size is None or self._size[0] != self.version:
+            size = 0
+            for db in list(self.partitions.values()):
+                docs: dict[str, Document] = db.docstore._dict  # type: ignore
+                size += vector_index.get_index_bytes(db.index)
+                sample = [docs[id] for id in itertools.islice(docs, DOC_SAMPLE)]
+                if sample:
+                    measured = sum(len(doc.page_content) + len(str(doc.metadata)) for doc in sample)
+                    size += len(docs) * (DOC_OVERHEAD + measured // len(sample))
+            self._size = (self.version, size)
+        return self._size[1]
+
+    def close(self, release_writer: bool = True):
+        """Checkpoint logged changes and release the files, the db is not used afterwards.
+
+        The writer of a shared memory subdir gives up the writer lock too, unless release_writer
+        is False for stores that are not the live ones.
+        """
+        for db in self.partitions.values():
+            db.index_builder = None  # a running build is dropped
+            wal: MemoryWal | None = getattr(db, "wal", None)
+            if wal:
+                if wal.ops:
+                    wal.checkpoint(db, background=False)
+                wal.close()
+        if self.transactions:
+            self.transactions.close()
+        if self.shared and not self.read_only and release_writer:
+            memory_share.release_writer(self.db_dir)
+
+    def get_partition(self, area: str) -> MyFaiss:
+        """Store of an area, created empty on first use."""
+        db = self.partitions.get(area)
+        if db is None and self.read_only:
+            raise RuntimeError(f"Memory area '{area}' can only be created by the writer process")
+        if db is None:
+            folder = os.path.join(self.db_dir, self.areas_folder, files.safe_file_name(area))
+            taken = {part.folder for part in self.partitions.values()}
+            base, no = folder, 1
+            while folder in taken:  # areas that differ only in unsafe characters
+                no += 1
+                folder = f"{base}_{no}"
+            os.makedirs(folder, exist_ok=True)
+            files.write_file(os.path.join(folder, AREA_FILE), json.dumps({"area": area}))
+            db = self._load_partition(area, folder)
+            save_store(db)
+            self.partitions[area] = db
+        return db
+
+    def select(self, areas: set[Any] | None = None) -> list[MyFaiss]:
+        if areas is None:
+            return list(self.partitions.values())
+        return [self.partitions[area] for area in sorted(areas) if area in self.partitions]  # type: ignore
+
+    def drop_partition(self, area: str) -> int:
+        """Remove the store of an area with its files, returns the number of documents it held."""
+        if self.read_only:
+            db = self.partitions.get(area)
+            if db is None:
+                return 0
+            self.inbox.put({"op": "drop", "area": area})  # type: ignore
+            return len(db.get_all_docs())
+        db = self.partitions.pop(area, None)
+        if db is None:
+            return 0
+        self.version = next_version()
+        count = len(db.get_all_docs())
+        self.mark_changed(list(db.get_all_docs()))
+        wal: MemoryWal | None = getattr(db, "wal", None)
+        with MemoryWal.get_lock(db.folder):
+            if wal:
+                wal.close()
+            shutil.rmtree(db.folder, ignore_errors=True)
+        if self.shared:
+            memory_share.notify(self.db_dir)
+        return count
+
+    def mark_changed(self, ids: Sequence[str]):
+        """Documents added, updated or deleted, a running reindex embeds them again."""
+        if self.reindex is not None and ids:
+            self.reindex.mark(ids)
+
+    def get_area(self, id: str) -> str | None:
+        for area, db in self.partitions.items():
+            if id in db.docstore._dict:  # type: ignore
+                return area
+        return None
+
+    def group_ids(self, ids: Sequence[str]) -> dict[str, list[str]]:
+        groups: dict[str, list[str]] = {}
+        for id in ids:
+            area = self.get_area(id)
+            if area is not None:
+                groups.setdefault(area, []).append(id)
+        return groups
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        ids = ids if isinstance(ids, list) else [ids]  # type: ignore
+        docs = []
+        for id in ids:
+            for db in self.partitions.values():
+                doc = db.docstore._dict.get(id)  # type: ignore
+                if doc is not None:
+                    docs.append(doc)
+                    break
+        return docs
+
+    async def aget_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        return self.get_by_ids(ids)
+
+    def get_all_docs(self) -> dict[str, Document]:
+        docs: dict[str, Document] = {}
+        for db in self.partitions.values():
+            docs.update(db.get_all_docs())
+        return docs
+
+    def get_docs_by_filter(self, filter: MemoryFilter) -> list[Document]:
+        docs = []
+        for db in self.select(filter.get_values("area")):
+            docs += db.get_docs_by_filter(filter)
+        return docs
+
+    def get_docs_page(
+        self,
+        limit: int,
+        cursor: tuple[str, str] | None = None,
+        offset: int = 0,
+        areas: set[str] | None = None,
+        knowledge: bool | None = None,
+    ) -> tuple[list[Document], tuple[str, str] | None]:
+        """Newest documents first, one page after cursor (or offset) and the cursor of the next page.
+
+        Pages are read from the timestamp order of the metadata indexes,
+        the cost grows with the page size and offset, not with the store size.
+        """
+        entries: list[tuple[str, str, MyFaiss]] = []
+        for db in self.select(areas):
+            docs: dict[str, Document] = db.docstore._dict  # type: ignore
+            index = db.get_metadata_index()
+            accept = None
+            if knowledge is not None:
+                sources = index.get("knowledge_source", True)
+                accept = lambda id, sources=sources: id in docs and (id in sources) == knowledge
+            for timestamp, id in index.newest(offset + limit, cursor, accept):
+                entries.append((timestamp, id, db))
+        entries.sort(key=lambda entry: (entry[0], entry[1]), reverse=True)
+        page = entries[offset : offset + limit]
+        result = [
+            doc
+            for _timestamp, id, db in page
+            if (doc := db.docstore._dict.get(id)) is not None  # type: ignore
+        ]
+        next_cursor = (page[-1][0], page[-1][1]) if len(page) == limit else None
+        return result, next_cursor
+
+    def count_docs(self, areas: set[str] | None = None, knowledge: bool | None = None) -> int:
+        """Number of documents of the areas, knowledge limits it to knowledge or conversation sources."""
+        count = 0
+        for db in self.select(areas):
+            total = len(db.docstore._dict)  # type: ignore
+            if knowledge is None:
+                count += total
+                continue
+            sources = db.get_metadata_index().count("knowledge_source", True)
+            count += sources if knowledge else total - sources
+        return count
+
+    async def asearch(
+        self,
+        query: str,
+        k: int,
+        score_threshold: float,
+        filter: MemoryFilter | None = None,
+        hybrid: bool = False,
+    ) -> list[Document]:
+        """Documents with a relevance score of at least score_threshold, best first.
+
+        A hybrid search also ranks documents by BM25 and fuses both rankings, documents matching
+        much of the query lexically are returned even below the vector score threshold.
+        """
+        fetch = k * HYBRID_FETCH if hybrid else k
+        results = await self.asearch_with_scores(query, fetch, score_threshold, filter)
+        if not hybrid:
+            return [doc for doc, _score in results[:k]]
+
+        partitions = self.select(filter.get_values("area") if filter else None)
+        loop = asyncio.get_running_loop()
+        lexical = await loop.run_in_executor(
+            None, partial(self._search_lexical, partitions, query, fetch, filter)
+        )
+        found = {doc.metadata.get("id", id(doc)) for doc, _score in results}
+        lexical = [
+            (doc, score)
+            for doc, score in lexical
+            if score >= HYBRID_LEXICAL_MIN or doc.metadata.get("id", id(doc)) in found
+        ]
+        docs = {doc.metadata.get("id", id(doc)): doc for doc, _score in results + lexical}
+        fused = bm25_index.fuse(
+            [
+                [doc.metadata.get("id", id(doc)) for doc, _score in results[:fetch]],
+                [doc.metadata.get("id", id(doc)) for doc, _score in lexical],
+            ]
+        )
+        return [docs[key] for key, _score in fused[:k]]
+
+    async def asearch_with_scores(
+        self,
+        query: str,
+        k: int,
+        score_threshold: float,
+        filter: MemoryFilter | None = None,
+    ) -> list[tuple[Document, float]]:
+        """(document, relevance score) pairs of a vector search, best first."""
+        partitions = self.select(filter.get_values("area") if filter else None)
+        if not partitions:
+            return []
+        # embed once, the same vector is searched in every partition
+        embedding = await self.embedding_function.aembed_query(query)
+        loop = asyncio.get_running_loop()
+        results: list[tuple[Document, float]] = []
+        for db in partitions:
+            hits = await loop.run_in_executor(
+                None, partial(db.similarity_search_with_score_by_vector, embedding, k=k, filter=filter)
+            )
+            relevance = db._select_relevance_score_fn()
+            results += [(doc, relevance(score)) for doc, score in hits]
+        results = [result for result in results if result[1] >= score_threshold]
+        results.sort(key=lambda result: result[1], reverse=True)
+        return results[:k]
+
+    def _search_lexical(
+        self, partitions: list[MyFaiss], query: str, k: int, filter: MemoryFilter | None
+    ) -> list[tuple[Document, float]]:
+        results: list[tuple[Document, float]] = []
+        for db in partitions:
+            docs: dict[str, Document] = db.docstore._dict  # type: ignore
+            accept = lambda id: id in docs and (filter is None or filter(docs[id].metadata))
+            results += [(docs[id], score) for id, score in db.get_bm25_index().search(query, k, accept)]
+        results.sort(key=lambda result: result[1], reverse=True)
+        return results[:k]
+
+    def _get_folders(self) -> list[tuple[str, str]]:
+        # (area, folder) of each area store on disk
+        areas_dir = os.path.join(self.db_dir, self.areas_folder)
+        if not os.path.isdir(areas_dir):
+            return []
+        result = []
+        for name in sorted(os.listdir(areas_dir)):
+            folder = os.path.join(areas_dir, name)
+            if os.path.isdir(folder):
+                area = name
+                if files.exists(folder, AREA_FILE):
+                    area = json.loads(files.read_file(os.path.join(folder, AREA_FILE)))["area"]
+                result.append((area, folder))
+        return result
+
+    def _load_partition(self, area: str, folder: str) -> MyFaiss:
+        if self.read_only:
+            return self._map_partition(area, folder)
+        wal = MemoryWal(folder, shared=self.shared) if self.use_wal else None
+        if wal and self.shared:
+            # readers only see published images, so changes are published soon
+            wal.interval = memory_share.PUBLISH_INTERVAL
+            wal.on_checkpoint = partial(memory_share.notify, self.db_dir)
+        with MemoryWal.get_lock(folder):
+            if files.exists(folder, "index.faiss"):
+                db = MyFaiss.load_local(
+                    folder_path=folder,
+                    embeddings=self.embedding_function,
+                    allow_dangerous_deserialization=True,
+                    distance_strategy=DistanceStrategy.COSINE,
+                    # normalize_L2=True,
+                    relevance_score_fn=cosine_normalizer,
+                )  # type: ignore
+            else:
+                db = self._create_store()
+            db.folder = folder
+            db.quantization = vector_index.get_quantization(self.db_dir)
+            vector_index.attach_full_vectors(db, db.quantization)
+            # operations logged after the last checkpoint
+            if wal:
+                wal.replay(db, self.transactions.ids if self.transactions else None)
+        db.wal = wal  # type: ignore
+        db.area = area
+        db.index_type = vector_index.get_index_type(self.db_dir)
+        vector_index.maybe_rebuild(db, db.index_type, db.quantization)
+        return db
+
+    def _map_partition(self, area: str, folder: str) -> MyFaiss:
+        # read-only store of the last published image, vectors and documents stay on disk
+        with memory_share.image_lock(folder, exclusive=False):
+            stamp = memory_share.get_stamp(os.path.join(folder, memory_wal.CHECKPOINT_FILE))
+            index_path = os.path.join(folder, "index.faiss")
+            if not os.path.exists(index_path):
+                db = self._create_store()
+            else:
+                index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+                mapped = memory_share.load_docs(folder)
+                pkl_stamp = memory_share.get_stamp(os.path.join(folder, "index.pkl"))
+                docs_stamp = memory_share.get_stamp(os.path.join(folder, memory_share.DOCS_FILE))
+                if mapped is None or (pkl_stamp and docs_stamp and docs_stamp[1] < pkl_stamp[1]):
+                    # saved by a process that was not shared, documents are loaded in full
+                    with open(os.path.join(folder, "index.pkl"), "rb") as f:
+                        docstore, mapping = pickle.load(f)
+                else:
+                    docstore, mapping = InMemoryDocstore(mapped[0]), mapped[1]  # type: ignore
+                db = MyFaiss(
+                    embedding_function=self.embedding_function,
+                    index=index,
+                    docstore=docstore,
+                    index_to_docstore_id=mapping,  # type: ignore
+                    distance_strategy=DistanceStrategy.COSINE,
+                    relevance_score_fn=cosine_normalizer,
+                )
+            db.folder = folder
+            # full precision vectors of a quantized index are mapped too, never written here
+            vector_index.attach_full_vectors(db, "none")
+        db.image_stamp = stamp
+        db.wal = None  # type: ignore
+        db.area = area
+        db.index_type = vector_index.get_index_type(self.db_dir)
+        db.quantization = vector_index.get_index_quantization(db.index)
+        return db
+
+    def _create_store(self) -> MyFaiss:
+        if self._dim is None:
+            existing = next(iter(self.partitions.values()), None)
+            self._dim = (
+                existing.index.d
+                if existing
+                else len(self.embedding_function.embed_query("example"))
+            )
+        return MyFaiss(
+            embedding_function=self.embedding_function,
+            index=faiss.IndexFlatIP(self._dim),
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={},
+            distance_strategy=DistanceStrategy.COSINE,
+            # normalize_L2=True,
+            relevance_score_fn=cosine_normalizer,
+        )
+
+
+def next_version() -> int:
+    return next(_versions)
+
+
+def cosine_normalizer(val: float) -> float:
+    res = (1 + val) / 2
+    res = max(
+        0, min(1, res)
+    )  # float precision can cause values like 1.0000000596046448
+    return res
+
+
+def save_store(db: MyFaiss):
+    wal: MemoryWal | None = getattr(db, "wal", None)
+    if wal:
+        wal.checkpoint(db, background=False)
+    else:
+        db.save_local(folder_path=db.folder)
+
+
+def log_add(db: MyFaiss, ids: list[str], docs: list[Document], vectors: list[list[float]]):
+    wal: MemoryWal | None = getattr(db, "wal", None)
+    if wal:
+        wal.log_add(ids, docs, vectors)
+
+
+def log_delete(db: MyFaiss, ids: list[str]):
+    wal: MemoryWal | None = getattr(db, "wal", None)
+    if wal:
+        wal.log_delete(ids)
+
+
+def group_by_area(docs: dict[str, Document]) -> dict[str, dict[str, Document]]:
+    groups: dict[str, dict[str, Document]] = {}
+    for id, doc in docs.items():
+        groups.setdefault(get_area(doc), {})[id] = doc
+    return groups
+
+
+def get_area(doc: Document) -> str:
+    area = doc.metadata.get("area") or DEFAULT_AREA
+    return area.value if isinstance(area, Enum) else str(area)
+
+
+def is_memory_dir(db_dir: str) -> bool:
+    """Whether a folder holds a memory db, with area stores or a single index from before the split."""
+    if not os.path.isdir(db_dir):
+        return False
+    if os.path.exists(os.path.join(db_dir, EMBEDDING_FILE)) or os.path.exists(
+        os.path.join(db_dir, "index.faiss")
+    ):
+        return True
+    return any(
+        (name == AREAS_FOLDER or name.startswith(AREAS_FOLDER + "-"))
+        and os.path.isdir(os.path.join(db_dir, name))
+        for name in os.listdir(db_dir)
+    )
+
+
+def get_embedding_set(db_dir: str) -> dict[str, Any]:
+    """Model the live stores are indexed with, empty for a new memory subdir."""
+    path = os.path.join(db_dir, EMBEDDING_FILE)
+    if not os.path.exists(path):
+        return {}
+    return json.loads(files.read_file(path))
+
+
+def save_embedding_set(db_dir: str, embedding_set: dict[str, Any]):
+    # replaced at once, it decides which stores are live
+    path = os.path.join(db_dir, EMBEDDING_FILE)
+    files.write_file(path + ".tmp", json.dumps(embedding_set))
+    os.replace(path + ".tmp", path)
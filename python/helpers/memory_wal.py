@@ -0,0 +1,342 @@
+import base64
+import contextlib
+import json
+import os
+import pickle
+import threading
+import time
+from typing import Any, Callable
+
+import numpy as np
+
+# faiss needs to be patched for python 3.12 on arm #TODO remove once not needed
+from python.helpers import faiss_monkey_patch
+import faiss
+
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+
+from python.helpers.print_style import PrintStyle
+from python.helpers import memory_share
+
+CHECKPOINT_OPS = 1000  # logged operations that trigger a checkpoint of the full index
+CHECKPOINT_INTERVAL = 300  # seconds after which any logged operation triggers a checkpoint
+FSYNC = False  # fsync every record, flushing to the OS is enough to survive a crash of the app
+
+WAL_FOLDER = "wal"
+CHECKPOINT_FILE = "checkpoint.json"
+INDEX_NAME = "index"
+TXN_FILE = "transactions.jsonl"  # committed transactions spanning several logs
+
+
+class MemoryWal:
+    """Write-ahead log of a FAISS memory database.
+
+    Inserts and deletes are appended to the current log file and acknowledged immediately,
+    the full index is written by background checkpoints. Log files are numbered, a
+    checkpoint rotates to a new file and records the last file it contains, so on load
+    only the newer files are replayed.
+    """
+
+    _locks: dict[str, threading.RLock] = {}
+    _locks_lock = threading.Lock()
+
+    def __init__(self, db_dir: str, shared: bool = False):
+        self.db_dir = db_dir
+        self.shared = shared  # checkpoints also write the mappable documents for reader processes
+        self.wal_dir = os.path.join(db_dir, WAL_FOLDER)
+        os.makedirs(self.wal_dir, exist_ok=True)
+        self.lock = MemoryWal.get_lock(db_dir)
+        # numbering continues after both existing files and the last checkpoint
+        self.file_no = max([*self._get_file_numbers(), self._read_checkpoint()]) + 1
+        self.ops = 0
+        self.last_checkpoint = time.time()
+        self.interval = CHECKPOINT_INTERVAL
+        self.checkpoints = 0
+        self.on_checkpoint: Callable[[], None] | None = None  # called after each written checkpoint
+        self._file = None
+        self.closed = False
+        self.txns: set[str] = set()  # transactions of the replayed log files
+        self._checkpoint_thread: threading.Thread | None = None
+
+    @staticmethod
+    def get_lock(db_dir: str) -> threading.RLock:
+        """Lock held while index files of db_dir are written or read."""
+        with MemoryWal._locks_lock:
+            lock = MemoryWal._locks.get(db_dir)
+            if lock is None:
+                lock = threading.RLock()
+                MemoryWal._locks[db_dir] = lock
+            return lock
+
+    def log_add(self, ids: list[str], docs: list[Document], vectors: list[list[float]]):
+        self._append(get_add_record(ids, docs, vectors))
+
+    def log_delete(self, ids: list[str]):
+        self._append(get_delete_record(ids))
+
+    def log_batch(self, records: list[dict[str, Any]], txn: str | None = None):
+        """Operations written as one record, replayed all or nothing.
+
+        A record that is part of a transaction txn is replayed only once the transaction
+        is committed to its TransactionLog.
+        """
+        record: dict[str, Any] = {"op": "batch", "ops": records}
+        if txn:
+            record["txn"] = txn
+        self._append(record)
+
+    def replay(self, db, committed: set[str] | None = None) -> int:
+        """Apply log files newer than the last checkpoint to a freshly loaded db."""
+        covered = self._read_checkpoint()
+        applied = 0
+        for no in sorted(self._get_file_numbers()):
+            if no <= covered:
+                continue
+            with open(self._get_file_path(no), "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # torn write at the end of a file
+                    txn = record.get("txn")
+                    if txn:
+                        if txn not in (committed or ()):
+                            continue  # the process stopped before every part was logged
+                        self.txns.add(txn)
+                    _apply(db, record)
+                    applied += 1
+        if applied:
+            PrintStyle.standard(f"Replayed {applied} memory operations from the log")
+            self.ops = applied  # next operation checkpoints them
+        return applied
+
+    def needs_checkpoint(self) -> bool:
+        if not self.ops:
+            return False
+        return (
+            self.ops >= CHECKPOINT_OPS
+            or time.time() - self.last_checkpoint >= self.interval
+        )
+
+    def maybe_checkpoint(self, db):
+        """Start a background checkpoint when enough operations have been logged."""
+        if self.needs_checkpoint() and not self.is_checkpointing():
+            self.checkpoint(db)
+
+    def is_checkpointing(self) -> bool:
+        return bool(self._checkpoint_thread and self._checkpoint_thread.is_alive())
+
+    def checkpoint(self, db, background: bool = True):
+        """Write the full index, a snapshot is taken right away and written in a thread."""
+        if self.closed:
+            return  # the files belong to a db loaded again meanwhile
+        if self._checkpoint_thread:
+            self._checkpoint_thread.join()
+        covered = self._rotate()
+        full_vectors = getattr(db, "full_vectors", None)
+        # changes may come from another thread when the db is shared with reader processes
+        with getattr(db, "_write_lock", None) or contextlib.nullcontext():
+            snapshot = (
+                faiss.clone_index(db.index),
+                InMemoryDocstore(dict(db.docstore._dict)),
+                dict(db.index_to_docstore_id),
+                (full_vectors, full_vectors.snapshot()) if full_vectors else None,
+            )
+        self.ops = 0
+        self.last_checkpoint = time.time()
+        if background:
+            self._checkpoint_thread = threading.Thread(
+                target=self._write_checkpoint,
+                args=(snapshot, covered),
+                name="memory-checkpoint",
+                daemon=True,
+            )
+            self._checkpoint_thread.start()
+        else:
+            self._write_checkpoint(snapshot, covered)
+
+    def close(self):
+        if self._checkpoint_thread:
+            self._checkpoint_thread.join()
+        if self._file:
+            self._file.close()
+            self._file = None
+        self.closed = True
+
+    def _append(self, record: dict[str, Any]):
+        if self.closed:
+            # a reopened file would be removed by the checkpoints of the db loaded next
+            raise RuntimeError(f"Memory log of {self.db_dir} is closed")
+        if self._file is None:
+            self._file = open(self._get_file_path(self.file_no), "a", encoding="utf-8")
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self._file.flush()
+        if FSYNC:
+            os.fsync(self._file.fileno())
+        self.ops += 1
+
+    def _rotate(self) -> int:
+        # operations logged from now on go to a new file, the returned one is covered by the checkpoint
+        if self._file:
+            self._file.close()
+            self._file = None
+        covered = self.file_no
+        self.file_no += 1
+        return covered
+
+    def _write_checkpoint(self, snapshot: tuple, covered: int):
+        index, docstore, index_to_docstore_id, full_vectors = snapshot
+        try:
+            image_lock = (
+                memory_share.image_lock(self.db_dir, exclusive=True)
+                if self.shared
+                else contextlib.nullcontext()
+            )
+            with self.lock, image_lock:
+                if full_vectors:
+                    # before the index, so the vectors of every checkpointed id are on disk
+                    full_vectors[0].write(full_vectors[1])
+                tmp_faiss = os.path.join(self.db_dir, f"{INDEX_NAME}.faiss.tmp")
+                tmp_pkl = os.path.join(self.db_dir, f"{INDEX_NAME}.pkl.tmp")
+                faiss.write_index(index, tmp_faiss)
+                with open(tmp_pkl, "wb") as f:
+                    pickle.dump((docstore, index_to_docstore_id), f)
+                os.replace(tmp_faiss, os.path.join(self.db_dir, f"{INDEX_NAME}.faiss"))
+                os.replace(tmp_pkl, os.path.join(self.db_dir, f"{INDEX_NAME}.pkl"))
+                if self.shared:
+                    memory_share.write_docs(self.db_dir, docstore._dict, index_to_docstore_id)
+                # replaying records already in the index is harmless, so the marker goes last
+                self._write_checkpoint_marker(covered)
+                for no in self._get_file_numbers():
+                    if no <= covered:
+                        os.remove(self._get_file_path(no))
+            self.checkpoints += 1
+            if self.on_checkpoint:
+                self.on_checkpoint()
+        except Exception as e:
+            PrintStyle.error(f"Memory checkpoint failed in {self.db_dir}: {e}")
+
+    def _read_checkpoint(self) -> int:
+        path = os.path.join(self.db_dir, CHECKPOINT_FILE)
+        if not os.path.exists(path):
+            return 0
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("wal", 0)
+
+    def _write_checkpoint_marker(self, covered: int):
+        path = os.path.join(self.db_dir, CHECKPOINT_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"wal": covered, "time": time.time()}, f)
+        os.replace(path + ".tmp", path)
+
+    def _get_file_numbers(self) -> list[int]:
+        return [
+            int(name[:-6])
+            for name in os.listdir(self.wal_dir)
+            if name.endswith(".jsonl") and name[:-6].isdigit()
+        ]
+
+    def _get_file_path(self, no: int) -> str:
+        return os.path.join(self.wal_dir, f"{no:08d}.jsonl")
+
+
+class TransactionLog:
+    """Commits of transactions whose parts are logged by the stores of several areas.
+
+    Every store logs its part as one record with the transaction id, the id is added here
+    once all parts are logged. Parts of transactions without a commit are not replayed.
+    """
+
+    def __init__(self, folder: str):
+        self.path = os.path.join(folder, TXN_FILE)
+        self.lock = threading.Lock()
+        self.ids: set[str] = set()
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.ids = {line.strip() for line in f if line.endswith("\n")}  # not a torn write
+        self._file = None
+
+    def commit(self, txn: str):
+        with self.lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(txn + "\n")
+            self._file.flush()
+            if FSYNC:
+                os.fsync(self._file.fileno())
+            self.ids.add(txn)
+
+    def compact(self, keep: set[str]):
+        """Forget the commits of transactions no log file refers to anymore."""
+        with self.lock:
+            if not self.ids - keep:
+                return
+            self.ids &= keep
+            if self._file:
+                self._file.close()
+                self._file = None
+            with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+                f.writelines(txn + "\n" for txn in sorted(self.ids))
+            os.replace(self.path + ".tmp", self.path)
+
+    def close(self):
+        with self.lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+
+def get_add_record(ids: list[str], docs: list[Document], vectors: list[list[float]]) -> dict[str, Any]:
+    return {
+        "op": "add",
+        "docs": [
+            {
+                "id": id,
+                "text": doc.page_content,
+                "metadata": doc.metadata,
+                "vector": _encode_vector(vector),
+            }
+            for id, doc, vector in zip(ids, docs, vectors)
+        ],
+    }
+
+
+def get_delete_record(ids: list[str]) -> dict[str, Any]:
+    return {"op": "delete", "ids": ids}
+
+
+def read_add_record(record: dict[str, Any]) -> list[tuple[str, Document, list[float]]]:
+    """(id, document, vector) of each document of an add record."""
+    return [
+        (d["id"], Document(d["text"], metadata=d["metadata"]), _decode_vector(d["vector"]))
+        for d in record["docs"]
+    ]
+
+
+def _apply(db, record: dict[str, Any]):
+    # replay is idempotent, records already contained in the checkpoint are skipped
+    if record["op"] == "add":
+        docs = [d for d in record["docs"] if d["id"] not in db.docstore._dict]
+        if docs:
+            db.add_embeddings(
+                [(d["text"], _decode_vector(d["vector"])) for d in docs],
+                metadatas=[d["metadata"] for d in docs],
+                ids=[d["id"] for d in docs],
+            )
+    elif record["op"] == "delete":
+        ids = [id for id in record["ids"] if id in db.docstore._dict]
+        if ids:
+            db.delete(ids=ids)
+    elif record["op"] == "batch":
+        for op in record["ops"]:
+            _apply(db, op)
+
+
+def _encode_vector(vector: list[float]) -> str:
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode()
+
+
+def _decode_vector(data: str) -> list[float]:
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32).tolist()
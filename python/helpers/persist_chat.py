@@ -3,15 +3,17 @@ from datetime import datetime
 from typing import Any
 import uuid
 from agent import Agent, AgentConfig, AgentContext, AgentContextType
-from python.helpers import files, history
+from python.helpers import files, history, blob_store, chat_format, summary_cache
 import json
+import os
 from initialize import initialize_agent
 
 from python.helpers.log import Log, LogItem
 
 CHATS_FOLDER = "tmp/chats"
 LOG_SIZE = 1000
-CHAT_FILE_NAME = "chat.json"
+CHAT_FILE_NAME = "chat.a0c"
+CHAT_FILE_NAME_JSON = "chat.json"  # legacy format, migrated on load
 
 
 def get_chat_folder_path(ctxid: str):
@@ -37,9 +39,10 @@ def save_tmp_chat(context: AgentContext):
 
     path = _get_chat_file_path(context.id)
     files.make_dirs(path)
-    data = _serialize_context(context)
-    js = _safe_json_serialize(data, ensure_ascii=False)
-    files.write_file(path, js)
+    data = _serialize_context(context, compact=True)
+    tmp_path = path + ".tmp"
+    files.write_file_bin(tmp_path, chat_format.dumps(data))
+    os.replace(tmp_path, path)
 
 
 def save_tmp_chats():
@@ -55,16 +58,24 @@ def load_tmp_chats():
     """Load all contexts from the chats folder"""
     _convert_v080_chats()
     folders = files.list_files(CHATS_FOLDER, "*")
-    json_files = []
-    for folder_name in folders:
-        json_files.append(_get_chat_file_path(folder_name))
 
     ctxids = []
-    for file in json_files:
+    for folder_name in folders:
+        file = _get_chat_file_path(folder_name)
         try:
-            js = files.read_file(file)
-            data = json.loads(js)
-            ctx = _deserialize_context(data)
+            if files.exists(file):
+                data = chat_format.loads(files.read_file_bin(file))
+                ctx = _deserialize_context(data)
+            else:
+                # migrate chats saved in the legacy json format
+                file = _get_chat_json_file_path(folder_name)
+                if not files.exists(file):
+                    continue
+                data = json.loads(files.read_file(file))
+                ctx = _deserialize_context(data)
+                save_tmp_chat(ctx)
+                if files.exists(_get_chat_file_path(ctx.id)):
+                    os.remove(file)
             ctxids.append(ctx.id)
         except Exception as e:
             print(f"Error loading chat {file}: {e}")
@@ -75,12 +86,16 @@ def _get_chat_file_path(ctxid: str):
     return files.get_abs_path(CHATS_FOLDER, ctxid, CHAT_FILE_NAME)
 
 
+def _get_chat_json_file_path(ctxid: str):
+    return files.get_abs_path(CHATS_FOLDER, ctxid, CHAT_FILE_NAME_JSON)
+
+
 def _convert_v080_chats():
     json_files = files.list_files(CHATS_FOLDER, "*.json")
     for file in json_files:
         path = files.get_abs_path(CHATS_FOLDER, file)
         name = file.rstrip(".json")
-        new = _get_chat_file_path(name)
+        new = _get_chat_json_file_path(name)
         files.move_file(path, new)
 
 
@@ -98,7 +113,7 @@ def load_json_chats(jsons: list[str]):
 
 def export_json_chat(context: AgentContext):
     """Export context as JSON string"""
-    data = _serialize_context(context)
+    data = _serialize_context(context, inline=True)
     js = _safe_json_serialize(data, ensure_ascii=False)
     return js
 
@@ -106,21 +121,26 @@ def export_json_chat(context: AgentContext):
 def remove_chat(ctxid):
     """Remove a chat or task context"""
     path = get_chat_folder_path(ctxid)
+    summary_cache.SummaryCache.remove(files.get_abs_path(path, summary_cache.CACHE_FILE))
     files.delete_dir(path)
+    blob_store.BlobStore.remove(get_chat_msg_files_folder(ctxid))
 
 
 def remove_msg_files(ctxid):
     """Remove all message files for a chat or task context"""
     path = get_chat_msg_files_folder(ctxid)
     files.delete_dir(path)
+    blob_store.BlobStore.remove(path)
 
 
-def _serialize_context(context: AgentContext):
+def _serialize_context(
+    context: AgentContext, inline: bool = False, compact: bool = False
+):
     # serialize agents
     agents = []
     agent = context.agent0
     while agent:
-        agents.append(_serialize_agent(agent))
+        agents.append(_serialize_agent(agent, inline=inline, compact=compact))
         agent = agent.data.get(Agent.DATA_NAME_SUBORDINATE, None)
 
 
@@ -151,10 +171,13 @@ def _serialize_context(context: AgentContext):
     }
 
 
-def _serialize_agent(agent: Agent):
+def _serialize_agent(agent: Agent, inline: bool = False, compact: bool = False):
     data = {k: v for k, v in agent.data.items() if not k.startswith("_")}
 
-    history = agent.history.serialize()
+    # compact chat files store history as a structure, json exports as a nested json string
+    history = (
+        agent.history.to_dict() if compact else agent.history.serialize(inline=inline)
+    )
 
     return {
         "number": agent.number,
@@ -166,9 +189,9 @@ def _serialize_agent(agent: Agent):
 def _serialize_log(log: Log):
     return {
         "guid": log.guid,
-        "logs": [
-            item.output() for item in log.logs[-LOG_SIZE:]
-        ],  # serialize LogItem objects
+        "logs": log.get_items(
+            start=log.get_length() - LOG_SIZE
+        ),  # serialize LogItem objects, older ones are paged from disk
         "progress": log.progress,
         "progress_no": log.progress_no,
     }
@@ -260,12 +283,11 @@ def _deserialize_log(data: dict[str, Any]) -> "Log":
     log.set_initial_progress()
 
     # Deserialize the list of LogItem objects
-    i = 0
     for item_data in data.get("logs", []):
-        log.logs.append(
+        log.add_item(
             LogItem(
                 log=log,  # restore the log reference
-                no=i,  # item_data["no"],
+                no=0,  # assigned by the log
                 type=item_data["type"],
                 heading=item_data.get("heading", ""),
                 content=item_data.get("content", ""),
@@ -273,8 +295,6 @@ def _deserialize_log(data: dict[str, Any]) -> "Log":
                 temp=item_data.get("temp", False),
             )
         )
-        log.updates.append(i)
-        i += 1
 
     return log
 
@@ -0,0 +1,105 @@
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any
+
+MAX_ENTRIES = 64  # recall results kept per memory subdir
+MAX_QUERIES = 256  # search queries generated by the utility model, shared by all memory subdirs
+
+
+class RecallCache:
+    """Memory recall results keyed by a hash of the search query and its parameters.
+
+    Results are only valid for the memory version they were searched in,
+    any insert or delete changes the version and drops them.
+    """
+
+    _caches: dict[str, "RecallCache"] = {}
+
+    def __init__(self):
+        self.version: int | None = None
+        self.entries: OrderedDict[str, Any] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get(memory_subdir: str) -> "RecallCache":
+        cache = RecallCache._caches.get(memory_subdir)
+        if cache is None:
+            cache = RecallCache()
+            RecallCache._caches[memory_subdir] = cache
+        return cache
+
+    def get_result(self, key: str, version: int) -> Any | None:
+        if version != self.version:
+            self.misses += 1
+            return None
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return result
+
+    def set_result(self, key: str, version: int, result: Any):
+        if self.version is not None and version < self.version:
+            return  # searched before a change that is already cached
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > MAX_ENTRIES:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+class QueryCache:
+    """Search queries generated by the utility model keyed by a hash of its input.
+
+    The model words the query differently on every call, so an unchanged conversation recalled
+    again, by a retried loop, a reloaded chat or an agent with the same history, gets the same
+    query back and with it the cached search results.
+    """
+
+    _instance: "QueryCache | None" = None
+
+    def __init__(self):
+        self.entries: OrderedDict[str, str] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get() -> "QueryCache":
+        if QueryCache._instance is None:
+            QueryCache._instance = QueryCache()
+        return QueryCache._instance
+
+    def get_query(self, key: str) -> str | None:
+        query = self.entries.get(key)
+        if query is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return query
+
+    def set_query(self, key: str, query: str):
+        self.entries[key] = query
+        self.entries.move_to_end(key)
+        while len(self.entries) > MAX_QUERIES:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+def get_key(query: str, **params: Any) -> str:
+    hash = hashlib.sha256()
+    hash.update(query.encode("utf-8", errors="replace"))
+    hash.update(b"\0")
+    hash.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return hash.hexdigest()
@@ -45,6 +45,8 @@ class Settings(TypedDict):
     embed_model_kwargs: dict[str, Any]
     embed_model_rl_requests: int
     embed_model_rl_input: int
+    embed_model_batch_size: int
+    embed_model_batch_linger_ms: int
 
     browser_model_provider: str
     browser_model_name: str
@@ -71,9 +73,14 @@ class Settings(TypedDict):
     memory_recall_similarity_threshold: float
     memory_recall_query_prep: bool
     memory_recall_post_filter: bool
+    memory_recall_hybrid: bool
     memory_memorize_enabled: bool
     memory_memorize_consolidation: bool
     memory_memorize_replace_threshold: float
+    memory_memorize_dedup_threshold: float
+    memory_loaded_max_subdirs: int
+    memory_loaded_max_mb: int
+    memory_loaded_min_idle: int
 
     api_keys: dict[str, str]
 
@@ -413,6 +420,26 @@ def convert_out(settings: Settings) -> SettingsOutput:
         }
     )
 
+    embed_model_fields.append(
+        {
+            "id": "embed_model_batch_size",
+            "title": "Max batch size",
+            "description": "Concurrent embedding requests are merged into one call of the model with up to this many texts.",
+            "type": "number",
+            "value": settings["embed_model_batch_size"],
+        }
+    )
+
+    embed_model_fields.append(
+        {
+            "id": "embed_model_batch_linger_ms",
+            "title": "Batch linger (ms)",
+            "description": "How long a request waits for others to join its batch. Higher values make larger batches under load and add latency to single requests. Set to 0 to dispatch right away.",
+            "type": "number",
+            "value": settings["embed_model_batch_linger_ms"],
+        }
+    )
+
     embed_model_fields.append(
         {
             "id": "embed_model_kwargs",
@@ -728,6 +755,16 @@ def convert_out(settings: Settings) -> SettingsOutput:
         }
     )
 
+    memory_fields.append(
+        {
+            "id": "memory_recall_hybrid",
+            "title": "Auto-recall hybrid search",
+            "description": "Combines vector similarity with keyword (BM25) ranking for auto-recall. Finds exact identifiers and file names more reliably, often good enough to disable AI post-filtering.",
+            "type": "switch",
+            "value": settings["memory_recall_hybrid"],
+        }
+    )
+
     memory_fields.append(
         {
             "id": "memory_recall_interval",
@@ -837,6 +874,49 @@ def convert_out(settings: Settings) -> SettingsOutput:
         }
     )
 
+    memory_fields.append(
+        {
+            "id": "memory_memorize_dedup_threshold",
+            "title": "Auto-memorize duplicate threshold",
+            "description": "New memories that repeat existing ones are skipped before AI consolidation or embedding, without LLM calls. Texts at least this similar count as duplicates, a longer one replaces the existing memory. 1 = only exact duplicates, 0 = off.",
+            "type": "range",
+            "min": 0,
+            "max": 1,
+            "step": 0.01,
+            "value": settings["memory_memorize_dedup_threshold"],
+        }
+    )
+
+    memory_fields.append(
+        {
+            "id": "memory_loaded_max_subdirs",
+            "title": "Loaded memories max count",
+            "description": "The maximum number of memory subdirectories (agent and project memories) kept loaded. The least recently used ones are saved and unloaded, they load again on their next use.",
+            "type": "number",
+            "value": settings["memory_loaded_max_subdirs"],
+        }
+    )
+
+    memory_fields.append(
+        {
+            "id": "memory_loaded_max_mb",
+            "title": "Loaded memories max size (MB)",
+            "description": "The estimated size of all loaded memory subdirectories over which the least recently used ones are unloaded. 0 = no limit.",
+            "type": "number",
+            "value": settings["memory_loaded_max_mb"],
+        }
+    )
+
+    memory_fields.append(
+        {
+            "id": "memory_loaded_min_idle",
+            "title": "Loaded memories min idle time (seconds)",
+            "description": "Memory subdirectories used within this time stay loaded, even over the limits above.",
+            "type": "number",
+            "value": settings["memory_loaded_min_idle"],
+        }
+    )
+
     memory_section: SettingsSection = {
         "id": "memory",
         "title": "Memory",
@@ -1481,6 +1561,8 @@ def get_default_settings() -> Settings:
         embed_model_kwargs={},
         embed_model_rl_requests=0,
         embed_model_rl_input=0,
+        embed_model_batch_size=64,
+        embed_model_batch_linger_ms=5,
         browser_model_provider="openrouter",
         browser_model_name="openai/gpt-4.1",
         browser_model_api_base="",
@@ -1501,9 +1583,14 @@ def get_default_settings() -> Settings:
         memory_recall_similarity_threshold=0.7,
         memory_recall_query_prep=True,
         memory_recall_post_filter=True,
+        memory_recall_hybrid=False,
         memory_memorize_enabled=True,
         memory_memorize_consolidation=True,
         memory_memorize_replace_threshold=0.9,
+        memory_memorize_dedup_threshold=0.8,
+        memory_loaded_max_subdirs=16,
+        memory_loaded_max_mb=4096,
+        memory_loaded_min_idle=60,
         api_keys={},
         auth_login="",
         auth_password="",
@@ -0,0 +1,142 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from python.helpers import files
+from python.helpers.print_style import PrintStyle
+
+CACHE_FILE = "summaries.json"  # in the chat folder, keys are hashes of the full model input
+CACHE_VERSION = 1  # bump when summarization changes in a way the prompts do not reflect
+MAX_ENTRIES = 5000
+SAVE_BATCH = 16  # new summaries written to the file together
+SAVE_INTERVAL = 30  # seconds a new summary waits at most before the file is written
+
+
+class SummaryCache:
+    """Summaries of history topics and bulks keyed by a hash of the exact utility model input.
+
+    Stored with the chat and shared by its agents, so subordinates, reset and reloaded chats
+    reuse the summaries of identical content. New entries are written to the file in batches
+    by a background thread.
+    """
+
+    _caches: dict[str, "SummaryCache"] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, path: str | None):
+        self.path = path
+        self.entries: OrderedDict[str, str] = OrderedDict()
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.saved = time.monotonic()
+        self.writer: threading.Thread | None = None  # last thread started to write the file
+        self.write_lock = threading.Lock()  # writes in the order their snapshots were taken
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    @staticmethod
+    def get(path: str) -> "SummaryCache":
+        with SummaryCache._lock:
+            cache = SummaryCache._caches.get(path)
+            if cache is None:
+                cache = SummaryCache(path)
+                SummaryCache._caches[path] = cache
+            return cache
+
+    @staticmethod
+    def remove(path: str):
+        """Forget the cache of a removed chat, waiting for a write in progress."""
+        with SummaryCache._lock:
+            cache = SummaryCache._caches.pop(path, None)
+        if cache is None:
+            return
+        with cache.lock:
+            cache.path = None
+            writer = cache.writer
+        if writer is not None:
+            writer.join()
+
+    def get_summary(self, key: str) -> str | None:
+        with self.lock:
+            summary = self.entries.get(key)
+            if summary is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return summary
+
+    def set_summary(self, key: str, summary: str):
+        with self.lock:
+            self.entries[key] = summary
+            self.entries.move_to_end(key)
+            while len(self.entries) > MAX_ENTRIES:
+                self.entries.popitem(last=False)
+            self.pending += 1
+            due = self.pending >= SAVE_BATCH or time.monotonic() - self.saved >= SAVE_INTERVAL
+            due = due and not (self.writer and self.writer.is_alive())
+        if due:
+            # summaries are set from the event loop, the whole file is rewritten in a thread
+            thread = threading.Thread(target=self.flush, name="summary-cache-write", daemon=True)
+            with self.lock:
+                self.saved = time.monotonic()
+                self.writer = thread
+            thread.start()
+
+    def flush(self):
+        """Write pending entries to the file."""
+        with self.write_lock:
+            with self.lock:
+                if not self.pending or not self.path:
+                    return
+                path = self.path
+                entries = dict(self.entries)
+                self.pending = 0
+                self.saved = time.monotonic()
+            data = json.dumps({"version": CACHE_VERSION, "entries": entries}, ensure_ascii=False)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            files.write_file(tmp_path, data)
+            os.replace(tmp_path, path)
+
+    def stats(self) -> dict:
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses, "pending": self.pending}
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            data = json.loads(files.read_file(self.path))
+            if data.get("version") == CACHE_VERSION:
+                self.entries = OrderedDict(data.get("entries", {}))
+        except Exception as e:
+            PrintStyle.error(f"Failed to load summary cache {self.path}: {e}")
+
+
+def get_chat_cache(ctxid: str) -> SummaryCache:
+    from python.helpers.persist_chat import get_chat_folder_path
+
+    return SummaryCache.get(files.get_abs_path(get_chat_folder_path(ctxid), CACHE_FILE))
+
+
+def get_key(system: str, message: str) -> str:
+    digest = hashlib.sha256()
+    digest.update(str(CACHE_VERSION).encode())
+    digest.update(b"\0")
+    digest.update(system.encode("utf-8", errors="replace"))
+    digest.update(b"\0")
+    digest.update(message.encode("utf-8", errors="replace"))
+    return digest.hexdigest()
+
+
+@atexit.register
+def _flush_all():
+    for cache in list(SummaryCache._caches.values()):
+        try:
+            cache.flush()
+        except Exception:
+            pass
@@ -14,7 +14,7 @@ from langchain_community.vectorstores.utils import (
     DistanceStrategy,
 )
 from langchain.embeddings import CacheBackedEmbeddings
-from simpleeval import simple_eval
+from python.helpers.memory_filter import compile_filter
 
 from agent import Agent
 
@@ -98,14 +98,24 @@ class VectorDB:
                     break
         return result
 
-    async def insert_documents(self, docs: list[Document]):
+    async def insert_documents(
+        self, docs: list[Document], vectors: list[list[float]] | None = None
+    ):
         ids = [str(uuid.uuid4()) for _ in range(len(docs))]
 
         if ids:
             for doc, id in zip(docs, ids):
                 doc.metadata["id"] = id  # add ids to documents metadata
 
-            self.db.add_documents(documents=docs, ids=ids)
+            if vectors is not None:
+                # embedded already, e.g. cached
+                self.db.add_embeddings(
+                    [(doc.page_content, vector) for doc, vector in zip(docs, vectors)],
+                    metadatas=[doc.metadata for doc in docs],
+                    ids=ids,
+                )
+            else:
+                self.db.add_documents(documents=docs, ids=ids)
         return ids
 
     async def delete_documents_by_ids(self, ids: list[str]):
@@ -139,12 +149,4 @@ def cosine_normalizer(val: float) -> float:
 
 
 def get_comparator(condition: str):
-    def comparator(data: dict[str, Any]):
-        try:
-            result = simple_eval(condition, {}, data)
-            return result
-        except Exception as e:
-            # PrintStyle.error(f"Error evaluating condition: {e}")
-            return False
-
-    return comparator
+    return compile_filter(condition, report_errors=False)
@@ -0,0 +1,599 @@
+import json
+import math
+import os
+import threading
+from typing import Any, Literal
+
+import numpy as np
+
+# faiss needs to be patched for python 3.12 on arm #TODO remove once not needed
+from python.helpers import faiss_monkey_patch
+import faiss
+
+from python.helpers.print_style import PrintStyle
+
+IndexType = Literal["auto", "flat", "ivf", "hnsw"]
+Quantization = Literal["none", "fp16", "pq"]
+
+DEFAULT_INDEX_TYPE: IndexType = "auto"
+DEFAULT_QUANTIZATION: Quantization = "none"
+# per memory subdir, {"type": "auto" | "flat" | "ivf" | "hnsw", "quantization": "none" | "fp16" | "pq"}
+CONFIG_FILE = "index.json"
+
+ANN_THRESHOLD = 50_000  # vectors from which "auto" switches from exact search to AUTO_ANN_TYPE
+AUTO_ANN_TYPE: IndexType = "ivf"
+IVF_NPROBE = 16
+IVF_MIN_POINTS_PER_LIST = 39  # faiss needs this many training points per list
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 128
+HNSW_MAX_TOMBSTONES = 0.2  # share of deleted vectors kept in a hnsw index before a rebuild
+EXACT_SEARCH_MAX = 20_000  # filtered candidates scored exactly instead of by a restricted ann search
+PQ_DIMS_PER_CODE = 4  # vector dimensions encoded by one product quantizer code
+PQ_BITS = 8
+PQ_MIN_TRAIN = 39 * 2**PQ_BITS  # faiss needs this many points to train the codebooks, fp16 below
+RERANK_FACTOR = 4  # candidates per result of a quantized index re-ranked with full precision vectors
+FULL_VECTORS_FILE = "vectors.json"  # dimension and generation of the full precision vectors of a quantized store
+FULL_VECTORS_ROWS = "vectors-{}.f32"  # rows appended by each save, memory-mapped
+FULL_VECTORS_IDS = "vectors-{}.ids"  # "+<id>" for each row and "-<id>" for each removal, one per line
+FULL_VECTORS_COMPACT = 2  # rows per live vector from which a save rewrites the rows without stale ones
+FULL_VECTORS_COMPACT_MIN = 1000  # rows below which the files are never rewritten
+LEGACY_VECTORS_FILE = "vectors.npy"  # all vectors rewritten by every save, replaced by the first compaction
+
+
+def get_index_type(db_dir: str) -> IndexType:
+    return _read_config(db_dir).get("type", DEFAULT_INDEX_TYPE)
+
+
+def set_index_type(db_dir: str, index_type: IndexType):
+    _write_config(db_dir, type=index_type)
+
+
+def get_quantization(db_dir: str) -> Quantization:
+    return _read_config(db_dir).get("quantization", DEFAULT_QUANTIZATION)
+
+
+def set_quantization(db_dir: str, quantization: Quantization):
+    _write_config(db_dir, quantization=quantization)
+
+
+def _read_config(db_dir: str) -> dict[str, Any]:
+    path = os.path.join(db_dir, CONFIG_FILE)
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            PrintStyle.error(f"Invalid index config {path}: {e}")
+    return {}
+
+
+def _write_config(db_dir: str, **values: Any):
+    config = {**_read_config(db_dir), **values}
+    with open(os.path.join(db_dir, CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f)
+
+
+def get_kind(index: Any) -> IndexType:
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    if isinstance(index, faiss.IndexIDMap):
+        return "hnsw"
+    return "flat"
+
+
+def get_index_quantization(index: Any) -> Quantization:
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, (faiss.IndexPQ, faiss.IndexIVFPQ, faiss.IndexHNSWPQ)):
+        return "pq"
+    if isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer, faiss.IndexHNSWSQ)):
+        return "fp16"
+    return "none"
+
+
+def get_index_bytes(index: Any) -> int:
+    """Estimated memory of an index with its codes, labels and graph links."""
+    count = index.ntotal
+    dim = index.d
+    try:
+        if isinstance(index, faiss.IndexIDMap):
+            storage = faiss.downcast_index(faiss.downcast_index(index.index).storage)
+            # codes, links of the base level and both label maps
+            return count * (storage.sa_code_size() + 2 * HNSW_M * 4 + 16)
+        if isinstance(index, faiss.IndexIVF):
+            return count * (index.code_size + 16)  # codes, list ids and the direct map
+        return count * index.sa_code_size()
+    except RuntimeError:
+        return count * dim * 4
+
+
+def uses_labels(index: Any) -> bool:
+    """Flat indexes address vectors by position, the others by stable labels."""
+    return get_kind(index) != "flat"
+
+
+def get_target_kind(index_type: IndexType, count: int, current: IndexType) -> IndexType:
+    if index_type != "auto":
+        return index_type
+    if current == "flat":
+        return AUTO_ANN_TYPE if count >= ANN_THRESHOLD else "flat"
+    # hysteresis, do not flip back and forth around the threshold
+    return current if count >= ANN_THRESHOLD // 2 else "flat"
+
+
+def get_target_quantization(quantization: Quantization, count: int, current: Quantization) -> Quantization:
+    if quantization == "pq":
+        # trained codebooks stay, too few vectors to train them yet are stored as fp16
+        return "pq" if current == "pq" or count >= PQ_MIN_TRAIN else "fp16"
+    return quantization
+
+
+def get_ivf_lists(count: int) -> int:
+    return max(1, min(int(math.sqrt(count)), count // IVF_MIN_POINTS_PER_LIST))
+
+
+def get_pq_codes(dim: int) -> int:
+    # the number of codes has to divide the dimension
+    for codes in range(max(1, dim // PQ_DIMS_PER_CODE), 0, -1):
+        if dim % codes == 0:
+            return codes
+    return 1
+
+
+def create_index(
+    kind: IndexType,
+    dim: int,
+    train_vectors: np.ndarray | None = None,
+    quantization: Quantization = "none",
+):
+    count = len(train_vectors) if train_vectors is not None else 0
+    metric = faiss.METRIC_INNER_PRODUCT
+    if kind == "ivf":
+        lists = get_ivf_lists(count)
+        if quantization == "pq":
+            index = faiss.IndexIVFPQ(faiss.IndexFlatIP(dim), dim, lists, get_pq_codes(dim), PQ_BITS, metric)
+        elif quantization == "fp16":
+            index = faiss.IndexIVFScalarQuantizer(
+                faiss.IndexFlatIP(dim), dim, lists, faiss.ScalarQuantizer.QT_fp16, metric
+            )
+        else:
+            index = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, lists, metric)
+        if train_vectors is not None and count:
+            index.train(train_vectors)
+        index.nprobe = IVF_NPROBE
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)  # reconstruct by label
+        return index
+    if kind == "hnsw":
+        if quantization == "pq":
+            hnsw = faiss.IndexHNSWPQ(dim, get_pq_codes(dim), HNSW_M, PQ_BITS, metric)
+        elif quantization == "fp16":
+            hnsw = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_fp16, HNSW_M, metric)
+        else:
+            hnsw = faiss.IndexHNSWFlat(dim, HNSW_M, metric)
+        if quantization == "pq" and train_vectors is not None and count:
+            hnsw.train(train_vectors)
+        hnsw.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        hnsw.hnsw.efSearch = HNSW_EF_SEARCH
+        return faiss.IndexIDMap2(hnsw)
+    if quantization == "pq":
+        index = faiss.IndexPQ(dim, get_pq_codes(dim), PQ_BITS, metric)
+        if train_vectors is not None and count:
+            index.train(train_vectors)
+        return index
+    if quantization == "fp16":
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, metric)
+    return faiss.IndexFlatIP(dim)
+
+
+def add_vectors(state: Any, ids: list[str], vectors: np.ndarray) -> list[int]:
+    """Add vectors to state.index and their ids to state.index_to_docstore_id, returns the labels."""
+    mapping: dict[int, str] = state.index_to_docstore_id
+    if uses_labels(state.index):
+        if getattr(state, "next_label", None) is None:
+            state.next_label = _get_next_label(state.index, mapping)
+        labels = list(range(state.next_label, state.next_label + len(ids)))
+        state.next_label += len(ids)
+        state.index.add_with_ids(vectors, np.array(labels, dtype=np.int64))
+    else:
+        start = len(mapping)
+        labels = list(range(start, start + len(ids)))
+        state.index.add(vectors)
+    mapping.update(zip(labels, ids))
+    return labels
+
+
+def _get_next_label(index: Any, mapping: dict[int, str]) -> int:
+    if isinstance(index, faiss.IndexIDMap) and index.ntotal:
+        # labels of removed hnsw vectors are still taken
+        return int(faiss.vector_to_array(index.id_map).max()) + 1
+    return max(mapping, default=-1) + 1
+
+
+def remove_ids(state: Any, ids: list[str]) -> list[str]:
+    """Remove vectors by document id, returns the ids that were present."""
+    mapping: dict[int, str] = state.index_to_docstore_id
+    remove = set(ids)
+    labels = [label for label, id in mapping.items() if id in remove]
+    if not labels:
+        return []
+    found = [mapping[label] for label in labels]
+    if uses_labels(state.index):
+        try:
+            state.index.remove_ids(np.array(labels, dtype=np.int64))
+        except RuntimeError:
+            pass  # hnsw cannot remove, the vectors stay unreachable until a rebuild
+        for label in labels:
+            del mapping[label]
+    else:
+        state.index.remove_ids(np.array(labels, dtype=np.int64))
+        # positions shift after removal, same as FAISS.delete
+        removed = set(labels)
+        remaining = [id for label, id in sorted(mapping.items()) if label not in removed]
+        state.index_to_docstore_id = {i: id for i, id in enumerate(remaining)}
+    return found
+
+
+def get_vectors(index: Any, labels: list[int]) -> np.ndarray:
+    if not labels:
+        return np.zeros((0, index.d), dtype=np.float32)
+    if not uses_labels(index) and len(labels) == index.ntotal:
+        return index.reconstruct_n(0, index.ntotal)[np.array(labels, dtype=np.int64)]
+    return index.reconstruct_batch(np.array(labels, dtype=np.int64))
+
+
+def get_store_vectors(db: Any, labels: list[int], ids: list[str]) -> np.ndarray:
+    """Vectors of a store by label, in full precision where the index is quantized."""
+    vectors = get_vectors(db.index, labels)
+    full: FullVectors | None = getattr(db, "full_vectors", None)
+    if full is not None:
+        full.fill(ids, vectors)
+    return vectors
+
+
+def search_labels(index: Any, vector: np.ndarray, k: int, labels: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Search only among the given labels, same result shape as index.search."""
+    k = min(k, len(labels))
+    if not k:
+        return np.zeros((1, 0), dtype=np.float32), np.zeros((1, 0), dtype=np.int64)
+    kind = get_kind(index)
+    # product quantized flat codes cannot search with a selector
+    selectable = not isinstance(index, faiss.IndexPQ)
+    if not selectable or (kind != "flat" and len(labels) <= EXACT_SEARCH_MAX):
+        # approximate search misses results when few vectors pass the selector
+        scores = get_vectors(index, labels.tolist()) @ vector[0]
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return scores[top][None, :], labels[top][None, :]
+    selector = faiss.IDSelectorBatch(labels)
+    if kind == "ivf":
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+    elif kind == "hnsw":
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=max(HNSW_EF_SEARCH, k))
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    return index.search(vector, k, params=params)
+
+
+def rerank(
+    full: "FullVectors", mapping: dict[int, str], vector: np.ndarray, scores: np.ndarray, labels: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Rescore results of a quantized index with full precision vectors, best first."""
+    ids = [mapping.get(int(label)) if label != -1 else None for label in labels[0]]
+    exact = full.get([id for id in ids if id is not None])
+    scores = scores[0].copy()
+    for pos, id in enumerate(ids):
+        if id in exact:
+            scores[pos] = float(np.dot(exact[id], vector[0]))
+    order = np.argsort(-scores, kind="stable")
+    return scores[order][None, :], labels[0][order][None, :]
+
+
+def attach_full_vectors(db: Any, quantization: Quantization):
+    """Keep full precision vectors next to a quantized index, for re-ranking and rebuilds."""
+    current = get_index_quantization(db.index)
+    if quantization == "none" and current == "none":
+        return
+    full = FullVectors(db.folder)
+    if current == "none":
+        # the index still holds full precision vectors, copy the missing ones once
+        missing = [(label, id) for label, id in db.index_to_docstore_id.items() if id not in full]
+        if missing:
+            labels, ids = zip(*missing)
+            full.add(list(ids), get_vectors(db.index, list(labels)))
+            full.write(full.snapshot())
+    db.full_vectors = full
+
+
+class FullVectors:
+    """Full precision vectors of a quantized store by document id.
+
+    Saved vectors are memory-mapped from the folder of the store, the ones added since
+    are kept in memory until the next save appends them with the removals. Rows of removed
+    or replaced vectors stay in the file until it holds FULL_VECTORS_COMPACT rows per live
+    vector, then a save writes the live ones to a new generation of the files.
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.lock = threading.Lock()
+        self.rows: dict[str, int] = {}
+        self.data: np.ndarray | None = None
+        self.pending: dict[str, np.ndarray] = {}
+        self.dim: int | None = None
+        self.generation = 0
+        self.file_rows = 0  # rows in the files, stale ones included
+        self.dropped = False
+        self._removed: set[str] = set()  # since the last snapshot
+        self._legacy = False  # loaded from LEGACY_VECTORS_FILE
+        self._torn = False  # files end with a partly written save, appends would misalign
+        self._file_lock = threading.Lock()  # held while the files are written or removed
+        self._load()
+
+    def __contains__(self, id: str) -> bool:
+        return id in self.pending or id in self.rows
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.rows.keys() | self.pending.keys())
+
+    def add(self, ids: list[str], vectors: np.ndarray):
+        with self.lock:
+            for id, vector in zip(ids, vectors):
+                self.pending[id] = np.array(vector, dtype=np.float32)
+                self._removed.discard(id)
+
+    def remove(self, ids: list[str]):
+        with self.lock:
+            for id in ids:
+                self.pending.pop(id, None)
+                self.rows.pop(id, None)
+                self._removed.add(id)
+
+    def get(self, ids: list[str]) -> dict[str, np.ndarray]:
+        result = {}
+        with self.lock:
+            for id in ids:
+                vector = self.pending.get(id)
+                if vector is None and self.data is not None and id in self.rows:
+                    vector = self.data[self.rows[id]]
+                if vector is not None:
+                    result[id] = vector
+        return result
+
+    def fill(self, ids: list[str], vectors: np.ndarray):
+        """Replace vectors with their full precision ones where known."""
+        exact = self.get(ids)
+        for pos, id in enumerate(ids):
+            if id in exact:
+                vectors[pos] = exact[id]
+
+    def snapshot(self) -> tuple:
+        with self.lock:
+            removed, self._removed = self._removed, set()
+            return dict(self.pending), removed
+
+    def write(self, snapshot: tuple):
+        """Append the vectors added before a snapshot and map them, may run in a thread."""
+        pending, removed = snapshot
+        with self._file_lock:
+            if self.dropped:
+                return
+            if self._legacy or self._torn:
+                self._compact()
+            start = self.file_rows
+            if pending:
+                vectors = np.stack(list(pending.values())).astype(np.float32)
+                if self.dim is None:
+                    self.dim = vectors.shape[1]
+                    self._write_meta()
+                # rows first, ids without a complete row are ignored on load
+                with open(self._get_path(FULL_VECTORS_ROWS), "ab") as f:
+                    f.write(vectors.tobytes())
+            if pending or removed:
+                with open(self._get_path(FULL_VECTORS_IDS), "a", encoding="utf-8") as f:
+                    f.write("".join(f"-{id}\n" for id in removed) + "".join(f"+{id}\n" for id in pending))
+                self.file_rows += len(pending)
+            data = self._map()
+            with self.lock:
+                self.data = data
+                for no, id in enumerate(pending):
+                    if id not in self._removed:
+                        self.rows[id] = start + no
+                    if self.pending.get(id) is pending[id]:
+                        del self.pending[id]
+                stale = self.file_rows >= max(FULL_VECTORS_COMPACT_MIN, FULL_VECTORS_COMPACT * len(self.rows))
+            if stale:
+                self._compact()
+
+    def drop(self):
+        """Remove the files, the store does not keep full precision vectors anymore."""
+        with self._file_lock:
+            self.dropped = True
+            with self.lock:
+                self.rows, self.data, self.pending = {}, None, {}
+            names = [FULL_VECTORS_FILE, LEGACY_VECTORS_FILE]
+            names += [FULL_VECTORS_ROWS.format(self.generation), FULL_VECTORS_IDS.format(self.generation)]
+            for name in names:
+                path = os.path.join(self.folder, name)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _compact(self):
+        # live rows to the files of the next generation, call with _file_lock
+        with self.lock:
+            ids = list(self.rows)
+            rows = np.array([self.rows[id] for id in ids], dtype=np.int64)
+            data = self.data
+        previous = self.generation
+        legacy = self._legacy
+        self.generation += 1
+        vectors = data[rows] if data is not None and len(ids) else np.zeros((0, self.dim or 0), dtype=np.float32)
+        with open(self._get_path(FULL_VECTORS_ROWS), "wb") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        with open(self._get_path(FULL_VECTORS_IDS), "w", encoding="utf-8") as f:
+            f.write("".join(f"+{id}\n" for id in ids))
+        if self.dim is None and data is not None:
+            self.dim = data.shape[1]
+        self.file_rows = len(ids)
+        self._write_meta()  # the new generation is live from here
+        self._legacy = self._torn = False
+        for name in [FULL_VECTORS_ROWS.format(previous), FULL_VECTORS_IDS.format(previous)] + (
+            [LEGACY_VECTORS_FILE] if legacy else []
+        ):
+            path = os.path.join(self.folder, name)
+            if os.path.exists(path):
+                os.remove(path)
+        new_data = self._map()
+        with self.lock:
+            self.data = new_data
+            self.rows = {id: row for row, id in enumerate(ids) if id in self.rows}
+
+    def _map(self) -> np.ndarray | None:
+        if not self.file_rows or not self.dim:
+            return None
+        return np.memmap(
+            self._get_path(FULL_VECTORS_ROWS), dtype=np.float32, mode="r", shape=(self.file_rows, self.dim)
+        )
+
+    def _get_path(self, pattern: str) -> str:
+        return os.path.join(self.folder, pattern.format(self.generation))
+
+    def _write_meta(self):
+        path = os.path.join(self.folder, FULL_VECTORS_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "generation": self.generation}, f)
+        os.replace(path + ".tmp", path)
+
+    def _load(self):
+        path = os.path.join(self.folder, FULL_VECTORS_FILE)
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if isinstance(meta, list):
+                self._load_legacy(meta)
+                return
+            self.dim, self.generation = meta["dim"], meta["generation"]
+            rows_path, ids_path = self._get_path(FULL_VECTORS_ROWS), self._get_path(FULL_VECTORS_IDS)
+            if not self.dim or not os.path.exists(rows_path) or not os.path.exists(ids_path):
+                return
+            # a save interrupted by a crash may have left an incomplete last row or id
+            complete = os.path.getsize(rows_path) // (4 * self.dim)
+            with open(ids_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.endswith("\n") or (line[0] == "+" and self.file_rows == complete):
+                        self._torn = True
+                        break
+                    if line[0] == "-":
+                        self.rows.pop(line[1:-1], None)
+                    else:
+                        self.rows[line[1:-1]] = self.file_rows  # later rows win
+                        self.file_rows += 1
+            self._torn = self._torn or self.file_rows * 4 * self.dim != os.path.getsize(rows_path)
+            self.data = self._map()
+        except Exception as e:
+            PrintStyle.error(f"Invalid full precision vectors in {self.folder}: {e}")
+
+    def _load_legacy(self, ids: list[str]):
+        data = np.load(os.path.join(self.folder, LEGACY_VECTORS_FILE), mmap_mode="r")
+        if len(ids) != len(data):
+            raise ValueError(f"{len(ids)} ids for {len(data)} vectors")
+        self.data = data
+        self.dim = data.shape[1]
+        self.rows = {id: row for row, id in enumerate(ids)}
+        self._legacy = True
+
+
+def get_tombstones(state: Any) -> int:
+    return state.index.ntotal - len(state.index_to_docstore_id)
+
+
+class IndexState:
+    """Index with its label to document id mapping, built apart from the live db."""
+
+    def __init__(self, index: Any, index_to_docstore_id: dict[int, str]):
+        self.index = index
+        self.index_to_docstore_id = index_to_docstore_id
+        self.next_label: int | None = None
+
+
+class IndexBuilder:
+    """Builds a new index of a db in a thread while the db keeps serving and changing.
+
+    Ids added or removed meanwhile are recorded and applied before the new index
+    is swapped in, so the swap itself is cheap.
+    """
+
+    def __init__(self, db: Any, kind: IndexType, quantization: Quantization = "none"):
+        self.kind = kind
+        self.quantization = quantization
+        mapping = dict(db.index_to_docstore_id)
+        self.ids = list(mapping.values())
+        self.vectors = get_store_vectors(db, list(mapping.keys()), self.ids)
+        self.added: list[str] = []
+        self.removed: list[str] = []
+        self.result: IndexState | None = None
+        self.error: Exception | None = None
+        self.thread = threading.Thread(target=self._build, name="memory-index-build", daemon=True)
+        self.thread.start()
+
+    def done(self) -> bool:
+        return not self.thread.is_alive()
+
+    def _build(self):
+        try:
+            index = create_index(self.kind, self.vectors.shape[1], self.vectors, self.quantization)
+            state = IndexState(index, {})
+            add_vectors(state, self.ids, self.vectors)
+            self.result = state
+        except Exception as e:
+            self.error = e
+        self.vectors = None  # type: ignore
+
+    def apply(self, db: Any) -> bool:
+        """Bring the built index up to date with the db and swap it in."""
+        if self.error or not self.result:
+            PrintStyle.error(f"Building {self.kind} memory index failed: {self.error}")
+            return False
+        state = self.result
+        changed = set(self.added) | set(self.removed)
+        remove_ids(state, list(changed))
+        current = {id: label for label, id in db.index_to_docstore_id.items() if id in changed}
+        add = [id for id in dict.fromkeys(self.added) if id in current]
+        if add:
+            add_vectors(state, add, get_store_vectors(db, [current[id] for id in add], add))
+        db.swap_index(state)
+        return True
+
+
+def maybe_rebuild(db: Any, index_type: IndexType, quantization: Quantization = "none") -> bool:
+    """Swap in a finished build or start one when the db outgrew its index or changed its
+    quantization, returns True on swap."""
+    builder: IndexBuilder | None = getattr(db, "index_builder", None)
+    if builder:
+        if not builder.done():
+            return False
+        db.index_builder = None
+        return builder.apply(db)
+
+    count = len(db.index_to_docstore_id)
+    current = get_kind(db.index)
+    target = get_target_kind(index_type, count, current)
+    current_quantization = get_index_quantization(db.index)
+    target_quantization = get_target_quantization(quantization, count, current_quantization)
+
+    rebuild = target != current or target_quantization != current_quantization
+    if not rebuild and current == "ivf":
+        rebuild = get_ivf_lists(count) >= 2 * db.index.nlist  # retrain for the grown store
+    if not rebuild and current == "hnsw":
+        rebuild = get_tombstones(db) > HNSW_MAX_TOMBSTONES * max(1, db.index.ntotal)
+    if target == "ivf" and count < IVF_MIN_POINTS_PER_LIST:
+        rebuild = False  # too few vectors to train
+
+    if rebuild:
+        storage = f" {target_quantization}" if target_quantization != "none" else ""
+        PrintStyle.standard(f"Building {target}{storage} memory index for {count} vectors...")
+        db.index_builder = IndexBuilder(db, target, target_quantization)
+    return False
@@ -0,0 +1,131 @@
+"""Compare the legacy json chat files with the compact chat format.
+
+Run manually: python tests/benchmarks/bench_chat_format.py
+"""
+
+import base64
+import json
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from python.helpers import chat_format
+
+HISTORY_SIZES = [50, 500, 5000]
+REPEATS = 3
+
+
+def random_text(length: int) -> str:
+    words = [
+        "".join(random.choices(string.ascii_lowercase, k=random.randint(2, 10)))
+        for _ in range(200)
+    ]
+    text = []
+    size = 0
+    while size < length:
+        word = random.choice(words)
+        text.append(word)
+        size += len(word) + 1
+    return " ".join(text)[:length]
+
+
+def make_message(i: int) -> dict:
+    if i % 25 == 0:
+        image = base64.b64encode(os.urandom(30_000)).decode()
+        content = {
+            "raw_content": [
+                {"type": "image_url", "image_url": {"url": "data:image/jpeg;base64," + image}}
+            ],
+            "preview": "<Base64 encoded image data>",
+        }
+    elif i % 3 == 0:
+        content = {
+            "tool_name": "code_execution_tool",
+            "tool_result": random_text(random.randint(500, 20_000)),
+        }
+    else:
+        content = {"thoughts": [random_text(200)], "headline": random_text(40)}
+    return {"_cls": "Message", "ai": i % 2 == 1, "content": content, "summary": "", "tokens": 100}
+
+
+def make_chat(messages: int) -> dict:
+    topics = []
+    for start in range(0, messages, 10):
+        topics.append(
+            {
+                "_cls": "Topic",
+                "summary": "",
+                "messages": [make_message(i) for i in range(start, min(start + 10, messages))],
+            }
+        )
+    history = {
+        "_cls": "History",
+        "counter": messages,
+        "bulks": [],
+        "topics": topics[:-1],
+        "current": topics[-1],
+    }
+    logs = [
+        {"no": i, "id": None, "type": "tool", "heading": random_text(60), "content": random_text(2000), "temp": False, "kvps": {"tool": "x"}}
+        for i in range(min(messages, 1000))
+    ]
+    return {"id": "bench", "agents": [{"number": 0, "data": {}, "history": history}], "log": {"guid": "x", "logs": logs}}
+
+
+def legacy_dumps(chat: dict) -> bytes:
+    chat = dict(chat)
+    chat["agents"] = [
+        {**agent, "history": json.dumps(agent["history"], ensure_ascii=False)}
+        for agent in chat["agents"]
+    ]
+    return json.dumps(chat, ensure_ascii=False).encode("utf-8")
+
+
+def legacy_loads(data: bytes) -> dict:
+    chat = json.loads(data.decode("utf-8"))
+    for agent in chat["agents"]:
+        agent["history"] = json.loads(agent["history"])
+    return chat
+
+
+def measure(path: str, dumps, loads, chat: dict):
+    save, load = [], []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        with open(path, "wb") as f:
+            f.write(dumps(chat))
+        save.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with open(path, "rb") as f:
+            loads(f.read())
+        load.append(time.perf_counter() - start)
+    return min(save), min(load), os.path.getsize(path)
+
+
+def main():
+    random.seed(0)
+    print(f"msgpack: {chat_format.MSGPACK_AVAILABLE}, zstd: {chat_format.ZSTD_AVAILABLE}")
+    print(f"{'messages':>9} {'format':>8} {'save ms':>9} {'load ms':>9} {'size KB':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in HISTORY_SIZES:
+            chat = make_chat(size)
+            variants = [
+                ("json", legacy_dumps, legacy_loads),
+                ("compact", lambda c: chat_format.dumps(c, compress=False), chat_format.loads),
+                ("compact+c", lambda c: chat_format.dumps(c, compress=True), chat_format.loads),
+            ]
+            for name, dumps, loads in variants:
+                save, load, bytes = measure(os.path.join(tmp, name), dumps, loads, chat)
+                print(f"{size:>9} {name:>8} {save * 1000:>9.1f} {load * 1000:>9.1f} {bytes / 1024:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
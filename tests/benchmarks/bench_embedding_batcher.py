@@ -0,0 +1,91 @@
+"""Embedding throughput of single text calls versus the micro-batching service.
+
+Uses the local sentence-transformers model, or with --simulated (or when it is not
+installed) a provider with a fixed latency per call plus a cost per text.
+Run manually: python tests/benchmarks/bench_embedding_batcher.py [--simulated]
+"""
+
+import asyncio
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from langchain_core.embeddings import Embeddings
+
+from python.helpers.embedding_batcher import LINGER, MAX_BATCH_SIZE, EmbeddingBatcher
+
+MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+CALLERS = [1, 8, 64]
+QUERIES_PER_CALLER = 32
+CALL_LATENCY = 0.02  # seconds per call of the simulated provider
+TEXT_COST = 0.0005  # seconds per text of the simulated provider
+DIM = 384
+
+
+class SimulatedEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        time.sleep(CALL_LATENCY + TEXT_COST * len(texts))
+        return [[random.random() for _ in range(DIM)] for _ in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def random_text() -> str:
+    return " ".join(
+        "".join(random.choices(string.ascii_lowercase, k=random.randint(3, 9)))
+        for _ in range(random.randint(5, 40))
+    )
+
+
+def get_model() -> tuple[Embeddings, str]:
+    if "--simulated" not in sys.argv:
+        try:
+            from models import LocalSentenceTransformerWrapper
+
+            return LocalSentenceTransformerWrapper(provider="huggingface", model=MODEL), MODEL
+        except ImportError:
+            pass
+    return SimulatedEmbeddings(), f"simulated, {CALL_LATENCY * 1000:.0f} ms per call"
+
+
+async def run_callers(embed, callers: int) -> float:
+    async def caller():
+        for _ in range(QUERIES_PER_CALLER):
+            await embed(random_text())
+
+    start = time.perf_counter()
+    await asyncio.gather(*[caller() for _ in range(callers)])
+    return time.perf_counter() - start
+
+
+async def main():
+    random.seed(0)
+    model, name = get_model()
+    batcher = EmbeddingBatcher(model, MAX_BATCH_SIZE, LINGER)
+    model.embed_query("warmup")
+
+    async def single(text: str):
+        # previous behaviour, one model call per text off the event loop
+        return await asyncio.to_thread(model.embed_query, text)
+
+    print(f"{name}, batch size {MAX_BATCH_SIZE}, linger {LINGER * 1000:.0f} ms")
+    print(f"{'callers':>8} {'mode':>8} {'texts/s':>10} {'avg batch':>10}")
+    for callers in CALLERS:
+        total = callers * QUERIES_PER_CALLER
+        elapsed = await run_callers(single, callers)
+        print(f"{callers:>8} {'single':>8} {total / elapsed:>10.1f} {1:>10}")
+
+        batcher.batches = batcher.texts = 0
+        elapsed = await run_callers(batcher.aembed_query, callers)
+        print(f"{callers:>8} {'batched':>8} {total / elapsed:>10.1f} {batcher.stats()['avg_batch']:>10}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
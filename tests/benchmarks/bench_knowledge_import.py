@@ -0,0 +1,111 @@
+"""Cold and warm knowledge preload time of a large knowledge directory.
+
+Warm runs find every file unchanged, by stat or, as before stat based change detection,
+by hashing every file. Embedding uses a model with a fixed latency per call, so the
+batched insert of all changed files is visible next to a per file insert.
+
+Run manually: python tests/benchmarks/bench_knowledge_import.py
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from langchain_core.embeddings import Embeddings
+
+from python.helpers import knowledge_import
+from python.helpers.embedding_batcher import EmbeddingBatcher
+
+FILES = 5_000
+CHANGED = 50
+DIM = 384
+CALL_LATENCY = 0.01  # seconds per embedding call of the provider
+
+
+class SlowEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        time.sleep(CALL_LATENCY)
+        return np.random.rand(len(texts), DIM).astype(np.float32).tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def make_files(folder: str):
+    for i in range(FILES):
+        sub = os.path.join(folder, f"part{i % 50:02d}")
+        os.makedirs(sub, exist_ok=True)
+        with open(os.path.join(sub, f"note{i:05d}.md"), "w", encoding="utf-8") as f:
+            f.write(f"# Note {i}\n\n" + f"Knowledge line {i} about the project. " * 60)
+
+
+def load(folder: str, index: dict) -> tuple[float, dict]:
+    start = time.perf_counter()
+    index = knowledge_import.load_knowledge(None, folder, index, {"area": "main"})
+    return time.perf_counter() - start, index
+
+
+def settle(index: dict, keep_stat: bool = True) -> dict:
+    # what preload_knowledge saves after the import
+    result = {}
+    for file, data in index.items():
+        data = {k: v for k, v in data.items() if k not in ("documents", "state")}
+        if not keep_stat:
+            data.pop("stat", None)
+        result[file] = data
+    return result
+
+
+async def embed(docs: list, batched: bool) -> float:
+    model = EmbeddingBatcher(SlowEmbeddings())
+    start = time.perf_counter()
+    if batched:
+        texts = [doc.page_content for doc in docs]
+        await asyncio.gather(
+            *[model.aembed_documents(texts[i : i + 256]) for i in range(0, len(texts), 256)]
+        )
+    else:
+        by_file: dict[str, list[str]] = {}
+        for doc in docs:
+            by_file.setdefault(doc.metadata["source_path"], []).append(doc.page_content)
+        for texts in by_file.values():
+            await model.aembed_documents(texts)
+    return time.perf_counter() - start
+
+
+def main():
+    with tempfile.TemporaryDirectory() as folder:
+        make_files(folder)
+        cold, index = load(folder, {})
+        docs = [doc for data in index.values() for doc in data.get("documents", [])]
+        print(f"{FILES} files, {len(docs)} chunks, {knowledge_import.LOAD_WORKERS} load workers")
+        print(f"cold load: {cold:.2f}s")
+
+        warm, _ = load(folder, settle(index))
+        print(f"warm load, by stat: {warm:.3f}s")
+        hashed, _ = load(folder, settle(index, keep_stat=False))
+        print(f"warm load, hashing every file: {hashed:.3f}s")
+
+        index = settle(index)
+        files = sorted(index)[:CHANGED]
+        for file in files:
+            with open(file, "a", encoding="utf-8") as f:
+                f.write("Changed.")
+        changed, result = load(folder, index)
+        count = sum(1 for data in result.values() if data["state"] == "changed")
+        print(f"warm load, {count} changed files: {changed:.3f}s")
+
+        print(f"embed cold chunks per file: {asyncio.run(embed(docs, False)):.2f}s")
+        print(f"embed cold chunks batched: {asyncio.run(embed(docs, True)):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Insert latency of a full index save per insert versus the memory write-ahead log.
+
+Run manually: python tests/benchmarks/bench_memory_wal.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+import faiss
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from python.helpers.memory_wal import MemoryWal
+
+STORE_SIZES = [1_000, 100_000, 1_000_000]
+DIM = 384
+SAVE_REPEATS = 3
+WAL_REPEATS = 200
+
+
+class RandomEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return np.random.rand(len(texts), DIM).astype(np.float32).tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def build_db(size: int) -> FAISS:
+    db = FAISS(
+        embedding_function=RandomEmbeddings(),
+        index=faiss.IndexFlatIP(DIM),
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={},
+        distance_strategy=DistanceStrategy.COSINE,
+    )
+    for start in range(0, size, 10_000):
+        count = min(10_000, size - start)
+        vectors = np.random.rand(count, DIM).astype(np.float32)
+        db.add_embeddings(
+            [(f"memory {i} " * 20, vectors[j]) for j, i in enumerate(range(start, start + count))],
+            metadatas=[{"area": "main", "timestamp": "2025-01-01 00:00:00"}] * count,
+            ids=[str(i) for i in range(start, start + count)],
+        )
+    return db
+
+
+def insert_one(db: FAISS, id: str):
+    doc = Document("new memory " * 20, metadata={"area": "main"})
+    vector = np.random.rand(DIM).astype(np.float32).tolist()
+    db.add_embeddings([(doc.page_content, vector)], metadatas=[doc.metadata], ids=[id])
+    return doc, vector
+
+
+def main():
+    print(f"{'documents':>10} {'mode':>6} {'insert ms':>10}")
+    for size in STORE_SIZES:
+        db = build_db(size)
+        with tempfile.TemporaryDirectory() as tmp:
+            times = []
+            for i in range(SAVE_REPEATS):
+                start = time.perf_counter()
+                insert_one(db, f"save{i}")
+                db.save_local(tmp)
+                times.append(time.perf_counter() - start)
+            print(f"{size:>10} {'save':>6} {np.median(times) * 1000:>10.2f}")
+
+            wal = MemoryWal(tmp)
+            times = []
+            for i in range(WAL_REPEATS):
+                start = time.perf_counter()
+                doc, vector = insert_one(db, f"wal{i}")
+                wal.log_add([f"wal{i}"], [doc], [vector])
+                times.append(time.perf_counter() - start)
+            print(f"{size:>10} {'wal':>6} {np.median(times) * 1000:>10.2f}")
+
+            start = time.perf_counter()
+            wal.checkpoint(db, background=False)
+            print(f"{size:>10} {'ckpt':>6} {(time.perf_counter() - start) * 1000:>10.2f}")
+            wal.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Index size, load time and recall@k of quantized memory storage against flat float32.
+
+Run manually: python tests/benchmarks/bench_quantization.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from python.helpers import vector_index
+import faiss
+
+STORE_SIZES = [20_000, 100_000]
+DIM = 384
+QUERIES = 200
+K = 10
+CLUSTERS = 200
+
+
+def make_vectors(count: int, rng: np.random.Generator) -> np.ndarray:
+    # clustered unit vectors resemble text embeddings better than uniform noise
+    centers = rng.standard_normal((CLUSTERS, DIM)).astype(np.float32)
+    vectors = centers[rng.integers(0, CLUSTERS, count)]
+    vectors += 0.5 * rng.standard_normal((count, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def rerank(vectors: np.ndarray, queries: np.ndarray, labels: np.ndarray) -> np.ndarray:
+    # full precision vectors are memory-mapped in the store, here they are in memory
+    result = np.empty((len(queries), K), dtype=np.int64)
+    for i, query in enumerate(queries):
+        candidates = labels[i][labels[i] != -1]
+        scores = vectors[candidates] @ query
+        result[i] = candidates[np.argsort(-scores)[:K]]
+    return result
+
+
+def recall(labels: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(labels[i]) & set(truth[i])) / K for i in range(len(truth))]))
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(
+        f"{'vectors':>8} {'storage':>8} {'index MB':>9} {'load ms':>8} {'query ms':>9}"
+        f" {f'recall@{K}':>10} {'reranked':>9}"
+    )
+    for size in STORE_SIZES:
+        vectors = make_vectors(size, rng)
+        queries = make_vectors(QUERIES, rng)
+        truth = None
+        for quantization in ["none", "fp16", "pq"]:
+            index = vector_index.create_index("flat", DIM, vectors, quantization)  # type: ignore
+            index.add(vectors)
+
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "index.faiss")
+                faiss.write_index(index, path)
+                index_mb = os.path.getsize(path) / 2**20
+                start = time.perf_counter()
+                index = faiss.read_index(path)
+                load_time = time.perf_counter() - start
+
+            fetch = K if quantization == "none" else K * vector_index.RERANK_FACTOR
+            start = time.perf_counter()
+            _scores, labels = index.search(queries, fetch)
+            query_time = (time.perf_counter() - start) / QUERIES
+
+            if truth is None:
+                truth = labels
+            reranked = recall(rerank(vectors, queries, labels), truth) if quantization != "none" else 1.0
+            print(
+                f"{size:>8} {quantization:>8} {index_mb:>9.1f} {load_time * 1000:>8.1f}"
+                f" {query_time * 1000:>9.3f} {recall(labels[:, :K], truth):>10.3f} {reranked:>9.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
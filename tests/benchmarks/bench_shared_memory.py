@@ -0,0 +1,122 @@
+"""Memory use of worker processes that each load a memory store versus map one shared image.
+
+Four processes search the same store at once. Private ones read the index and pickled
+documents into their own memory, shared ones map the image the writer published.
+RSS counts mapped pages in every process, PSS splits shared pages between them.
+
+Run manually (linux): python tests/benchmarks/bench_shared_memory.py [vectors]
+"""
+
+import multiprocessing
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+import faiss
+from langchain_core.documents import Document
+
+from python.helpers import memory_share
+
+VECTORS = 1_000_000
+DIM = 384
+PROCESSES = 4
+QUERIES = 20
+K = 10
+
+
+def build_image(folder: str, count: int):
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(DIM))
+    rng = np.random.default_rng(0)
+    for start in range(0, count, 100_000):
+        vectors = rng.random((min(100_000, count - start), DIM), dtype=np.float32)
+        index.add_with_ids(vectors, np.arange(start, start + len(vectors)))
+    faiss.write_index(index, os.path.join(folder, "index.faiss"))
+    del index
+    metadata = {"area": "main", "timestamp": "2025-01-01 00:00:00"}
+    docs = {f"{i:010d}": Document(f"memory {i} " * 10, metadata=metadata) for i in range(count)}
+    mapping = {i: f"{i:010d}" for i in range(count)}
+    memory_share.write_docs(folder, docs, mapping)
+    with open(os.path.join(folder, "index.pkl"), "wb") as f:
+        pickle.dump((docs, mapping), f)  # what a private store loads
+
+
+def read_memory() -> tuple[float, float]:
+    # (rss, pss) in MB of the current process
+    values = {}
+    with open("/proc/self/smaps_rollup", "r") as f:
+        for line in f:
+            name, _sep, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                values[name] = int(rest.split()[0]) / 1024
+    return values["Rss"], values["Pss"]
+
+
+def worker(folder: str, shared: bool, barrier, results):
+    start = time.perf_counter()
+    if shared:
+        index = faiss.read_index(
+            os.path.join(folder, "index.faiss"), faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+        )
+        docs, labels = memory_share.load_docs(folder)  # type: ignore
+    else:
+        index = faiss.read_index(os.path.join(folder, "index.faiss"))
+        with open(os.path.join(folder, "index.pkl"), "rb") as f:
+            docs, labels = pickle.load(f)
+    load_time = time.perf_counter() - start
+
+    rng = np.random.default_rng(os.getpid())
+    start = time.perf_counter()
+    for _ in range(QUERIES):
+        _scores, found = index.search(rng.random((1, DIM), dtype=np.float32), K)
+        [docs[labels[int(label)]] for label in found[0]]
+    query_time = (time.perf_counter() - start) / QUERIES
+
+    barrier.wait()  # every process has touched the whole store
+    rss, pss = read_memory()
+    results.put((load_time, query_time, rss, pss))
+    barrier.wait()  # measured while all are alive
+
+
+def run(folder: str, shared: bool) -> list[tuple[float, float, float, float]]:
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(PROCESSES)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(folder, shared, barrier, results))
+        for _ in range(PROCESSES)
+    ]
+    for process in processes:
+        process.start()
+    measured = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return measured
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else VECTORS
+    with tempfile.TemporaryDirectory() as folder:
+        build_image(folder, count)
+        size = sum(os.path.getsize(os.path.join(folder, name)) for name in os.listdir(folder))
+        print(f"{count} vectors, {size / 2**20:.0f} MB on disk, {PROCESSES} processes")
+        print(f"{'mode':>8} {'load s':>7} {'query ms':>9} {'RSS MB':>9} {'PSS MB':>9}")
+        for shared in [False, True]:
+            measured = run(folder, shared)
+            load_time = max(m[0] for m in measured)
+            query_time = sum(m[1] for m in measured) / len(measured)
+            rss = sum(m[2] for m in measured)
+            pss = sum(m[3] for m in measured)
+            mode = "shared" if shared else "private"
+            print(f"{mode:>8} {load_time:>7.2f} {query_time * 1000:>9.2f} {rss:>9.0f} {pss:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
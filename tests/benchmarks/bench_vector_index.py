@@ -0,0 +1,73 @@
+"""Recall@k and latency of the approximate memory indexes against exact search.
+
+Run manually: python tests/benchmarks/bench_vector_index.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from python.helpers import vector_index
+
+STORE_SIZES = [10_000, 100_000]
+DIM = 384
+QUERIES = 200
+K = 10
+CLUSTERS = 200
+
+
+def make_centers(rng: np.random.Generator) -> np.ndarray:
+    return rng.standard_normal((CLUSTERS, DIM)).astype(np.float32)
+
+
+def make_vectors(count: int, centers: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    # clustered unit vectors resemble text embeddings better than uniform noise,
+    # queries use the same centers as the store so they come from its distribution
+    vectors = centers[rng.integers(0, CLUSTERS, count)]
+    vectors += 0.5 * rng.standard_normal((count, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def build(kind: str, vectors: np.ndarray):
+    index = vector_index.create_index(kind, DIM, vectors)  # type: ignore
+    state = vector_index.IndexState(index, {})
+    vector_index.add_vectors(state, [str(i) for i in range(len(vectors))], vectors)
+    return index
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'vectors':>8} {'index':>6} {'build s':>8} {'query ms':>9} {f'recall@{K}':>10}")
+    for size in STORE_SIZES:
+        centers = make_centers(rng)
+        vectors = make_vectors(size, centers, rng)
+        queries = make_vectors(QUERIES, centers, rng)
+        truth = None
+        for kind in ["flat", "ivf", "hnsw"]:
+            start = time.perf_counter()
+            index = build(kind, vectors)
+            build_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            _scores, labels = index.search(queries, K)
+            query_time = (time.perf_counter() - start) / QUERIES
+
+            if truth is None:
+                truth = labels
+            recall = np.mean(
+                [len(set(labels[i]) & set(truth[i])) / K for i in range(QUERIES)]
+            )
+            print(
+                f"{size:>8} {kind:>6} {build_time:>8.2f} {query_time * 1000:>9.3f} {recall:>10.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
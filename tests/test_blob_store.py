@@ -0,0 +1,63 @@
+import sys, os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from python.helpers import blob_store
+
+
+def test_put_deduplicates(tmp_path):
+    store = blob_store.BlobStore(str(tmp_path))
+    first = store.put("x" * 3000)
+    second = store.put("x" * 3000)
+
+    assert first == second
+    assert store.get_text(first) == "x" * 3000
+    stats = store.stats()
+    assert stats["blobs"] == 1
+    assert stats["dedup_hits"] == 1
+    assert stats["dedup_bytes"] == 3000
+
+
+def test_compressed_blob_roundtrip(tmp_path):
+    store = blob_store.BlobStore(str(tmp_path))
+    hash = store.put("y" * 10000, compress=True)
+
+    path = store.find(hash)
+    assert path and path.endswith(blob_store.COMPRESSED_SUFFIX)
+    assert os.path.getsize(path) < 10000
+    assert store.get_text(hash) == "y" * 10000
+
+
+def test_externalize_and_resolve(tmp_path):
+    store = blob_store.BlobStore(str(tmp_path))
+    content = {
+        "tool_name": "code_execution_tool",
+        "tool_result": "z" * 5000,
+        "parts": ["short", {"image": "a" * 4000}],
+    }
+
+    stored = blob_store.externalize(store, content)
+    assert stored["tool_name"] == "code_execution_tool"
+    assert blob_store.is_ref(stored["tool_result"])
+    assert blob_store.is_ref(stored["parts"][1]["image"])
+    assert blob_store.has_refs(stored)
+    assert blob_store.resolve(store, stored) == content
+
+
+def test_missing_blob_resolves_to_placeholder(tmp_path):
+    store = blob_store.BlobStore(str(tmp_path))
+    ref = {blob_store.REF_KEY: "0" * 64, "length": 10}
+    assert blob_store.resolve(store, ref) == blob_store.MISSING_CONTENT
+
+
+def test_tool_result_file_is_readable_and_shared_with_history(tmp_path):
+    store = blob_store.BlobStore(str(tmp_path))
+    result = "r" * 5000
+    path = store.find(store.put(result))  # saved tool call file
+    assert path and path.endswith(blob_store.TEXT_SUFFIX)
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == result
+
+    stored = blob_store.externalize(store, {"tool_result": result})  # its history message
+    assert store.find(stored["tool_result"][blob_store.REF_KEY]) == path
+    assert store.stats()["blobs"] == 1
@@ -0,0 +1,38 @@
+import sys, os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from python.helpers.bm25_index import Bm25Index, fuse
+
+
+def test_ranks_identifiers_and_updates():
+    index = Bm25Index()
+    index.add("a", "The checkpoint is written by memory_wal.py")
+    index.add("b", "Memories are recalled before every message")
+    index.add("c", "A write-ahead log keeps inserts cheap")
+
+    assert [id for id, _score in index.search("error in memory_wal.py", 3)] == ["a"]
+    assert [id for id, _score in index.search("wal", 3)] == ["a"]
+
+    index.remove("a")
+    index.add("c", "Replay of memory_wal.py after a crash")
+    assert [id for id, _score in index.search("memory_wal.py", 3)] == ["c"]
+    assert [id for id, _score in index.search("memory_wal.py", 3, accept=lambda id: id != "c")] == []
+
+
+def test_reciprocal_rank_fusion():
+    fused = fuse([["a", "b", "c"], ["c", "a"]])
+    assert [id for id, _score in fused] == ["a", "c", "b"]
+
+
+def test_stopwords_and_partial_matches_score_low():
+    index = Bm25Index()
+    index.add("a", "The service is restarted by the deploy script")
+    index.add("b", "Checkpoints are written in the background")
+    index.add("c", "Nothing in common")
+
+    assert index.search("is it the one by the way", 3) == []
+    [(id, full)] = index.search("restarted deploy script", 3)
+    assert id == "a" and full > 0.8
+    [(id, partial)] = index.search("deploy the frontend to staging with kubernetes", 3)
+    assert id == "a" and partial < 0.3
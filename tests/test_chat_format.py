@@ -0,0 +1,29 @@
+import sys, os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from python.helpers import chat_format
+
+CHAT = {
+    "id": "abc",
+    "agents": [{"number": 0, "history": {"_cls": "History", "topics": []}}],
+    "log": {"logs": [{"no": 0, "content": "ünïcode " * 100, "kvps": None}]},
+}
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_roundtrip(compress: bool):
+    data = chat_format.dumps(CHAT, compress=compress)
+    assert chat_format.is_compact(data)
+    assert chat_format.loads(data) == CHAT
+
+
+def test_unserializable_values_are_dropped():
+    data = chat_format.dumps({"ok": 1, "bad": object()})
+    assert chat_format.loads(data) == {"ok": 1, "bad": None}
+
+
+def test_rejects_other_data():
+    with pytest.raises(chat_format.ChatFormatError):
+        chat_format.loads(b'{"id": "abc"}')
@@ -0,0 +1,46 @@
+import sys, os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from python.helpers.document_cache import DocumentCache, get_text_hash
+
+
+def test_finds_documents_by_validator_or_text(tmp_path):
+    cache = DocumentCache(str(tmp_path / "documents.db"))
+    cache.put_document("file:///a.md", "stat:1:10", "alpha beta", "1000/100", ["alpha", "beta"])
+    cache.put_vectors("file:///a.md", "model", np.ones((2, 3)))
+
+    found = cache.get_document("file:///a.md", "stat:1:10")
+    assert found is not None and found["text"] == "alpha beta" and found["chunks"] == ["alpha", "beta"]
+    assert cache.get_document("file:///a.md", "stat:2:10") is None
+    assert cache.get_document("file:///a.md", "stat:2:10", get_text_hash("alpha beta")) is not None
+    assert cache.get_vectors("file:///a.md", "model").shape == (2, 3)  # type: ignore
+    assert cache.get_vectors("file:///a.md", "other") is None
+
+    # new validator for the same text keeps chunks and vectors, a new text drops them
+    cache.put_document("file:///a.md", "stat:2:10", "alpha beta")
+    assert cache.get_document("file:///a.md", "stat:2:10")["chunks"] == ["alpha", "beta"]  # type: ignore
+    assert cache.get_vectors("file:///a.md", "model") is not None
+    cache.put_document("file:///a.md", "stat:3:11", "alpha gamma")
+    assert cache.get_vectors("file:///a.md", "model") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["text_hits"] == 1 and stats["misses"] == 1
+
+
+def test_evicts_least_recently_used(tmp_path):
+    path = str(tmp_path / "documents.db")
+    cache = DocumentCache(path, max_bytes=20_000)
+    texts = {f"https://example.com/{i}": os.urandom(4000).hex() for i in range(6)}
+    for uri, text in list(texts.items())[:3]:
+        cache.put_document(uri, "etag:1", text)
+    cache.get_document("https://example.com/0", "etag:1")
+    for uri, text in list(texts.items())[3:]:
+        cache.put_document(uri, "etag:1", text)
+
+    assert cache.stats()["evictions"] > 0 and cache.size <= 20_000
+    assert cache.get_document("https://example.com/0", "etag:1") is not None
+    assert cache.get_document("https://example.com/1", "etag:1") is None
+    assert DocumentCache(path).size == cache.size
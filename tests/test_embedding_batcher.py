@@ -0,0 +1,58 @@
+import sys, os, asyncio, time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from python.helpers.embedding_batcher import LINGER, MAX_BATCH_SIZE, EmbeddingBatcher
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(len(texts))
+        time.sleep(0.01)
+        if "bad" in texts:
+            raise ValueError("bad text")
+        return [[float(len(text))] for text in texts]
+
+
+def test_concurrent_queries_are_batched():
+    model = FakeModel()
+    batcher = EmbeddingBatcher(model, max_batch_size=8)
+
+    async def run():
+        return await asyncio.gather(*[batcher.aembed_query("x" * i) for i in range(20)])
+
+    vectors = asyncio.run(run())
+
+    assert [v[0] for v in vectors] == [float(i) for i in range(20)]
+    assert max(model.calls) <= 8
+    assert len(model.calls) < 20
+
+
+def test_failed_request_does_not_fail_batch():
+    batcher = EmbeddingBatcher(FakeModel())
+
+    async def run():
+        return await asyncio.gather(
+            batcher.aembed_query("ok"), batcher.aembed_query("bad"), return_exceptions=True
+        )
+
+    ok, bad = asyncio.run(run())
+
+    assert ok == [2.0]
+    assert isinstance(bad, ValueError)
+
+
+def test_configure_updates_shared_batchers():
+    batcher = EmbeddingBatcher.get("test-configure", FakeModel)
+    try:
+        EmbeddingBatcher.configure(4, 0.02)
+        assert (batcher.max_batch_size, batcher.linger) == (4, 0.02)
+        other = EmbeddingBatcher.get("test-configure-other", FakeModel)
+        assert (other.max_batch_size, other.linger) == (4, 0.02)
+    finally:
+        EmbeddingBatcher.configure(MAX_BATCH_SIZE, LINGER)
+        EmbeddingBatcher._batchers.pop("test-configure", None)
+        EmbeddingBatcher._batchers.pop("test-configure-other", None)
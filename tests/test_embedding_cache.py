@@ -0,0 +1,39 @@
+import sys, os, json
+import uuid
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from python.helpers.embedding_cache import EmbeddingCache
+
+
+def test_migrates_legacy_file_store(tmp_path):
+    legacy = tmp_path / "embeddings"
+    legacy.mkdir()
+    keys = [f"model_{uuid.uuid4()}" for _ in range(3)]
+    for i, key in enumerate(keys):
+        (legacy / key).write_bytes(json.dumps([0.5, float(i)]).encode())
+    # a model whose namespace starts with this one is left to its own migration
+    other = f"model_large{uuid.uuid4()}"
+    (legacy / other).write_bytes(b"[1.0]")
+
+    cache = EmbeddingCache.get(str(tmp_path / "embeddings.db"), "model_", legacy_dir=str(legacy))
+
+    assert os.listdir(legacy) == [other]
+    assert cache.mget([keys[0], keys[2], f"model_{uuid.uuid4()}"]) == [
+        b"[0.5, 0.0]",
+        b"[0.5, 2.0]",
+        None,
+    ]
+    assert cache.stats()["entries"] == 3
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.db"), "model_", max_entries=10)
+    cache.mset([(f"model_{i}", json.dumps([float(i)]).encode()) for i in range(5)])
+    cache.mget(["model_0"])
+    cache.mset([(f"model_{i}", json.dumps([float(i)]).encode()) for i in range(5, 12)])
+
+    stats = cache.stats()
+    assert stats["entries"] <= 10
+    assert stats["evictions"] > 0
+    assert cache.mget(["model_0"]) == [b"[0.0]"]
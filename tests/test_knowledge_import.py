@@ -0,0 +1,28 @@
+import sys, os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from python.helpers.knowledge_import import CHUNK_SIZE, match_chunks, split_text
+
+
+def test_edit_changes_only_nearby_chunks():
+    paragraphs = [f"Paragraph {i}" + " of the manual" * (5 + i % 40) for i in range(300)]
+    chunks = split_text("\n\n".join(paragraphs))
+    assert all(len(chunk) <= CHUNK_SIZE for chunk in chunks)
+    assert "\n\n".join(chunks) == "\n\n".join(paragraphs)
+
+    paragraphs[150] += " edited"
+    edited = split_text("\n\n".join(paragraphs))
+    assert len(set(edited) - set(chunks)) <= 2
+    assert split_text("\n\n".join(paragraphs)) == edited
+
+
+def test_match_chunks_keeps_same_content():
+    kept, removed = match_chunks(["a", "b", "c"], ["h1", "h2", "h1"], ["h1", "h3", "h1", "h1"])
+    assert kept == ["a", None, "c", None]
+    assert removed == ["b"]
+
+    # imported before chunk hashes were stored
+    kept, removed = match_chunks(["a", "b"], [], ["h1"])
+    assert kept == [None]
+    assert removed == ["a", "b"]
@@ -0,0 +1,102 @@
+import sys, os
+import hashlib
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from python.helpers import memory_store, vector_index
+from python.helpers.memory import Memory
+from python.helpers.memory_store import MyFaiss, PartitionedFaiss
+from python.helpers.memory_wal import MemoryWal
+
+
+class HashEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        seed = int(hashlib.md5(text.encode()).hexdigest()[:8], 16)
+        vector = np.random.default_rng(seed).standard_normal(8)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+def test_legacy_index_split_into_area_stores(tmp_path):
+    embedder = HashEmbeddings()
+    legacy = MyFaiss(
+        embedding_function=embedder,
+        index=faiss.IndexFlatIP(8),
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={},
+        relevance_score_fn=memory_store.cosine_normalizer,
+    )
+    docs = {
+        "m1": Document("m1 text", metadata={"area": "main", "id": "m1"}),
+        "s1": Document("s1 text", metadata={"area": "solutions", "id": "s1"}),
+        "x1": Document("x1 text", metadata={"id": "x1"}),  # from before areas
+    }
+    legacy.add_documents(list(docs.values()), ids=list(docs))
+    legacy.save_local(str(tmp_path))
+    # logged after the last save of the legacy index
+    late = Document("s2 text", metadata={"area": "solutions", "id": "s2"})
+    wal = MemoryWal(str(tmp_path))
+    wal.log_add(["s2"], [late], [embedder.embed_query(late.page_content)])
+    wal.close()
+
+    db = PartitionedFaiss(str(tmp_path), embedder)
+    Memory._split_legacy_db(db, None)
+
+    assert {area: sorted(part.get_all_docs()) for area, part in db.partitions.items()} == {
+        "main": ["m1", "x1"],
+        "solutions": ["s1", "s2"],
+    }
+    # vectors are moved, not embedded again
+    hits = db.partitions["solutions"].similarity_search_with_score_by_vector(embedder.embed_query("s2 text"), k=1)
+    assert hits[0][0].metadata["id"] == "s2"
+    assert not os.path.exists(tmp_path / "index.faiss") and not os.path.exists(tmp_path / "wal")
+    assert memory_store.is_memory_dir(str(tmp_path))
+    db.close()
+
+
+def test_index_type_changed_in_the_background(tmp_path):
+    db = PartitionedFaiss(str(tmp_path), HashEmbeddings(), use_wal=False)
+    part = db.get_partition("main")
+    part.add_texts([f"doc {no}" for no in range(50)], metadatas=[{"area": "main"}] * 50)
+    memory = Memory(db, memory_subdir="test")
+
+    config = memory.set_index_config(index_type="hnsw")
+    assert config["index_type"] == "hnsw" and config["areas"]["main"]["building"]
+    assert vector_index.get_kind(part.index) == "flat"  # searched until the new index is swapped in
+    part.index_builder.thread.join()  # type: ignore
+    memory._maintain_index([part])
+    assert memory.get_index_config()["areas"]["main"] == {
+        "index_type": "hnsw", "quantization": "none", "full_vectors": False, "documents": 50, "building": False}
+
+    reloaded = PartitionedFaiss(str(tmp_path), HashEmbeddings(), use_wal=False)
+    reloaded.load()
+    assert vector_index.get_kind(reloaded.partitions["main"].index) == "hnsw"
+
+
+def test_quantization_changed_in_the_background(tmp_path):
+    db = PartitionedFaiss(str(tmp_path), HashEmbeddings(), use_wal=False)
+    part = db.get_partition("main")
+    part.add_texts([f"doc {no}" for no in range(50)], metadatas=[{"area": "main"}] * 50)
+    memory = Memory(db, memory_subdir="test")
+
+    config = memory.set_index_config(quantization="fp16")
+    assert config["quantization"] == "fp16" and config["areas"]["main"]["full_vectors"]
+    part.index_builder.thread.join()  # type: ignore
+    memory._maintain_index([part])
+    assert vector_index.get_index_quantization(part.index) == "fp16"
+    assert os.path.exists(os.path.join(part.folder, vector_index.FULL_VECTORS_FILE))
+
+    memory.set_index_config(quantization="none")
+    part.index_builder.thread.join()  # type: ignore
+    memory._maintain_index([part])
+    assert vector_index.get_index_quantization(part.index) == "none"
+    assert part.full_vectors is None
+    assert not os.path.exists(os.path.join(part.folder, vector_index.FULL_VECTORS_FILE))
@@ -0,0 +1,126 @@
+import sys, os
+import asyncio
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+
+from python.helpers import memory_consolidation
+from python.helpers.memory_consolidation import ConsolidationAction, ConsolidationResult, MemoryConsolidator
+
+
+class FakeStore:
+    def __init__(self, docs: list[Document]):
+        self.docs = {doc.metadata["id"]: doc for doc in docs}
+
+    def get_by_ids(self, ids):
+        return [self.docs[id] for id in ids if id in self.docs]
+
+    async def aget_by_ids(self, ids):
+        return self.get_by_ids(ids)
+
+
+class FakeMemory:
+    def __init__(self, docs: list[Document]):
+        self.db = FakeStore(docs)
+        self.applied: list[tuple[list[str], list[Document]]] = []
+
+    async def apply_changes(self, remove_ids, docs):
+        self.applied.append((remove_ids, docs))
+        return [f"new{no}" for no in range(len(docs))]
+
+
+def existing(id: str) -> Document:
+    return Document(f"memory {id}", metadata={"id": id, "area": "main"})
+
+
+def test_new_memories_sharing_similar_ones_planned_together(monkeypatch):
+    a, b, c = existing("a"), existing("b"), existing("c")
+    similar = {
+        "uses postgres": [(a, 0.9)],
+        "postgres runs on port 5433": [(a, 0.8), (b, 0.7)],
+        "deploys with kubernetes": [(c, 0.95)],
+        "likes green tea": [],
+    }
+    db = FakeMemory([a, b, c])
+    analyzed = []
+
+    async def find_similar(self, memory, area, log_item=None):
+        return similar[memory]
+
+    async def analyze(self, context):
+        analyzed.append(context.new_memory)
+        if "kubernetes" in context.new_memory:
+            return ConsolidationResult(action=ConsolidationAction.SKIP)
+        return ConsolidationResult(
+            action=ConsolidationAction.MERGE,
+            memories_to_remove=["a", "b"],
+            new_memory_content="uses postgres on port 5433",
+        )
+
+    async def get(agent):
+        return db
+
+    monkeypatch.setattr(MemoryConsolidator, "_find_similar_memories", find_similar)
+    monkeypatch.setattr(MemoryConsolidator, "_analyze_memory_consolidation", analyze)
+    monkeypatch.setattr(memory_consolidation.Memory, "get", staticmethod(get))
+    consolidator = MemoryConsolidator(agent=None)  # type: ignore
+
+    result = asyncio.run(
+        consolidator.process_new_memories([*similar, "uses postgres", " "], "main", {"source": "test"})
+    )
+
+    # one analysis per group, the memory without similar ones is inserted directly
+    assert sorted(analyzed) == ["1. uses postgres\n\n2. postgres runs on port 5433", "deploys with kubernetes"]
+    (removed, docs), = db.applied  # applied in one transaction
+    assert removed == ["a", "b"]
+    assert sorted(doc.page_content for doc in docs) == [
+        "deploys with kubernetes",
+        "likes green tea",
+        "uses postgres on port 5433",
+    ]
+    actions = {doc.page_content: doc.metadata["consolidation_action"] for doc in docs}
+    assert actions["likes green tea"] == "direct_insert"
+    assert actions["deploys with kubernetes"] == "skip"
+    assert result == {"success": True, "memory_ids": ["new0", "new1", "new2"]}
+
+
+def test_groups_join_through_shared_similar_memories():
+    a, b, c = existing("a"), existing("b"), existing("c")
+    consolidator = MemoryConsolidator(agent=None)  # type: ignore
+    groups = consolidator._group_related([[(a, 1)], [(b, 1)], [(a, 1), (b, 1)], [(c, 1)], []])
+    assert sorted(groups) == [[0, 1, 2], [3], [4]]
+
+
+class FakeAgent:
+    def __init__(self, response: str):
+        self.response = response
+
+    def read_prompt(self, file, **kwargs):
+        return file
+
+    async def call_utility_model(self, system, message, callback=None, background=False):
+        return self.response
+
+
+def test_batch_updated_without_new_content_stores_its_memories(monkeypatch):
+    a = existing("a")
+    db = FakeMemory([a])
+
+    async def get(agent):
+        return db
+
+    async def find_similar(self, memory, area, log_item=None):
+        return [(a, 0.8)]
+
+    monkeypatch.setattr(memory_consolidation.Memory, "get", staticmethod(get))
+    monkeypatch.setattr(MemoryConsolidator, "_find_similar_memories", find_similar)
+    agent = FakeAgent('{"action": "update", "memories_to_update": [{"id": "a", "new_content": "memory a, updated"}]}')
+    consolidator = MemoryConsolidator(agent=agent)  # type: ignore
+
+    asyncio.run(consolidator.process_new_memories(["first", "second"], "main", {}))
+
+    (removed, docs), = db.applied
+    assert removed == ["a"]
+    # never the numbered list of the batch as one memory
+    assert [doc.page_content for doc in docs] == ["memory a, updated", "first", "second"]
@@ -0,0 +1,22 @@
+import sys, os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from python.helpers.memory_dedup import DedupIndex
+
+
+def test_finds_exact_and_near_duplicates():
+    index = DedupIndex()
+    index.add("a", "The user prefers answers in Czech and uses the fish shell on Arch Linux.")
+    index.add("b", "Deployments go through the staging cluster before production.")
+
+    assert index.find("the user prefers answers in czech, and uses the FISH shell on arch linux") == ("a", 1.0)
+    found = index.find("The user prefers answers in Czech and uses the fish shell on Arch Linux daily.", 0.7)
+    assert found is not None and found[0] == "a" and found[1] < 1
+    assert index.find("The user prefers answers in Czech and uses the fish shell on Arch Linux daily.", 1) is None
+    assert index.find("Backups run every night at two o'clock to the NAS.", 0.5) is None
+
+    index.remove("a")
+    index.add("b", "The user prefers answers in Czech and uses the fish shell on Arch Linux.")
+    assert index.find("The user prefers answers in Czech and uses the fish shell on Arch Linux.") == ("b", 1.0)
+    assert index.find("Deployments go through the staging cluster before production.") is None
@@ -0,0 +1,52 @@
+import sys, os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from python.helpers import memory_export
+
+
+def write_export(path: str):
+    writer = memory_export.ExportWriter(path, {"model_provider": "p", "model_name": "m"})
+    for chunk in range(3):
+        ids = [f"id{chunk}{i}" for i in range(4)]
+        docs = [
+            Document(
+                f"memory {id} ✓",
+                metadata={
+                    "id": id,
+                    "area": "main" if i % 2 else "fragments",
+                    "timestamp": f"2025-0{chunk + 1}-10 12:00:00",
+                },
+            )
+            for i, id in enumerate(ids)
+        ]
+        writer.write(ids, docs, np.full((4, 3), chunk, dtype=np.float32))
+    return writer.close()
+
+
+def test_round_trip_with_filters(tmp_path):
+    path = str(tmp_path / "memory.npz")
+    manifest = write_export(path)
+    assert manifest["documents"] == 12 and manifest["dim"] == 3
+    assert memory_export.read_manifest(path)["model_name"] == "m"
+
+    chunks = list(memory_export.read_chunks(path))
+    assert [len(ids) for ids, _docs, _vectors in chunks] == [4, 4, 4]
+    ids, docs, vectors = chunks[1]
+    assert ids[0] == "id10" and docs[0].page_content == "memory id10 ✓"
+    assert docs[0].metadata["area"] == "fragments" and vectors.shape == (4, 3) and vectors[0, 0] == 1
+
+    selected = list(memory_export.read_chunks(path, {"main"}, since="2025-02-01", until="2025-03-10"))
+    assert [ids for ids, _docs, _vectors in selected] == [["id11", "id13"], ["id21", "id23"]]
+    assert all(vectors.shape == (2, 3) for _ids, _docs, vectors in selected)
+
+
+def test_rejects_other_files(tmp_path):
+    path = str(tmp_path / "other.npz")
+    np.savez(path, a=np.zeros(2))
+    with pytest.raises(Exception):
+        memory_export.read_manifest(path)
@@ -0,0 +1,68 @@
+import sys, os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+
+from python.helpers.memory_filter import MetadataIndex, compile_filter
+
+
+def test_compiled_filter_matches_simpleeval():
+    docs = [
+        {"area": "main", "timestamp": "2025-01-02 10:00:00", "n": 3},
+        {"area": "solutions", "timestamp": "2025-02-01 08:00:00", "n": 4},
+        {"area": "main"},
+    ]
+    cases = {
+        "area == 'main'": [True, False, True],
+        "area == 'main' and n > 1": [True, False, False],
+        "area in ['main'] or n % 2 == 0": [True, True, True],
+        "timestamp >= '2025-01-15'": [False, True, False],
+        "n * 2 == 6": [True, False, False],  # evaluated by simpleeval
+    }
+    for condition, expected in cases.items():
+        f = compile_filter(condition, report_errors=False)
+        assert [f(doc) for doc in docs] == expected, condition
+    assert not compile_filter("n * 2 == 6").compiled
+
+
+def test_index_selects_candidates():
+    index = MetadataIndex.build(
+        [
+            ("a", Document("a", metadata={"area": "main", "timestamp": "2025-01-02 10:00:00"})),
+            ("b", Document("b", metadata={"area": "solutions", "timestamp": "2025-02-01 08:00:00"})),
+            ("c", Document("c", metadata={"area": "main", "knowledge_source": True})),
+        ]
+    )
+    assert compile_filter("area == 'main'").candidates(index) == {"a", "c"}
+    assert compile_filter("area == 'main' and n > 1").candidates(index) == {"a", "c"}
+    assert compile_filter("area in ['solutions'] or knowledge_source == True").candidates(index) == {"b", "c"}
+    assert compile_filter("'2025-01-31' < timestamp").candidates(index) == {"b"}
+    assert compile_filter("n > 1").candidates(index) is None
+
+    index.remove("c", {"area": "main", "knowledge_source": True})
+    assert compile_filter("area == 'main'").candidates(index) == {"a"}
+
+
+def test_restricted_values():
+    assert compile_filter("area == 'main' or area == 'fragments'").get_values("area") == {"main", "fragments"}
+    assert compile_filter("area in ['solutions'] and n > 1").get_values("area") == {"solutions"}
+    assert compile_filter("area == 'main' or n > 1").get_values("area") is None
+
+
+def test_newest_pages_by_timestamp():
+    index = MetadataIndex.build(
+        [
+            ("a", Document("a", metadata={"timestamp": "2025-01-02 10:00:00"})),
+            ("b", Document("b", metadata={"timestamp": "2025-02-01 08:00:00"})),
+            ("c", Document("c", metadata={})),
+        ]
+    )
+    index.add("d", {"timestamp": "2025-03-01 00:00:00", "knowledge_source": True})
+    assert [id for _ts, id in index.newest(2)] == ["d", "b"]
+    assert [id for _ts, id in index.newest(2, before=("2025-02-01 08:00:00", "b"))] == ["a", "c"]
+    assert [id for _ts, id in index.newest(5, accept=lambda id: id != "b")] == ["d", "a", "c"]
+
+    index.remove("d", {"timestamp": "2025-03-01 00:00:00", "knowledge_source": True})
+    assert [id for _ts, id in index.newest(1)] == ["b"]
+    assert index.count("knowledge_source", True) == 0
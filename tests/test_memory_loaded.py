@@ -0,0 +1,85 @@
+import sys, os
+import hashlib
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from python.helpers import memory_store
+from python.helpers.memory_loaded import LoadedMemories
+from python.helpers.memory_store import PartitionedFaiss
+
+
+class HashEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        seed = int(hashlib.md5(text.encode()).hexdigest()[:8], 16)
+        vector = np.random.default_rng(seed).standard_normal(8)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+class Holder:
+    pass
+
+
+def make_db(path, text: str) -> PartitionedFaiss:
+    db = PartitionedFaiss(str(path), HashEmbeddings())
+    part = db.get_partition("main")
+    doc = Document(text, metadata={"area": "main"})
+    part.add_documents([doc], ids=[text])
+    memory_store.log_add(part, [text], [doc], [HashEmbeddings().embed_query(text)])
+    return db
+
+
+def test_held_db_stays_loaded_and_unloaded_one_is_checkpointed(tmp_path):
+    loaded = LoadedMemories()
+    loaded.configure(max_subdirs=1, max_bytes=0, min_idle=0)
+    held, other = make_db(tmp_path / "a", "held"), make_db(tmp_path / "b", "other")
+    holder = Holder()
+    held.holders.add(holder)
+
+    loaded["a"] = held
+    loaded["b"] = other
+    assert list(loaded.dbs) == ["a"]
+
+    loaded.wait_closed("b")
+    wal = other.partitions["main"].wal  # type: ignore
+    assert wal.closed and not wal.ops
+    assert os.path.exists(os.path.join(other.partitions["main"].folder, "index.faiss"))
+    with pytest.raises(RuntimeError):
+        wal.log_delete(["other"])
+
+    del holder
+    loaded["c"] = make_db(tmp_path / "c", "new")
+    assert list(loaded.dbs) == ["c"]
+    loaded.clear()
+
+
+def test_least_recently_used_unloaded_over_the_limits(tmp_path):
+    loaded = LoadedMemories()
+    loaded.configure(max_subdirs=2, max_bytes=0, min_idle=0)
+    for name in "ab":
+        loaded[name] = make_db(tmp_path / name, name)
+    loaded.get("a")  # used last, "b" goes first
+    loaded["c"] = make_db(tmp_path / "c", "c")
+    assert list(loaded.dbs) == ["a", "c"] and loaded.unloads == 1
+
+    # over the size limit, recently used subdirs stay loaded anyway
+    loaded.configure(max_subdirs=2, max_bytes=1, min_idle=60)
+    assert loaded.evict() == []
+    loaded.configure(max_subdirs=2, max_bytes=1, min_idle=0)
+    assert loaded.evict() == ["a", "c"]
+    assert len(loaded) == 0
+
+    # unloaded dbs load again from their checkpoints
+    loaded.wait_closed("b")
+    reloaded = PartitionedFaiss(str(tmp_path / "b"), HashEmbeddings())
+    reloaded.load()
+    assert list(reloaded.get_all_docs()) == ["b"]
+    reloaded.close()
+    loaded.clear()
@@ -0,0 +1,109 @@
+import sys, os
+import hashlib
+import json
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from python.helpers import memory_reindex, memory_store
+from python.helpers.memory_loaded import LoadedMemories
+from python.helpers.memory_reindex import MemoryReindex
+from python.helpers.memory_store import PartitionedFaiss
+
+MODEL = {"model_provider": "test", "model_name": "salted"}
+
+
+class HashEmbeddings(Embeddings):
+    def __init__(self, salt: str = "", fail_after: int | None = None):
+        self.salt = salt
+        self.fail_after = fail_after  # documents embedded before the model fails
+        self.embedded: list[str] = []
+
+    def embed_documents(self, texts):
+        if self.fail_after is not None and len(self.embedded) + len(texts) > self.fail_after:
+            raise ConnectionError("embedding model unavailable")
+        self.embedded += texts
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        seed = int(hashlib.md5((self.salt + text).encode()).hexdigest()[:8], 16)
+        vector = np.random.default_rng(seed).standard_normal(8)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+def make_db(path, texts: dict[str, str]) -> PartitionedFaiss:
+    db = PartitionedFaiss(str(path), HashEmbeddings())
+    for id, area in texts.items():
+        part = db.get_partition(area)
+        doc = Document(f"{id} text", metadata={"area": area, "id": id})
+        part.add_documents([doc], ids=[id])
+        memory_store.save_store(part)
+    return db
+
+
+def run(job: MemoryReindex) -> str:
+    job.start()
+    job._thread.join(30)  # type: ignore
+    return job.state
+
+
+def test_reindexed_stores_replace_live_ones(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory_reindex, "REINDEX_GRACE", 0)
+    db = make_db(tmp_path, {"m1": "main", "m2": "main", "s1": "solutions"})
+    loaded = LoadedMemories()
+    loaded["subdir"] = db
+    swaps = []
+    embedder = HashEmbeddings(salt="new")
+
+    job = MemoryReindex.prepare(db, "subdir", MODEL, embedder, loaded, lambda target, subdir: swaps.append(subdir))
+    old_folder = os.path.join(str(tmp_path), db.areas_folder)
+    assert run(job) == "done", job.error
+
+    target = loaded.peek("subdir")
+    assert target is job.target and swaps == ["subdir"]
+    assert sorted(target.get_all_docs()) == ["m1", "m2", "s1"]
+    assert sorted(embedder.embedded) == ["m1 text", "m2 text", "s1 text"]
+    hits = target.partitions["main"].similarity_search_with_score_by_vector(embedder.embed_query("m1 text"), k=1)
+    assert hits[0][0].metadata["id"] == "m1"
+    assert memory_store.get_embedding_set(str(tmp_path))["areas"] == target.areas_folder
+    assert not os.path.exists(old_folder)
+    assert not os.path.exists(os.path.join(str(tmp_path), memory_reindex.REINDEX_FILE))
+    loaded.clear()
+
+
+def test_interrupted_reindex_resumes_with_changed_documents(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory_reindex, "REINDEX_BATCH", 1)
+    monkeypatch.setattr(memory_reindex, "REINDEX_GRACE", 0)
+    db = make_db(tmp_path, {"m1": "main", "m2": "main", "m3": "main"})
+    loaded = LoadedMemories()
+    loaded["subdir"] = db
+
+    failing = HashEmbeddings(salt="new", fail_after=1)
+    job = MemoryReindex.prepare(db, "subdir", MODEL, failing, loaded, lambda target, subdir: None)
+    assert run(job) == "failed"
+    assert job.done == 1 and db.reindex is None
+    (built,) = failing.embedded
+
+    # a built document changes before the reindex continues
+    id = built.split()[0]
+    part = db.partitions["main"]
+    part.delete([id])
+    changed = Document("changed text", metadata={"area": "main", "id": id})
+    part.add_documents([changed], ids=[id])
+    memory_store.save_store(part)
+
+    with open(os.path.join(str(tmp_path), memory_reindex.REINDEX_FILE)) as f:
+        areas = json.load(f)["areas"]
+    embedder = HashEmbeddings(salt="new")
+    job = MemoryReindex.prepare(db, "subdir", MODEL, embedder, loaded, lambda target, subdir: None)
+    assert job.target.areas_folder == areas  # continued in the stores of the first attempt
+    assert run(job) == "done", job.error
+    assert sorted(embedder.embedded) == sorted(
+        ["changed text"] + [f"{other} text" for other in ["m1", "m2", "m3"] if other != id]
+    )
+    assert loaded.peek("subdir").get_by_ids([id])[0].page_content == "changed text"  # type: ignore
+    loaded.clear()
+
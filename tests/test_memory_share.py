@@ -0,0 +1,48 @@
+import sys, os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from langchain_core.documents import Document
+
+from python.helpers import memory_share
+
+
+def test_mapped_docs_read_written_image(tmp_path):
+    docs = {
+        "b": Document("second", metadata={"area": "main", "n": 2}),
+        "a": Document("first ✓", metadata={"area": "fragments"}),
+        "c": Document("not indexed", metadata={}),
+    }
+    memory_share.write_docs(str(tmp_path), docs, {7: "a", 3: "b"})
+    mapped, labels = memory_share.load_docs(str(tmp_path))  # type: ignore
+
+    assert list(mapped) == ["a", "b", "c"]
+    assert mapped["a"].page_content == "first ✓"
+    assert mapped["b"].metadata == {"area": "main", "n": 2}
+    assert "x" not in mapped and mapped.get("x") is None
+    assert dict(labels.items()) == {3: "b", 7: "a"}
+    assert labels.get(5) is None
+
+
+def test_inbox_keeps_order_and_batches(tmp_path):
+    inbox = memory_share.Inbox(str(tmp_path))
+    inbox.put({"op": "delete", "ids": ["a"]})
+    inbox.put({"op": "batch", "ops": [{"op": "delete", "ids": ["b"]}, {"op": "drop", "area": "main"}]})
+    records = inbox.take()
+
+    assert [record["op"] for _path, record in records] == ["delete", "batch"]
+    assert len(records[1][1]["ops"]) == 2
+    inbox.done(records[0][0])
+    assert len(inbox.take()) == 1
+
+
+def test_writer_lock_released(tmp_path):
+    import fcntl
+
+    assert memory_share.acquire_writer(str(tmp_path))
+    with open(os.path.join(tmp_path, memory_share.WRITER_LOCK_FILE), "a+") as other:
+        with pytest.raises(OSError):
+            fcntl.flock(other.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        memory_share.release_writer(str(tmp_path))
+        fcntl.flock(other.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
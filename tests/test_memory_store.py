@@ -0,0 +1,151 @@
+import sys, os
+import asyncio
+import hashlib
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from python.helpers import memory_store, memory_wal, vector_index
+from python.helpers.memory_filter import compile_filter
+from python.helpers.memory_store import PartitionedFaiss
+
+
+class HashEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        seed = int(hashlib.md5(text.encode()).hexdigest()[:8], 16)
+        vector = np.random.default_rng(seed).standard_normal(8)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+def test_memory_dir_detected_by_stores_or_embedding_file(tmp_path):
+    assert not memory_store.is_memory_dir(str(tmp_path / "missing"))
+    assert not memory_store.is_memory_dir(str(tmp_path))
+
+    split = tmp_path / "split"
+    (split / "areas" / "main").mkdir(parents=True)
+    assert memory_store.is_memory_dir(str(split))
+
+    reindexed = tmp_path / "reindexed"
+    (reindexed / "areas-20260101000000000000").mkdir(parents=True)
+    assert memory_store.is_memory_dir(str(reindexed))
+
+    configured = tmp_path / "configured"
+    configured.mkdir()
+    (configured / memory_store.EMBEDDING_FILE).write_text("{}")
+    assert memory_store.is_memory_dir(str(configured))
+
+    legacy = tmp_path / "legacy"
+    legacy.mkdir()
+    (legacy / "index.faiss").write_bytes(b"")
+    assert memory_store.is_memory_dir(str(legacy))
+
+
+def add(db: PartitionedFaiss, id: str, area: str):
+    part = db.get_partition(area)
+    doc = Document(f"{id} text", metadata={"area": area, "id": id})
+    part.add_documents([doc], ids=[id])
+    memory_store.log_add(part, [id], [doc], [db.embedding_function.embed_query(doc.page_content)])
+
+
+def test_documents_routed_to_area_stores_survive_reload(tmp_path):
+    db = PartitionedFaiss(str(tmp_path), HashEmbeddings())
+    add(db, "m1", "main")
+    add(db, "m2", "main")
+    add(db, "s1", "solutions")
+    add(db, "c1", "custom area/x")  # stored in a folder with a safe name
+    db.close()
+
+    db = PartitionedFaiss(str(tmp_path), HashEmbeddings())
+    db.load()
+    assert sorted(db.partitions) == ["custom area/x", "main", "solutions"]
+    assert sorted(db.partitions["main"].get_all_docs()) == ["m1", "m2"]
+    assert db.group_ids(["m1", "s1", "missing"]) == {"main": ["m1"], "solutions": ["s1"]}
+    assert db.count_docs({"main", "solutions"}) == 3
+
+    # area scoped searches only touch the stores of their areas
+    docs = asyncio.run(db.asearch("s1 text", 5, score_threshold=0, filter=compile_filter("area == 'solutions'")))
+    assert [doc.metadata["id"] for doc in docs] == ["s1"]
+
+    folder = db.partitions["solutions"].folder
+    assert db.drop_partition("solutions") == 1
+    assert not os.path.exists(folder)
+    db.close()
+    db = PartitionedFaiss(str(tmp_path), HashEmbeddings())
+    db.load()
+    assert sorted(db.get_all_docs()) == ["c1", "m1", "m2"]
+    db.close()
+
+
+def test_uncommitted_transaction_not_replayed_in_any_area(tmp_path):
+    db = PartitionedFaiss(str(tmp_path), HashEmbeddings())
+    embed = db.embedding_function.embed_query
+    for txn, commit in [("t1", True), ("t2", False)]:
+        for area in ["main", "fragments"]:
+            doc = Document(f"{txn} {area}", metadata={"area": area})
+            record = memory_wal.get_add_record([f"{txn}-{area}"], [doc], [embed(doc.page_content)])
+            db.get_partition(area).wal.log_batch([record], txn)  # type: ignore
+        if commit:
+            db.transactions.commit(txn)  # type: ignore
+    # the process stops without a checkpoint
+    for part in db.partitions.values():
+        part.wal.close()  # type: ignore
+    db.transactions.close()  # type: ignore
+
+    db = PartitionedFaiss(str(tmp_path), HashEmbeddings())
+    db.load()
+    assert sorted(db.get_all_docs()) == ["t1-fragments", "t1-main"]
+    db.close()
+
+
+def test_hybrid_search_requires_lexical_matches_of_most_of_the_query(tmp_path):
+    db = PartitionedFaiss(str(tmp_path), HashEmbeddings(), use_wal=False)
+    texts = {
+        "a": "The checkpoint is written by memory_wal.py",
+        "b": "The service is restarted by the deploy script",
+        "c": "Memories are recalled before every message",
+    }
+    for id, text in texts.items():
+        db.get_partition("main").add_texts([text], metadatas=[{"area": "main", "id": id}], ids=[id])
+
+    async def search(query: str, hybrid: bool = True) -> list[str]:
+        docs = await db.asearch(query, 3, score_threshold=0.99, hybrid=hybrid)
+        return [doc.metadata["id"] for doc in docs]
+
+    assert asyncio.run(search("why does memory_wal.py fail", hybrid=False)) == []
+    assert asyncio.run(search("why does memory_wal.py fail")) == ["a"]
+    assert asyncio.run(search("the is by")) == []
+    assert asyncio.run(search("deploy the frontend to staging with kubernetes")) == []
+    # found by the vector search, the lexical ranking only reorders
+    assert asyncio.run(db.asearch(texts["c"], 3, score_threshold=0.99, hybrid=True))[0].metadata["id"] == "c"
+
+
+def test_full_vectors_dropped_when_rebuilt_without_quantization(tmp_path):
+    vector_index.set_quantization(str(tmp_path), "fp16")
+    db = PartitionedFaiss(str(tmp_path), HashEmbeddings(), use_wal=False)
+    part = db.get_partition("main")
+
+    def rebuild():
+        while vector_index.get_index_quantization(part.index) != part.quantization:
+            vector_index.maybe_rebuild(part, part.index_type, part.quantization)
+            time.sleep(0.01)
+
+    rebuild()
+    part.add_texts(["x", "y"], metadatas=[{"area": "main"}] * 2, ids=["x", "y"])
+    part.save_local(part.folder)
+    assert part.full_vectors is not None and len(part.full_vectors) == 2
+    ids, vectors = part.get_vectors(["y", "missing", "x"])
+    assert ids == ["y", "x"]
+    assert np.array_equal(vectors, np.array(HashEmbeddings().embed_documents(ids), dtype=np.float32))
+    assert part.get_vectors(["missing"])[1].shape == (0, 8)
+
+    part.quantization = "none"
+    rebuild()
+    assert part.full_vectors is None
+    assert not [name for name in os.listdir(part.folder) if name.startswith("vectors")]
@@ -0,0 +1,118 @@
+import sys, os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import faiss
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+
+from python.helpers import memory_wal
+from python.helpers.memory_store import MyFaiss, cosine_normalizer
+from python.helpers.memory_wal import MemoryWal, TransactionLog
+
+DIM = 4
+
+
+def make_store() -> MyFaiss:
+    return MyFaiss(
+        embedding_function=None,  # type: ignore
+        index=faiss.IndexFlatIP(DIM),
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={},
+        relevance_score_fn=cosine_normalizer,
+    )
+
+
+def vector(no: int) -> list[float]:
+    return [float(no == dim) for dim in range(DIM)]
+
+
+def test_transaction_replayed_only_once_committed(tmp_path):
+    areas = tmp_path / "areas"
+    first, second = str(areas / "main"), str(areas / "fragments")
+    transactions = TransactionLog(str(areas))
+    for no, folder in enumerate([first, second]):
+        add = memory_wal.get_add_record([f"doc{no}"], [Document(f"text {no}")], [vector(no)])
+        MemoryWal(folder).log_batch([add], "t1")
+    # the process stopped before the second part of t2 was logged
+    add = memory_wal.get_add_record(["late"], [Document("late")], [vector(3)])
+    MemoryWal(first).log_batch([add], "t2")
+    transactions.commit("t1")
+
+    committed = TransactionLog(str(areas)).ids
+    assert committed == {"t1"}
+    replayed = {}
+    for folder in [first, second]:
+        store = make_store()
+        wal = MemoryWal(folder)
+        wal.replay(store, committed)
+        replayed[folder] = sorted(store.get_all_docs())
+        assert wal.txns == {"t1"}
+    assert replayed == {first: ["doc0"], second: ["doc1"]}
+
+    transactions.compact(set())
+    assert TransactionLog(str(areas)).ids == set()
+
+
+def load_store(folder: str) -> MyFaiss:
+    return MyFaiss.load_local(
+        folder_path=folder,
+        embeddings=None,  # type: ignore
+        allow_dangerous_deserialization=True,
+        relevance_score_fn=cosine_normalizer,
+    )  # type: ignore
+
+
+def add(store: MyFaiss, wal: MemoryWal, no: int):
+    doc = Document(f"text {no}")
+    store.add_embeddings([(doc.page_content, vector(no % DIM))], ids=[f"doc{no}"])
+    wal.log_add([f"doc{no}"], [doc], [vector(no % DIM)])
+
+
+def test_checkpoint_rotates_and_replay_applies_newer_logs(tmp_path):
+    folder = str(tmp_path)
+    store, wal = make_store(), MemoryWal(folder)
+    add(store, wal, 0)
+    add(store, wal, 1)
+    wal.checkpoint(store, background=False)
+    assert wal._get_file_numbers() == [] and wal._read_checkpoint() == 1
+
+    add(store, wal, 2)
+    store.delete(["doc0"])
+    wal.log_delete(["doc0"])
+    assert wal._get_file_numbers() == [2]
+    wal.close()
+
+    reloaded, reopened = load_store(folder), MemoryWal(folder)
+    assert sorted(reloaded.get_all_docs()) == ["doc0", "doc1"]
+    assert reopened.replay(reloaded) == 2
+    assert sorted(reloaded.get_all_docs()) == ["doc1", "doc2"]
+    assert reopened.file_no == 3  # new records never go to a replayed file
+
+
+def test_crash_during_checkpoint_replays_logs_once(tmp_path, monkeypatch):
+    folder = str(tmp_path)
+    store, wal = make_store(), MemoryWal(folder)
+    add(store, wal, 0)
+    wal.checkpoint(store, background=False)
+    add(store, wal, 1)
+    add(store, wal, 2)
+
+    def crash(covered: int):
+        raise OSError("killed")
+
+    # the index with doc1 and doc2 is written, the marker and log removal are not
+    monkeypatch.setattr(wal, "_write_checkpoint_marker", crash)
+    wal.checkpoint(store, background=False)
+    add(store, wal, 3)
+    wal.close()
+    with open(wal._get_file_path(3), "a", encoding="utf-8") as f:
+        f.write('{"op": "add", "docs": [{"id": "to')  # torn write of the last record
+
+    reloaded, reopened = load_store(folder), MemoryWal(folder)
+    reopened.replay(reloaded)
+    assert sorted(reloaded.get_all_docs()) == ["doc0", "doc1", "doc2", "doc3"]
+    assert reloaded.index.ntotal == 4
+
+    reopened.checkpoint(reloaded, background=False)
+    assert reopened._get_file_numbers() == []
@@ -0,0 +1,45 @@
+import sys, os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from python.helpers.recall_cache import QueryCache, RecallCache, get_key
+
+
+def test_results_valid_for_one_version():
+    cache = RecallCache()
+    key = get_key("deploy steps", threshold=0.7, hybrid=False)
+    assert key != get_key("deploy steps", threshold=0.6, hybrid=False)
+
+    cache.set_result(key, 1, (["a"], []))
+    assert cache.get_result(key, 1) == (["a"], [])
+    assert cache.get_result(key, 2) is None
+
+    # a search started before the change is not cached over newer results
+    cache.set_result(key, 2, (["b"], []))
+    cache.set_result(key, 1, (["a"], []))
+    assert cache.get_result(key, 2) == (["b"], [])
+    assert cache.stats() == {"entries": 1, "hits": 2, "misses": 1}
+
+
+def test_repeated_recall_input_reuses_query_and_results():
+    queries, results = QueryCache(), RecallCache()
+    generated = []
+
+    def recall(history: str):
+        # the utility model words its query differently on every call
+        key = get_key(history, system="query prompt")
+        query = queries.get_query(key)
+        if query is None:
+            query = f"query {len(generated)}"
+            generated.append(query)
+            queries.set_query(key, query)
+        result_key = get_key(query, threshold=0.7)
+        if results.get_result(result_key, 1) is None:
+            results.set_result(result_key, 1, ([query], []))
+
+    for history in ["deploy", "deploy", "deploy", "rollback", "deploy"]:
+        recall(history)
+
+    assert generated == ["query 0", "query 1"]
+    assert queries.stats() == {"entries": 2, "hits": 3, "misses": 2}
+    assert results.stats()["hits"] / 5 == 0.6
@@ -0,0 +1,35 @@
+import sys, os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from python.helpers import summary_cache
+from python.helpers.summary_cache import SummaryCache, get_key
+
+
+def test_shared_by_path_and_written_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(summary_cache, "SAVE_BATCH", 3)
+    path = str(tmp_path / "summaries.json")
+    cache = SummaryCache.get(path)
+    assert SummaryCache.get(path) is cache
+
+    key = get_key("system", "message")
+    assert key == get_key("system", "message") and key != get_key("system", "other")
+    cache.set_summary(key, "summary")
+    cache.set_summary("b", "second")
+    assert not os.path.exists(path)  # batch not full yet
+    cache.set_summary("c", "third")
+    cache.writer.join()  # type: ignore  # written by a thread
+    assert os.path.exists(path)
+
+    cache.set_summary("d", "fourth")
+    cache.flush()
+    reloaded = SummaryCache(path)  # e.g. after a restart
+    assert reloaded.get_summary(key) == "summary" and reloaded.get_summary("d") == "fourth"
+    assert reloaded.get_summary("missing") is None
+    assert reloaded.stats()["hits"] == 2 and reloaded.stats()["misses"] == 1
+
+    SummaryCache.remove(path)  # removed chat, nothing is written anymore
+    cache.set_summary("e", "fifth")
+    cache.flush()
+    assert "e" not in SummaryCache(path).entries
+    assert SummaryCache.get(path) is not cache
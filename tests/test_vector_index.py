@@ -0,0 +1,67 @@
+import sys, os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from python.helpers import vector_index
+from python.helpers.vector_index import FullVectors
+
+
+def test_full_vectors_survive_save_and_changes(tmp_path):
+    full = FullVectors(str(tmp_path))
+    full.add(["a", "b"], np.eye(2, dtype=np.float32))
+    snapshot = full.snapshot()
+    full.add(["c"], np.ones((1, 2), dtype=np.float32))  # added while writing
+    full.remove(["b"])  # removed while writing
+    full.write(snapshot)
+
+    assert sorted(full.get(["a", "b", "c"])) == ["a", "c"]
+    assert list(full.pending) == ["c"]
+
+    reloaded = FullVectors(str(tmp_path))
+    assert np.array_equal(reloaded.get(["a"])["a"], [1, 0])
+    vectors = np.zeros((2, 2), dtype=np.float32)
+    reloaded.fill(["x", "b"], vectors)
+    assert np.array_equal(vectors, [[0, 0], [0, 1]])
+
+
+def test_full_vectors_append_and_compact(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_index, "FULL_VECTORS_COMPACT_MIN", 0)
+    full = FullVectors(str(tmp_path))
+    full.add(["a", "b"], np.eye(2, dtype=np.float32))
+    full.write(full.snapshot())
+    full.remove(["a"])
+    full.add(["c"], np.ones((1, 2), dtype=np.float32))
+    full.write(full.snapshot())  # appended, the row of "a" stays until compacted
+    assert full.file_rows == 3 and full.generation == 0
+
+    reloaded = FullVectors(str(tmp_path))
+    assert sorted(reloaded.rows) == ["b", "c"]
+
+    full.add(["b"], np.full((1, 2), 2, dtype=np.float32))  # replaced
+    full.write(full.snapshot())
+    assert full.generation == 1 and full.file_rows == 2
+    assert not (tmp_path / vector_index.FULL_VECTORS_ROWS.format(0)).exists()
+    reloaded = FullVectors(str(tmp_path))
+    assert np.array_equal(reloaded.get(["b"])["b"], [2, 2])
+    assert sorted(reloaded.rows) == ["b", "c"]
+
+
+def test_full_vectors_recover_torn_save_and_drop(tmp_path):
+    full = FullVectors(str(tmp_path))
+    full.add(["a"], np.eye(1, 2, dtype=np.float32))
+    full.write(full.snapshot())
+    with open(tmp_path / vector_index.FULL_VECTORS_ROWS.format(0), "ab") as f:
+        f.write(b"\0" * 5)  # crashed while appending the next rows
+
+    reloaded = FullVectors(str(tmp_path))
+    assert list(reloaded.rows) == ["a"]
+    reloaded.add(["b"], np.eye(1, 2, 1, dtype=np.float32))
+    reloaded.write(reloaded.snapshot())
+    reloaded = FullVectors(str(tmp_path))
+    assert np.array_equal(reloaded.get(["b"])["b"], [0, 1])
+
+    reloaded.drop()
+    reloaded.write(reloaded.snapshot())
+    assert not list(tmp_path.iterdir())
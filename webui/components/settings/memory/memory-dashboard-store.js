@@ -15,6 +15,8 @@ const memoryDashboardStore = {
   memories: [],
   currentPage: 1,
   itemsPerPage: 10,
+  paged: false, // memories hold one page fetched from the backend
+  pageCursors: [null], // cursor of each page visited, page 1 starts without one
 
   // State
   loading: false,
@@ -31,6 +33,7 @@ const memoryDashboardStore = {
   // Search and filters
   searchQuery: "",
   areaFilter: "",
+  sourceFilter: "",
   threshold: parseFloat(
     localStorage.getItem("memoryDashboard_threshold") || "0.6"
   ),
@@ -42,6 +45,7 @@ const memoryDashboardStore = {
   knowledgeCount: 0,
   conversationCount: 0,
   areasCount: {},
+  reindex: null, // background re-embedding after an embedding model change
 
   // Memory detail modal (standard modal approach)
   detailMemory: null,
@@ -71,8 +75,10 @@ const memoryDashboardStore = {
   async initialize() {
     // Reset state when opening (but keep directory from context)
     this.currentPage = 1;
+    this.pageCursors = [null];
     this.searchQuery = "";
     this.areaFilter = "";
+    this.sourceFilter = "";
 
     // // Get current memory subdirectory from application context
     // await this.getCurrentMemorySubdir();
@@ -152,7 +158,7 @@ const memoryDashboardStore = {
     }
   },
 
-  async searchMemories(silent = false) {
+  async searchMemories(silent = false, page = null) {
     // Save limit to localStorage for persistence
     localStorage.setItem("memoryDashboard_limit", this.limit.toString());
     localStorage.setItem(
@@ -171,14 +177,28 @@ const memoryDashboardStore = {
       }
     }
 
+    // a new search starts over at the first page
+    if (!silent && page === null) {
+      this.pageCursors = [null];
+    }
+
+    // without a search query memories are listed newest first, page by page
+    const paged = !this.searchQuery;
+    const targetPage = paged ? page ?? (silent ? this.currentPage : 1) : 1;
+    const cursor = paged ? this.pageCursors[targetPage - 1] || null : null;
+
     try {
       const response = await API.callJsonApi("memory_dashboard", {
         action: "search",
         memory_subdir: this.selectedMemorySubdir,
         area: this.areaFilter,
+        source: this.sourceFilter,
         search: this.searchQuery,
         limit: this.limit,
         threshold: this.threshold,
+        page_size: paged ? this.itemsPerPage : 0,
+        cursor: cursor,
+        offset: paged && !cursor ? (targetPage - 1) * this.itemsPerPage : 0,
       });
 
       if (response.success) {
@@ -202,8 +222,13 @@ const memoryDashboardStore = {
         this.totalDbCount = response.total_db_count || 0;
         this.knowledgeCount = response.knowledge_count || 0;
         this.conversationCount = response.conversation_count || 0;
+        this.reindex = response.reindex || null;
+        this.paged = paged;
 
-        if (!silent) {
+        if (paged) {
+          this.currentPage = targetPage;
+          this.pageCursors[targetPage] = response.next_cursor || null;
+        } else if (!silent) {
           this.message = response.message || null;
           this.currentPage = 1; // Reset to first page when loading new data
         } else {
@@ -245,6 +270,7 @@ const memoryDashboardStore = {
 
   async clearSearch() {
     this.areaFilter = "";
+    this.sourceFilter = "";
     this.searchQuery = "";
     this.currentPage = 1;
 
@@ -259,31 +285,33 @@ const memoryDashboardStore = {
 
   // Pagination
   get totalPages() {
-    return Math.ceil(this.memories.length / this.itemsPerPage);
+    const count = this.paged ? this.totalCount : this.memories.length;
+    return Math.ceil(count / this.itemsPerPage);
   },
 
   get paginatedMemories() {
+    if (this.paged) return this.memories;
     const start = (this.currentPage - 1) * this.itemsPerPage;
     const end = start + this.itemsPerPage;
     return this.memories.slice(start, end);
   },
 
-  goToPage(page) {
+  async goToPage(page) {
     if (page >= 1 && page <= this.totalPages) {
-      this.currentPage = page;
+      if (this.paged) {
+        await this.searchMemories(false, page);
+      } else {
+        this.currentPage = page;
+      }
     }
   },
 
-  nextPage() {
-    if (this.currentPage < this.totalPages) {
-      this.currentPage++;
-    }
+  async nextPage() {
+    await this.goToPage(this.currentPage + 1);
   },
 
-  prevPage() {
-    if (this.currentPage > 1) {
-      this.currentPage--;
-    }
+  async prevPage() {
+    await this.goToPage(this.currentPage - 1);
   },
 
   // Mass selection
@@ -660,6 +688,7 @@ ${memory.content_full}
     this.stopPolling();
     // Clear data without triggering a new search (component is being destroyed)
     this.areaFilter = "";
+    this.sourceFilter = "";
     this.searchQuery = "";
     this.memories = [];
     this.totalCount = 0;
@@ -667,8 +696,11 @@ ${memory.content_full}
     this.knowledgeCount = 0;
     this.conversationCount = 0;
     this.areasCount = {};
+    this.reindex = null;
     this.message = null;
     this.currentPage = 1;
+    this.pageCursors = [null];
+    this.paged = false;
     this.editMemoryBackup;
   },
 
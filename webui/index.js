@@ -253,6 +253,7 @@ function setConnectionStatus(connected) {
 let lastLogVersion = 0;
 let lastLogGuid = "";
 let lastSpokenNo = 0;
+let logContents = new Map(); // full content of streamed messages, the backend sends appended deltas
 
 export async function poll() {
   let updated = false;
@@ -294,6 +295,7 @@ export async function poll() {
       if (chatHistoryEl) chatHistoryEl.innerHTML = "";
       lastLogVersion = 0;
       lastLogGuid = response.log_guid;
+      logContents = new Map();
       await poll();
       return;
     }
@@ -302,6 +304,12 @@ export async function poll() {
       updated = true;
       for (const log of response.logs) {
         const messageId = log.id || log.no; // Use log.id if available
+        if (log.content_delta) {
+          const prev = logContents.get(messageId) || "";
+          log.content =
+            prev.slice(0, log.content_delta.offset) + log.content_delta.text;
+        }
+        logContents.set(messageId, log.content);
         setMessage(
           messageId,
           log.type,
@@ -478,6 +486,7 @@ export const setContext = function (id) {
   lastLogGuid = "";
   lastLogVersion = 0;
   lastSpokenNo = 0;
+  logContents = new Map();
 
   // Stop speech when switching chats
   speechStore.stopAudio();